@@ -6,11 +6,10 @@ acesso para o texto completo em HTML, resumo em HTML, PDF e EPDF.
 
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
-import choices
+import sinks
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -42,45 +41,41 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"publishing year", safe=True),
+    tabs.Column(u"accesses year", safe=True),
+    tabs.Column(u"accesses to html", safe=True),
+    tabs.Column(u"accesses to abstract", safe=True),
+    tabs.Column(u"accesses to pdf", safe=True),
+    tabs.Column(u"accesses to epdf", safe=True),
+    tabs.Column(u"total accesses", safe=True)
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, workers=1):
         self._articlemeta = utils.articlemeta_server()
         self._accessstats = utils.accessstats_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"publishing year")
-        header.append(u"accesses year")
-        header.append(u"accesses to html")
-        header.append(u"accesses to abstract")
-        header.append(u"accesses to pdf")
-        header.append(u"accesses to epdf")
-        header.append(u"total accesses")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.workers = workers
+        self.output_file = sinks.BufferedSink(output_file)
+        schema = tabs.Schema(tabs.prefix_columns(u'journal') + COLUMNS)
+        self.encode = schema.encoder()
+
+        self.write(schema.header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
     def items(self):
@@ -89,41 +84,24 @@ class Dumper(object):
             self.issns = [None]
 
         for issn in self.issns:
-            for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                for item in self.fmt_csv(data):
+            journals = self._articlemeta.journals(collection=self.collection, issn=issn)
+            for lines in utils.ordered_imap(self.journal_lines, journals, workers=self.workers):
+                for item in lines:
                     yield item
 
+    def journal_lines(self, data):
+
+        return [i for i in self.fmt_csv(data)]
+
     def fmt_csv(self, data):
 
-        issns = []
-        if data.print_issn:
-            issns.append(data.print_issn)
-        if data.electronic_issn:
-            issns.append(data.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'journal')
-        line.append(data.collection_acronym)
-        line.append(data.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.title)
-        line.append(u';'.join(data.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.subject_areas or []) > 1 else '0')
-        line.append(data.current_status)
+        line = [data.collection_acronym]
+        line += tabs.journal_columns(data)
 
         acessos = self._accessstats.access_lifetime(data.scielo_issn, self.collection)
 
         for item in acessos:
-            l = None
-            l = line + [str(i) for i in item]
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in l])
-            yield joined_line
+            yield self.encode(line + [str(i) for i in item])
 
 
 def main():
@@ -150,6 +128,14 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=1,
+        help='Number of journals having their accesses retrieved at the same time'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -172,6 +158,6 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(args.collection, issns, args.output_file, args.workers)
 
     dumper.run()
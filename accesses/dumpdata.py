@@ -7,12 +7,17 @@ import argparse
 import logging
 import re
 import json
-import codecs
+import os
 import datetime
+import heapq
+import itertools
 
 import choices
 
 import utils
+import sinks
+import tabs
+from identifiers import pdf_keys, fbpe_key, eligible_match_keys
 
 __version__ = 0.1
 
@@ -20,11 +25,65 @@ logger = logging.getLogger(__name__)
 
 SUPPLBEG_REGEX = re.compile(r'^0 ')
 SUPPLEND_REGEX = re.compile(r' 0$')
-REGEX_PDF_PATH = re.compile(r'/pdf.*\.pdf$')
 FROM = '1500-01-01'
 UNTIL = datetime.datetime.now().isoformat()[0:10]
 DAYLY_GRANULARITY = False
 OUTPUT_FORMAT = 'csv'
+PARQUET_PARTITIONS = ['collection', 'access_year']
+SHARD_KEYS = {
+    'issn': 'issn',
+    'year': 'access_year'
+}
+PARQUET_COLUMNS = [
+    ('collection', 'string'),
+    ('pid', 'string'),
+    ('issn', 'string'),
+    ('journal_title', 'string'),
+    ('issue', 'string'),
+    ('issue_title', 'string'),
+    ('document_title', 'string'),
+    ('processing_date', 'string'),
+    ('publication_date', 'string'),
+    ('publication_year', 'string'),
+    ('document_type', 'string'),
+    ('subject_areas', 'string'),
+    ('languages', 'string'),
+    ('aff_countries', 'string'),
+    ('access_date', 'string'),
+    ('access_year', 'string'),
+    ('access_month', 'string'),
+    ('access_day', 'string'),
+    ('access_abstract', 'int'),
+    ('access_html', 'int'),
+    ('access_pdf', 'int'),
+    ('access_epdf', 'int'),
+    ('access_total', 'int')
+]
+CSV_COLUMNS = [
+    tabs.Column(u"collection", safe=True),
+    tabs.Column(u"pid", safe=True),
+    tabs.Column(u"issn", safe=True),
+    tabs.Column(u"journal_title"),
+    tabs.Column(u"issue", safe=True),
+    tabs.Column(u"issue_title"),
+    tabs.Column(u"document_title"),
+    tabs.Column(u"processing_date", safe=True),
+    tabs.Column(u"publication_date", safe=True),
+    tabs.Column(u"publication_year", safe=True),
+    tabs.Column(u"document_type", safe=True),
+    tabs.Column(u"subject_areas"),
+    tabs.Column(u"languages"),
+    tabs.Column(u"aff_countries"),
+    tabs.Column(u"access_date", safe=True),
+    tabs.Column(u"access_year", safe=True),
+    tabs.Column(u"access_month", safe=True),
+    tabs.Column(u"access_day", safe=True),
+    tabs.Column(u"access_abstract", safe=True),
+    tabs.Column(u"access_html", safe=True),
+    tabs.Column(u"access_pdf", safe=True),
+    tabs.Column(u"access_epdf", safe=True),
+    tabs.Column(u"access_total", safe=True)
+]
 
 
 def _config_logging(logging_level='INFO', logging_file=None):
@@ -54,48 +113,6 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
-def pdf_keys(fulltexts):
-
-    keys = []
-
-    if not 'pdf' in fulltexts:
-        return keys
-
-    for language, url in fulltexts['pdf'].items():
-        path = REGEX_PDF_PATH.search(url)
-        if path:
-            keys.append(path.group().upper())
-
-    return keys
-
-
-def fbpe_key(code):
-    """
-    input:
-        'S0102-67202009000300001'
-    output:
-        'S0102-6720(09)000300001'
-    """
-
-    begin = code[0:10]
-    year = code[12:14]
-    end = code[14:]
-
-    return '%s(%s)%s' % (begin, year, end)
-
-
-def eligible_match_keys(document):
-    keys = []
-
-    keys.append(document.publisher_id)
-    keys.append(fbpe_key(document.publisher_id))
-    if document.doi:
-        keys.append(document.doi)
-    keys += pdf_keys(document.fulltexts())
-
-    return keys
-
-
 def country(country):
     if country in choices.ISO_3166:
         return country
@@ -145,7 +162,11 @@ def issuelabel(document):
     return ', '.join(itens)
 
 
-def join_metadata_with_accesses(document, accesses_date, accesses):
+def document_metadata(document):
+    """
+    Metadados do documento repetidos em todos os registros de acesso do
+    documento, produzidos apenas uma vez por documento.
+    """
 
     data = {}
     data['id'] = '_'.join([document.collection_acronym, document.publisher_id])
@@ -175,6 +196,13 @@ def join_metadata_with_accesses(document, accesses_date, accesses):
     data['aff_countries'] = ['undefined']
     if document.mixed_affiliations:
         data['aff_countries'] = list(set([country(aff.get('country', 'undefined')) for aff in document.mixed_affiliations]))
+
+    return data
+
+
+def join_metadata_with_accesses(document, accesses_date, accesses, metadata=None):
+
+    data = dict(metadata or document_metadata(document))
     data['access_date'] = get_date_timestamp(accesses_date)
     data['access_year'] = accesses_date[:4]
     data['access_month'] = accesses_date[5:7]
@@ -188,6 +216,66 @@ def join_metadata_with_accesses(document, accesses_date, accesses):
     return data
 
 
+def last_complete_month(today=None):
+    """
+    Retorna o último dia do último mês completo em relação a today.
+
+    ex: 2016-10-18 -> '2016-09-30'
+    """
+    today = today or datetime.date.today()
+
+    return (today.replace(day=1) - datetime.timedelta(days=1)).isoformat()
+
+
+def next_month(month):
+    """
+    Retorna o primeiro dia do mês seguinte ao mês informado.
+
+    ex: '2016-09' -> '2016-10-01', '2016-12' -> '2017-01-01'
+    """
+    year, month = int(month[0:4]), int(month[5:7])
+
+    if month == 12:
+        return '%04d-01-01' % (year + 1)
+
+    return '%04d-%02d-01' % (year, month + 1)
+
+
+class TopAccesses(object):
+    """
+    Mantém os k registros com maior total de acessos para cada periódico e mês
+    de acesso, utilizando um heap de tamanho limitado para cada par
+    (issn, mês).
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._heaps = {}
+        self._sequence = itertools.count()
+
+    def add(self, data):
+
+        key = (data['issn'], data['access_date'][:7])
+        item = (data['access_total'], next(self._sequence), data)
+
+        heap = self._heaps.setdefault(key, [])
+
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item[0] > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def items(self):
+        """
+        Retorna os registros ordenados por issn, mês de acesso e total de
+        acessos decrescente.
+        """
+
+        for key in sorted(self._heaps):
+            for item in sorted(self._heaps[key], key=lambda i: (-i[0], i[1])):
+                yield item[2]
+
+
 def join_accesses(unique_id, accesses, from_date, until_date, dayly_granularity):
     """
     Esse metodo recebe 1 ou mais chaves para um documento em específico para que
@@ -255,7 +343,10 @@ def join_accesses(unique_id, accesses, from_date, until_date, dayly_granularity)
 class Dumper(object):
 
     def __init__(self, collection, issns=None, from_date=FROM, until_date=UNTIL,
-        dayly_granularity=DAYLY_GRANULARITY, fmt=OUTPUT_FORMAT, output_file=None):
+        dayly_granularity=DAYLY_GRANULARITY, fmt=OUTPUT_FORMAT, output_file=None,
+        partitioned=False, compression=None, shard_by=None, shard_rows=None,
+        shard_bytes=None, append=False, state_file=None, top_k=None,
+        checkpoint_file=None, resume=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
@@ -265,33 +356,167 @@ class Dumper(object):
         self.output_file=output_file
         self.issns = issns
         self.collection = collection
-
+        self.output_format = fmt
+        self.partitioned = partitioned
+        self.compression = compression
+        self.shard_by = shard_by
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.append = append
+        self.state_file = state_file
+        self.top_k = top_k
+        self.new_documents_since = None
+        self.checkpoint = sinks.Checkpoint(checkpoint_file) if checkpoint_file else None
+        self.resume_state = None
+        self._sink = None
+
+        if self.append:
+            self._load_append_period()
+
+        if resume:
+            self._load_checkpoint()
+
+        self.encode = tabs.Schema(CSV_COLUMNS).encoder()
         self.fmt = self.fmt_csv
         if fmt == 'json':
             self.fmt = self.fmt_json
+        if fmt == 'parquet':
+            self.fmt = self.fmt_parquet
+
+    def _load_append_period(self):
+        """
+        No modo incremental, apenas os meses posteriores ao último mês completo
+        registrado no arquivo de estado são processados. Documentos incluídos
+        no SciELO após a última execução têm todo o período processado.
+        """
+        self.until_date = last_complete_month()
+
+        state = utils.load_state(self.state_file).get(self.collection, None)
+
+        if not state:
+            logger.info('No state available for %s, dumping the whole period' % self.collection)
+            return
+
+        self.new_documents_since = state['run_date']
+        self.append_from_date = next_month(state['last_month'])
+        logger.info('Appending accesses from %s until %s' % (
+            self.append_from_date, self.until_date))
+
+    def _document_from_date(self, document):
+
+        if not self.new_documents_since:
+            return self.from_date
+
+        # processing_date muda a cada reprocessamento e não identifica documentos
+        # novos. creation_date tem granularidade de dia, portanto documentos
+        # criados no dia da última execução são processados novamente por todo
+        # o período: linhas repetidas (pid, access_date) são preferíveis a
+        # linhas perdidas.
+        creation_date = document.creation_date or ''
+
+        if creation_date >= self.new_documents_since:
+            logger.debug('New document since last run: %s' % document.publisher_id)
+            return self.from_date
+
+        return self.append_from_date
+
+    def _load_checkpoint(self):
+
+        state = self.checkpoint.load()
+
+        if not state:
+            logger.info('No checkpoint available, dumping from the beginning')
+            return
+
+        if state['collection'] != self.collection:
+            raise ValueError('checkpoint does not match the given collection')
+
+        logger.info('Resuming from ISSN %s, offset %d' % (state['issn'], state['offset']))
+        self.checkpoint.restore(state)
+        self.resume_state = state
+
+    def save_checkpoint(self, issn, offset):
+
+        self.checkpoint.save(issn, offset, [self._sink], collection=self.collection)
+
+    def save_state(self):
 
+        utils.update_state(self.state_file, self.collection, {
+            'last_month': self.until_date[:7],
+            'run_date': datetime.date.today().isoformat()
+        })
 
-    def get_accesses(self, issn):
+    def document_accesses(self, document):
 
-        for document in self._articlemeta.documents(collection=self.collection, issn=issn):
-            accesses = []
-            keys = eligible_match_keys(document)
-            logger.debug('keys to join for %s: %s' % (document.publisher_id, str(keys)))
-            for key in keys:
-                data = self._ratchet.document(key)
-                jdata = json.loads(data)
-                if 'objects' in jdata and len(jdata['objects']) > 0:
-                    accesses.append(jdata['objects'][0])
-            joined_accesses = join_accesses(document.publisher_id,
-                accesses, self.from_date, self.until_date,
-                self.dayly_granularity)
+        from_date = self._document_from_date(document)
+        accesses = []
+        keys = eligible_match_keys(document)
+        logger.debug('keys to join for %s: %s' % (document.publisher_id, str(keys)))
+        for key in keys:
+            data = self._ratchet.document(key)
+            jdata = json.loads(data)
+            if 'objects' in jdata and len(jdata['objects']) > 0:
+                accesses.append(jdata['objects'][0])
+        joined_accesses = join_accesses(document.publisher_id,
+            accesses, from_date, self.until_date,
+            self.dayly_granularity)
 
-            for adate, adata in joined_accesses.items():
-                yield join_metadata_with_accesses(document, adate, adata)
+        if not joined_accesses:
+            return
+
+        metadata = document_metadata(document)
+        for adate, adata in joined_accesses.items():
+            yield join_metadata_with_accesses(document, adate, adata, metadata)
+
+    def get_accesses(self, issn, offset=0):
+
+        for document in self._articlemeta.documents(
+                collection=self.collection, issn=issn, offset=offset):
+            for data in self.document_accesses(document):
+                yield data
+
+            # as linhas do documento já foram gravadas quando o gerador é
+            # retomado pelo consumidor.
+            offset += 1
+            if self.checkpoint and offset % self.checkpoint.interval == 0:
+                self.save_checkpoint(issn, offset)
+
+    def items(self):
+
+        if not self.top_k:
+            pending = [(issn, 0) for issn in self.issns]
+            if self.checkpoint:
+                pending = self.checkpoint.pending(self.issns, self.resume_state)
+
+            for index, (issn, offset) in enumerate(pending):
+                for data in self.get_accesses(issn=issn, offset=offset):
+                    yield data
+                if self.checkpoint and index + 1 < len(pending):
+                    self.save_checkpoint(pending[index + 1][0], 0)
+            return
+
+        top = TopAccesses(self.top_k)
+        for issn in self.issns:
+            for data in self.get_accesses(issn=issn):
+                top.add(data)
+
+        for data in top.items():
+            yield data
 
     def fmt_json(self, data):
         return json.dumps(data)
 
+    def fmt_parquet(self, data):
+
+        line = {}
+        for name, ctype in PARQUET_COLUMNS:
+            value = data.get(name, 0 if ctype == 'int' else u'')
+            if isinstance(value, list):
+                value = u', '.join(value)
+            line[name] = int(value) if ctype == 'int' else value
+
+        return line
+
     def fmt_csv(self, data):
 
         line = [
@@ -320,23 +545,54 @@ class Dumper(object):
             data['access_total']
         ]
 
-        return ','.join(['"%s"' % i for i in line])
+        return self.encode(line)
 
     def run(self):
 
         if not self.issns:
             self.issns = [None]
 
-        if not self.output_file:
-            for issn in self.issns:
-                for data in self.get_accesses(issn=issn):
-                    print(self.fmt(data))
-            exit()
-
-        with codecs.open(self.output_file, 'w', encoding='utf-8') as f:
-            for issn in self.issns:
-                for data in self.get_accesses(issn=issn):
-                    f.write(u'%s\r\n' % self.fmt(data))
+        self.dump()
+
+        if self.append:
+            self.save_state()
+
+    def dump(self):
+
+        if self.output_format == 'parquet':
+            sink = sinks.ParquetSink(
+                self.output_file, PARQUET_COLUMNS,
+                partition_by=PARQUET_PARTITIONS if self.partitioned else None
+            )
+            for data in self.items():
+                sink.write(self.fmt(data))
+            sink.close()
+            return
+
+        if self.output_file and (self.compression or self.shard_by or
+                                 self.shard_rows or self.shard_bytes):
+            sink = sinks.ShardedSink(
+                self.output_file, compression=self.compression,
+                max_rows=self.shard_rows, max_bytes=self.shard_bytes
+            )
+            shard_key = SHARD_KEYS.get(self.shard_by, None)
+            for data in self.items():
+                sink.write(
+                    self.fmt(data),
+                    key=data[shard_key] if shard_key else None
+                )
+            sink.close()
+            return
+
+        append = self.append or self.resume_state is not None
+        sink = sinks.BufferedSink(self.output_file, mode='ab' if append else 'wb')
+        self._sink = sink
+        for data in self.items():
+            sink.write(self.fmt(data))
+        sink.close()
+
+        if self.checkpoint:
+            self.checkpoint.remove()
 
 
 def main():
@@ -380,17 +636,81 @@ def main():
     parser.add_argument(
         '--output_format',
         '-f',
-        choices=['json', 'csv'],
+        choices=['json', 'csv', 'parquet'],
         default=OUTPUT_FORMAT,
         help='Output format'
     )
 
+    parser.add_argument(
+        '--partitioned',
+        '-p',
+        action='store_true',
+        help='Partition the parquet output by collection and access year, the output file will be used as the root directory'
+    )
+
     parser.add_argument(
         '--output_file',
         '-r',
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--compression',
+        '-z',
+        choices=['gzip', 'zstd'],
+        help='Compress the output file, requires an output file'
+    )
+
+    parser.add_argument(
+        '--shard_by',
+        '-s',
+        choices=sorted(SHARD_KEYS.keys()),
+        help='Write one sequence of output files for each ISSN or access year, requires an output file'
+    )
+
+    parser.add_argument(
+        '--shard_rows',
+        type=int,
+        help='Start a new output file after the given number of rows, requires an output file'
+    )
+
+    parser.add_argument(
+        '--shard_bytes',
+        type=int,
+        help='Start a new output file after the given number of uncompressed bytes, requires an output file'
+    )
+
+    parser.add_argument(
+        '--top_k',
+        '-k',
+        type=int,
+        help='Dump only the k most accessed documents for each journal and access month'
+    )
+
+    parser.add_argument(
+        '--append',
+        '-a',
+        action='store_true',
+        help='Append only the months after the last complete month registered in the state file'
+    )
+
+    parser.add_argument(
+        '--state_file',
+        '-t',
+        help='JSON file registering the last complete month dumped for each collection, required by --append'
+    )
+
+    parser.add_argument(
+        '--checkpoint_file',
+        help='File to record the last written ISSN and document offset'
+    )
+
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='Resume from the checkpoint file, appending to the existing output file'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -421,7 +741,50 @@ def main():
         logger.error('Invalid until date: %s' % args.until_date)
         exit()
 
+    if args.output_format == 'parquet' and not args.output_file:
+        logger.error('The parquet output format requires an output file')
+        exit()
+
+    if args.output_format == 'parquet' and sinks.pyarrow is None:
+        logger.error('The parquet output format requires pyarrow')
+        exit()
+
+    if not args.output_file and (args.compression or args.shard_by or
+                                 args.shard_rows or args.shard_bytes):
+        logger.error('Compression and sharding require an output file')
+        exit()
+
+    if args.append and not args.state_file:
+        logger.error('The append mode requires a state file')
+        exit()
+
+    if args.append and args.until_date != UNTIL:
+        logger.error('The append mode always dumps until the last complete month, --until_date is not allowed')
+        exit()
+
+    if args.append and (args.output_format == 'parquet' or args.compression or
+                        args.shard_by or args.shard_rows or args.shard_bytes):
+        logger.error('The append mode is only available for plain CSV and JSON outputs')
+        exit()
+
+    if args.resume and not args.checkpoint_file:
+        logger.error('--resume requires --checkpoint_file')
+        exit()
+
+    if args.checkpoint_file and (not args.output_file or args.top_k or
+                                 args.output_format == 'parquet' or args.compression or
+                                 args.shard_by or args.shard_rows or args.shard_bytes):
+        logger.error('Checkpoints are only available for plain CSV and JSON output files')
+        exit()
+
+    if args.compression == 'zstd' and sinks.zstandard is None:
+        logger.error('The zstd compression requires zstandard')
+        exit()
+
     dumper = Dumper(args.collection, issns, args.from_date, args.until_date,
-        args.dayly_granularity, args.output_format, args.output_file)
+        args.dayly_granularity, args.output_format, args.output_file,
+        args.partitioned, args.compression, args.shard_by, args.shard_rows,
+        args.shard_bytes, args.append, args.state_file, args.top_k,
+        args.checkpoint_file, args.resume)
 
     dumper.run()
@@ -0,0 +1,87 @@
+# coding: utf-8
+"""
+Compara a vazão (linhas por segundo) da gravação linha a linha com codecs e
+print com a gravação através de sinks.BufferedSink.
+
+Uso: python benchmarks/bench_sinks.py [total de linhas]
+"""
+import os
+import sys
+import time
+import codecs
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import sinks
+
+LINE = u','.join([u'"%s"' % i for i in [
+    u'2016-01-01', u'document', u'scl', u'0102-6720', u'0102-6720;1678-2674',
+    u'ABCD. Arquivos Brasileiros de Cirurgia Digestiva (São Paulo)',
+    u'Health Sciences', u'0', u'0', u'0', u'1', u'0', u'0', u'0', u'0', u'0',
+    u'current', u'S0102-67202016000100001', u'2016', u'12', u'34', u'8'
+]])
+
+
+def codecs_writer(path, total):
+    with codecs.open(path, 'w', encoding='utf-8') as f:
+        for i in range(total):
+            f.write('%s\r\n' % LINE)
+
+
+def buffered_writer(path, total):
+    sink = sinks.BufferedSink(path)
+    for i in range(total):
+        sink.write(LINE)
+    sink.close()
+
+
+def print_stdout(path, total):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for i in range(total):
+            print(LINE.encode('utf-8'))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def buffered_stdout(path, total):
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'wb')
+    try:
+        sink = sinks.BufferedSink()
+        for i in range(total):
+            sink.write(LINE)
+        sink.close()
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def bench(func, path, total):
+    started = time.time()
+    func(path, total)
+    return total / (time.time() - started)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    handler, path = tempfile.mkstemp()
+    os.close(handler)
+
+    try:
+        for name, func in [
+            ('codecs per line', codecs_writer),
+            ('BufferedSink file', buffered_writer),
+            ('print per line', print_stdout),
+            ('BufferedSink stdout', buffered_stdout)
+        ]:
+            print('%-20s %12.0f rows/sec' % (name, bench(func, path, total)))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
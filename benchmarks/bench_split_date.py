@@ -0,0 +1,102 @@
+# coding: utf-8
+"""
+Compara a vazão (datas por segundo) da implementação anterior de
+utils.split_date, baseada em datetime.strptime, com a implementação atual,
+baseada em expressão regular e memoizada.
+
+As datas são as seis datas por documento utilizadas pela tabulação
+publication.documents_dates, obtidas do documento de fixture e variadas para
+simular a repetição de datas de uma coleção.
+
+Uso: PROCESSING_SETTINGS_FILE=config.ini python benchmarks/bench_split_date.py [total de documentos]
+"""
+import os
+import sys
+import time
+import random
+import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from xylose.scielodocument import Article
+
+import utils
+from tests.fixtures import articlemeta
+
+ATTRIBUTES = [
+    'receive_date',
+    'acceptance_date',
+    'review_date',
+    'publication_date',
+    'creation_date',
+    'update_date'
+]
+
+
+def strptime_is_valid_date(value):
+
+    try:
+        datetime.datetime.strptime(value, '%Y-%m-%d')
+    except:
+        try:
+            datetime.datetime.strptime(value, '%Y-%m')
+        except:
+            try:
+                datetime.datetime.strptime(value, '%Y')
+            except:
+                return False
+
+    return True
+
+
+def strptime_split_date(value):
+
+    if not strptime_is_valid_date(value):
+        return ('', '', '')
+
+    splited = value.split('-')
+
+    return tuple((splited + ['', '', ''])[0:3])
+
+
+def fixture_dates(total):
+
+    document = Article(articlemeta.document)
+    dates = [getattr(document, attr) or u'' for attr in ATTRIBUTES]
+
+    random.seed(0)
+    values = []
+    for i in range(total):
+        year = random.randint(1998, 2016)
+        for date in dates:
+            values.append(date.replace(date[0:4], unicode(year), 1) if date else date)
+
+    return values
+
+
+def bench(func, values):
+    started = time.time()
+    for value in values:
+        func(value)
+    return len(values) / (time.time() - started)
+
+
+def regex_split_date(value):
+
+    return utils._parse_date.__wrapped__(value) or ('', '', '')
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    values = fixture_dates(total)
+
+    for name, func in [
+        ('strptime', strptime_split_date),
+        ('regex', regex_split_date),
+        ('regex + lru', utils.split_date)
+    ]:
+        print('%-12s %12.0f dates/sec' % (name, bench(func, values)))
+
+
+if __name__ == '__main__':
+    main()
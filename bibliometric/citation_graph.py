@@ -0,0 +1,523 @@
+# coding: utf-8
+"""
+Este processamento constrói o grafo de citações entre documentos do SciELO a
+partir das citações recebidas pelos documentos de uma coleção, obtidas do
+Citedby, e o grava em disco para a extração de indicadores de rede (grau de
+entrada e saída por periódico, autocitação, meia-vida de citação e matrizes
+de citação entre periódicos) sem novas consultas ao Citedby.
+
+O grafo é mantido no formato CSR (compressed sparse row): os documentos são
+codificados como inteiros e, para cada documento citado, os documentos que o
+citam ocupam um trecho contíguo de um único array, delimitado por um array de
+offsets.
+"""
+import os
+import sys
+import gzip
+import json
+import array
+import argparse
+import logging
+from collections import defaultdict
+
+import utils
+import choices
+import citedby
+import identifiers
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'scielo-citation-graph'
+VERSION = 2
+
+
+def _config_logging(logging_level='INFO', logging_file=None):
+
+    allowed_levels = {
+        'DEBUG': logging.DEBUG,
+        'INFO': logging.INFO,
+        'WARNING': logging.WARNING,
+        'ERROR': logging.ERROR,
+        'CRITICAL': logging.CRITICAL
+    }
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    logger.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    if logging_file:
+        hl = logging.FileHandler(logging_file, mode='a')
+    else:
+        hl = logging.StreamHandler()
+
+    hl.setFormatter(formatter)
+    hl.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    logger.addHandler(hl)
+
+    return logger
+
+
+def pid_issn(pid):
+    """
+    ISSN do periódico contido no PID SciELO, ex:
+    S0102-67202009000300001: 0102-6720
+    """
+
+    return pid[1:10] if len(pid) == 23 else None
+
+
+def pid_year(pid):
+    """
+    Ano de publicação contido no PID SciELO, ou 0 quando indisponível.
+    """
+
+    year = pid[10:14]
+
+    return int(year) if year.isdigit() else 0
+
+
+class GraphBuilder(object):
+    """
+    Acumula as citações como pares (citado, citante) de inteiros e produz o
+    CitationGraph em build().
+
+    Cada documento recebe um inteiro na ordem em que é encontrado, como
+    citado ou citante. O periódico e o ano de cada documento são obtidos do
+    próprio PID, exceto para os documentos citados, informados pela coleção
+    junto com a indicação de documento citável.
+    """
+
+    def __init__(self):
+        self.pids = []
+        self.journals = []
+        self.node_journals = array.array('i')
+        self.node_years = array.array('H')
+        self.node_citable = array.array('b')
+        self._cited = array.array('i')
+        self._citing = array.array('i')
+        self._nodes = {}
+        self._journal_indexes = {}
+
+    def _journal(self, issn):
+
+        if not issn:
+            return -1
+
+        index = self._journal_indexes.get(issn)
+
+        if index is None:
+            index = len(self.journals)
+            self.journals.append(issn)
+            self._journal_indexes[issn] = index
+
+        return index
+
+    def node(self, pid, issn=None, year=None, citable=None):
+
+        index = self._nodes.get(pid)
+
+        if index is None:
+            index = len(self.pids)
+            self.pids.append(pid)
+            self._nodes[pid] = index
+            self.node_journals.append(self._journal(pid_issn(pid) or issn))
+            self.node_years.append(year or pid_year(pid))
+            self.node_citable.append(1 if citable else 0)
+            return index
+
+        # o ISSN do PID identifica o periódico de forma estável, o ISSN
+        # informado só é usado para PIDs que não o contém.
+        if issn and not pid_issn(pid):
+            self.node_journals[index] = self._journal(issn)
+
+        if year:
+            self.node_years[index] = year
+
+        if citable is not None:
+            self.node_citable[index] = 1 if citable else 0
+
+        return index
+
+    def add(self, pid, citations, issn=None, year=None, citable=None):
+        """
+        Registra as citações recebidas pelo documento pid, no formato
+        retornado pelo Citedby (lista de dicionários com code e issn do
+        documento citante).
+        """
+
+        cited = self.node(pid, issn, year, citable)
+
+        citing = set()
+        for item in citations:
+            if not item.get('code'):
+                continue
+            citing.add(self.node(item['code'], item.get('issn')))
+
+        for index in sorted(citing):
+            self._cited.append(cited)
+            self._citing.append(index)
+
+    def build(self):
+        """
+        Ordena os pares (citado, citante) por documento citado (counting
+        sort) e retorna o CitationGraph.
+        """
+
+        nodes = len(self.pids)
+
+        offsets = array.array('i', [0]) * (nodes + 1)
+        for cited in self._cited:
+            offsets[cited + 1] += 1
+
+        for index in range(nodes):
+            offsets[index + 1] += offsets[index]
+
+        position = array.array('i', offsets)
+        citing = array.array('i', [0]) * len(self._citing)
+        for cited, index in zip(self._cited, self._citing):
+            citing[position[cited]] = index
+            position[cited] += 1
+
+        return CitationGraph(
+            self.pids, self.journals, self.node_journals, self.node_years,
+            self.node_citable, offsets, citing
+        )
+
+
+class CitationGraph(object):
+    """
+    Grafo de citações no formato CSR.
+
+    pids: PID de cada documento (índice do documento no grafo).
+    journals: ISSN de cada periódico.
+    node_journals: índice do periódico de cada documento (-1 quando
+    desconhecido).
+    node_years: ano de publicação de cada documento (0 quando desconhecido).
+    node_citable: 1 para documentos citáveis da coleção, 0 para os demais
+    (inclusive documentos citantes de fora da coleção).
+    offsets: os documentos que citam o documento i estão em
+    citing[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, pids, journals, node_journals, node_years, node_citable,
+                 offsets, citing):
+        self.pids = pids
+        self.journals = journals
+        self.node_journals = node_journals
+        self.node_years = node_years
+        self.node_citable = node_citable
+        self.offsets = offsets
+        self.citing = citing
+        self._nodes = None
+
+    def __len__(self):
+        return len(self.pids)
+
+    @property
+    def edges(self):
+        return len(self.citing)
+
+    def index(self, pid):
+
+        if self._nodes is None:
+            self._nodes = dict([(value, i) for i, value in enumerate(self.pids)])
+
+        return self._nodes[pid]
+
+    def cited_by(self, pid):
+        """
+        Retorna os PID's dos documentos que citam o documento pid.
+        """
+
+        index = self.index(pid)
+
+        return [
+            self.pids[i] for i in self.citing[self.offsets[index]:self.offsets[index + 1]]
+        ]
+
+    def iter_edges(self):
+        """
+        Retorna os pares (citado, citante) de índices de documentos.
+        """
+
+        offsets = self.offsets
+        citing = self.citing
+        for cited in range(len(self.pids)):
+            for position in range(offsets[cited], offsets[cited + 1]):
+                yield (cited, citing[position])
+
+    def in_degrees(self):
+        """
+        Quantidade de citações recebidas por documento.
+        """
+
+        offsets = self.offsets
+
+        return array.array('i', [offsets[i + 1] - offsets[i] for i in range(len(self.pids))])
+
+    def out_degrees(self):
+        """
+        Quantidade de citações feitas por documento a documentos do grafo.
+        """
+
+        degrees = array.array('i', [0]) * len(self.pids)
+        for index in self.citing:
+            degrees[index] += 1
+
+        return degrees
+
+    def journal_degrees(self):
+        """
+        Retorna, para cada periódico, a tupla (citações recebidas, citações
+        feitas) por seus documentos.
+        """
+
+        degrees = defaultdict(lambda: [0, 0])
+        node_journals = self.node_journals
+        for cited, citing in self.iter_edges():
+            degrees[node_journals[cited]][0] += 1
+            degrees[node_journals[citing]][1] += 1
+
+        return dict([
+            (self.journals[journal], tuple(value))
+            for journal, value in degrees.items() if journal >= 0
+        ])
+
+    def journal_matrix(self, citing_years=None, cited_years=None):
+        """
+        Matriz de citações entre periódicos, no formato
+        {ISSN citante: {ISSN citado: citações}}.
+
+        citing_years e cited_years restringem os anos de publicação dos
+        documentos citantes e citados, ex: citing_years=[2015],
+        cited_years=[2013, 2014].
+        """
+
+        citing_years = set(citing_years) if citing_years else None
+        cited_years = set(cited_years) if cited_years else None
+
+        matrix = defaultdict(lambda: defaultdict(int))
+        node_journals = self.node_journals
+        node_years = self.node_years
+        for cited, citing in self.iter_edges():
+            if citing_years and node_years[citing] not in citing_years:
+                continue
+            if cited_years and node_years[cited] not in cited_years:
+                continue
+            if node_journals[cited] < 0 or node_journals[citing] < 0:
+                continue
+            matrix[self.journals[node_journals[citing]]][self.journals[node_journals[cited]]] += 1
+
+        return dict([(issn, dict(row)) for issn, row in matrix.items()])
+
+    def self_citations(self):
+        """
+        Retorna, para cada periódico, a tupla (autocitações, citações
+        recebidas).
+        """
+
+        result = {}
+        for issn, row in self.journal_matrix().items():
+            result.setdefault(issn, [0, 0])[0] = row.get(issn, 0)
+            for cited_issn, total in row.items():
+                result.setdefault(cited_issn, [0, 0])[1] += total
+
+        return dict([(issn, tuple(value)) for issn, value in result.items()])
+
+    def cited_half_life(self, issn, year):
+        """
+        Meia-vida de citação do periódico issn no ano year: quantidade de
+        anos, contados a partir de year, em que foram publicados os
+        documentos do periódico que receberam metade das citações feitas em
+        year. A fração do último ano é interpolada linearmente, ex: todas as
+        citações a documentos do próprio ano resultam em 0.5.
+
+        Retorna None quando o periódico não recebeu citações em year.
+        """
+
+        if issn not in self.journals:
+            return None
+
+        journal = self.journals.index(issn)
+
+        ages = defaultdict(int)
+        for cited, citing in self.iter_edges():
+            if self.node_journals[cited] != journal or self.node_years[citing] != year:
+                continue
+            cited_year = self.node_years[cited]
+            if not cited_year or cited_year > year:
+                continue
+            ages[year - cited_year] += 1
+
+        total = sum(ages.values())
+
+        if not total:
+            return None
+
+        half = total / 2.0
+        accumulated = 0
+        for age in range(max(ages) + 1):
+            if accumulated + ages[age] >= half:
+                return age + (half - accumulated) / float(ages[age])
+            accumulated += ages[age]
+
+    def save(self, path):
+        """
+        Grava o grafo comprimido com gzip: cabeçalho JSON, PID's (um por
+        linha) e os arrays do CSR no formato binário nativo.
+        """
+
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'byteorder': sys.byteorder,
+            'nodes': len(self.pids),
+            'edges': self.edges,
+            'journals': self.journals
+        }
+
+        with gzip.open(path, 'wb') as f:
+            f.write(json.dumps(header) + '\n')
+            for pid in self.pids:
+                f.write(pid.encode('utf-8') + '\n')
+            for values in [self.node_journals, self.node_years, self.node_citable, self.offsets, self.citing]:
+                f.write(values.tostring())
+
+    @classmethod
+    def load(cls, path):
+
+        with gzip.open(path, 'rb') as f:
+            header = json.loads(f.readline())
+
+            if header.get('format') != FORMAT or header.get('version') != VERSION:
+                raise ValueError('invalid citation graph file: %s' % path)
+
+            nodes = header['nodes']
+            pids = [f.readline()[:-1].decode('utf-8') for i in range(nodes)]
+
+            arrays = []
+            for typecode, size in [('i', nodes), ('H', nodes), ('b', nodes), ('i', nodes + 1), ('i', header['edges'])]:
+                values = array.array(typecode)
+                values.fromstring(f.read(values.itemsize * size))
+                if header['byteorder'] != sys.byteorder:
+                    values.byteswap()
+                arrays.append(values)
+
+        return cls(pids, header['journals'], *arrays)
+
+
+def build(dumper, issn_index=None):
+    """
+    Constrói o grafo a partir das citações recebidas pelos documentos da
+    coleção e ISSN's de um citedby.Dumper, consultadas com as mesmas opções
+    de concorrência e cache do Dumper.
+
+    Com um índice de ISSN's (identifiers.IssnIndex), os ISSN's impresso ou
+    eletrônico informados pelo Citedby para os documentos citantes são
+    convertidos para o ISSN SciELO, o mesmo utilizado para os documentos
+    citados.
+    """
+
+    builder = GraphBuilder()
+
+    results = utils.ordered_imap(
+        lambda data: (data, dumper.citations(data)), dumper.documents(),
+        workers=dumper.workers)
+
+    for data, citations in results:
+        if issn_index is not None:
+            citations = [
+                dict(item, issn=issn_index.canonical(item['issn']) or item['issn'])
+                if item.get('issn') else item for item in citations
+            ]
+        year = (data.publication_date or '')[0:4]
+        builder.add(
+            data.publisher_id, citations, data.journal.scielo_issn,
+            int(year) if year.isdigit() else None,
+            (data.document_type or '').lower() in choices.CITABLE_DOCUMENT_TYPES
+        )
+
+    return builder.build()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Build the citation graph of a collection from the Citedby'
+    )
+
+    parser.add_argument(
+        'issns',
+        nargs='*',
+        help='ISSN\'s separated by spaces'
+    )
+
+    parser.add_argument(
+        '--collection',
+        '-c',
+        help='Collection Acronym'
+    )
+
+    parser.add_argument(
+        '--output_file',
+        '-r',
+        default='citation_graph.gz',
+        help='File to receive the citation graph'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=1,
+        help='Number of concurrent requests to the Citedby'
+    )
+
+    parser.add_argument(
+        '--cache_file',
+        help='File to cache the citations of each document between runs'
+    )
+
+    parser.add_argument(
+        '--issn_index',
+        help='ISSN index file, built by processing_identifiers_index --index journals, '
+             'used to resolve print and electronic ISSNs to SciELO ISSNs'
+    )
+
+    parser.add_argument(
+        '--logging_file',
+        '-o',
+        help='Full path to the log file'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default='DEBUG',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    _config_logging(args.logging_level, args.logging_file)
+    logger.info('Building citation graph for: %s' % args.collection)
+
+    issn_index = identifiers.IssnIndex.load(args.issn_index) if args.issn_index else None
+
+    issns = [None]
+    if len(args.issns) > 0:
+        issns = utils.ckeck_given_issns(args.issns)
+        if issn_index is not None:
+            issns = issn_index.canonical_issns(issns, args.collection)
+
+    dumper = citedby.Dumper(
+        args.collection, issns, os.devnull, workers=args.workers,
+        cache_file=args.cache_file)
+
+    graph = build(dumper, issn_index)
+    dumper.close()
+
+    graph.save(args.output_file)
+    logger.info('Citation graph with %d documents and %d citations saved at %s' % (
+        len(graph), graph.edges, args.output_file))
@@ -7,12 +7,15 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 import json
 import datetime
 
 import utils
+import identifiers
+import sinks
+import caches
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -44,89 +47,131 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True),
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"document type", safe=True),
+    tabs.Column(u"document is citable", safe=True),
+    tabs.Column(u"document title"),
+    tabs.Column(u"cited by PID"),
+    tabs.Column(u"cited by ISSN"),
+    tabs.Column(u"cited by title"),
+    tabs.Column(u"cited by document title")
+]
+
+# campos das citações utilizados na tabulação, os demais campos retornados
+# pelo Citedby não são mantidos em memória nem no cache.
+CITEDBY_FIELDS = ['code', 'issn', 'source', 'titles']
+
+# prazos de validade, em dias, das citações mantidas em cache. Documentos
+# publicados nos últimos RECENT_YEARS anos são os que mais recebem novas
+# citações e são consultados novamente após RECENT_CACHE_TTL dias.
+CACHE_TTL = 30
+RECENT_CACHE_TTL = 1
+RECENT_YEARS = 3
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv', append=False,
+                 workers=1, cache_file=None, cache_ttl=CACHE_TTL):
 
         self._citedby = utils.citedby_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-
-        header = [u"PID", u"ISSN", u"título", u"área temática", u"ano de publicação", u"tipo de documento", u"título do documento", u"citado por PID", u"citado por ISSN", u"citado por título", u"citado por título do documento"]
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.workers = workers
+        self.cache = caches.TTLCache(cache_file) if cache_file else None
+        self.cache_ttl = cache_ttl
+        self.recent_since = unicode(datetime.date.today().year - RECENT_YEARS)
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.encode = tabs.journal_prefix.encoder(COLUMNS, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(tabs.journal_prefix.schema(COLUMNS).header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
+
+        if self.cache is not None:
+            self.cache.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
 
     def citedby(self, pid):
         data = self._citedby.citedby_pid(pid, False)
         dataj = json.loads(data)
-        if isinstance(dataj, dict):
-            for item in dataj.get('cited_by', []):
-                yield item
 
-    def items(self):
+        if not isinstance(dataj, dict):
+            return []
 
-        if not self.issns:
-            self.issns = [None]
+        return [
+            dict([(key, item[key]) for key in CITEDBY_FIELDS if key in item])
+            for item in dataj.get('cited_by', [])
+        ]
+
+    def _cache_ttl(self, data):
+
+        if (data.publication_date or '')[0:4] >= self.recent_since:
+            return RECENT_CACHE_TTL * caches.DAY
+
+        return self.cache_ttl * caches.DAY
+
+    def citations(self, data):
+        """
+        Retorna as citações recebidas pelo documento, consultando o Citedby
+        apenas quando as citações não estão no cache ou estão expiradas.
+        """
+
+        if self.cache is None:
+            return self.citedby(data.publisher_id)
+
+        citations = self.cache.get(data.publisher_id)
+
+        if citations is None:
+            citations = self.citedby(data.publisher_id)
+            self.cache.set(data.publisher_id, citations, self._cache_ttl(data))
+
+        return citations
+
+    def process(self, data):
+        for item in self.citations(data):
+            self.write(self.fmt_csv(data, item))
+
+    def documents(self):
 
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % data.publisher_id)
-                for item in self.citedby(data.publisher_id):
-                    yield self.fmt_csv(data, item)
+                yield data
+
+    def items(self):
+
+        if not self.issns:
+            self.issns = [None]
+
+        # até 2 * workers documentos aguardam a consulta ao Citedby ou a
+        # gravação das linhas, na ordem de leitura dos documentos.
+        results = utils.ordered_imap(
+            lambda data: (data, self.citations(data)), self.documents(),
+            workers=self.workers)
+
+        for data, citations in results:
+            for item in citations:
+                yield self.fmt_csv(data, item)
 
     def fmt_csv(self, data, citedby):
         know_languages = set(['pt', 'es', 'en'])
         languages = set(data.languages())
 
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
-
         line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
         line.append(data.publisher_id)
         line.append(data.publication_date[0:4])
         line.append(data.document_type)
@@ -141,7 +186,7 @@ class Dumper(object):
         else:
             line.append('')
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
+        joined_line = self.encode(data, line)
 
         return joined_line
 
@@ -170,6 +215,42 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=1,
+        help='Number of concurrent requests to the Citedby'
+    )
+
+    parser.add_argument(
+        '--cache_file',
+        help='File to cache the citations of each document between runs'
+    )
+
+    parser.add_argument(
+        '--cache_ttl',
+        type=int,
+        default=CACHE_TTL,
+        help='Days before the cached citations are requested again, documents '
+             'published in the last %d years are requested again after %d day(s)' % (
+                 RECENT_YEARS, RECENT_CACHE_TTL)
+    )
+
+    parser.add_argument(
+        '--issn_index',
+        help='ISSN index file, built by processing_identifiers_index --index journals, '
+             'used to resolve print and electronic ISSNs to SciELO ISSNs'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -191,7 +272,10 @@ def main():
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
+        issns = identifiers.canonical_issns(issns, args.issn_index, args.collection)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(
+        args.collection, issns, args.output_file, args.output_format,
+        workers=args.workers, cache_file=args.cache_file, cache_ttl=args.cache_ttl)
 
     dumper.run()
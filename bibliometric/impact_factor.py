@@ -1,16 +1,21 @@
 # coding: utf-8
 """
 Este processamento gera uma tabulação de fator de impacto dos periódicos SciELO. 
+
+Os indicadores são obtidos do Analytics ou, com um grafo de citações
+(bibliometric.citation_graph), calculados localmente por LocalImpactFactor.
 """
 
+import array
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
-from clients.analytics import Analytics
-import choices
+import sinks
+import tabs
+import citation_graph
+
+from clients import analytics
 
 logger = logging.getLogger(__name__)
 
@@ -42,45 +47,185 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"base year", safe=True),
+    tabs.Column(u"imediacity", safe=True),
+    tabs.Column(u"SciELO impact 1 year", safe=True),
+    tabs.Column(u"SciELO impact 2 years", safe=True),
+    tabs.Column(u"SciELO impact 3 years", safe=True),
+    tabs.Column(u"SciELO impact 4 years", safe=True),
+    tabs.Column(u"SciELO impact 5 years", safe=True)
+]
+
+# maior janela, em anos, dos indicadores de impacto
+IMPACT_WINDOW = 5
+
+
+def citation_counts(graph):
+    """
+    Obtém, em uma única passagem pelo grafo de citações, as contagens
+    utilizadas pelos indicadores de impacto. Retorna a tupla
+    (primeiro ano, publicações, citações), onde:
+
+    publicações: {ISSN: array com a quantidade de documentos citáveis
+    publicados em cada ano, a partir do primeiro ano}
+
+    citações: {ISSN: array com as citações recebidas em cada ano citante por
+    documentos publicados até IMPACT_WINDOW anos antes, na posição
+    ano citante * (IMPACT_WINDOW + 1) + idade do documento citado}
+    """
+
+    years = [i for i in graph.node_years if i]
+
+    if not years:
+        return (None, {}, {})
+
+    first_year = min(years)
+    width = max(years) - first_year + 1
+    stride = IMPACT_WINDOW + 1
+
+    node_journals = graph.node_journals
+    node_years = graph.node_years
+
+    publications = {}
+    for node, citable in enumerate(graph.node_citable):
+        journal = node_journals[node]
+        if not citable or journal < 0 or not node_years[node]:
+            continue
+        if journal not in publications:
+            publications[journal] = array.array('i', [0]) * width
+        publications[journal][node_years[node] - first_year] += 1
+
+    citations = {}
+    for cited, citing in graph.iter_edges():
+        journal = node_journals[cited]
+        if journal < 0 or not node_years[cited] or not node_years[citing]:
+            continue
+        age = node_years[citing] - node_years[cited]
+        if age < 0 or age > IMPACT_WINDOW:
+            continue
+        if journal not in citations:
+            citations[journal] = array.array('i', [0]) * (width * stride)
+        citations[journal][(node_years[citing] - first_year) * stride + age] += 1
+
+    journals = graph.journals
+
+    return (
+        first_year,
+        dict([(journals[i], value) for i, value in publications.items()]),
+        dict([(journals[i], value) for i, value in citations.items()])
+    )
+
+
+def _ratio(numerator, denominator):
+
+    return numerator / float(denominator) if denominator else 0.0
+
+
+def impact_factors(first_year, publications, citations):
+    """
+    Calcula os indicadores de todos os periódicos a partir das contagens de
+    citation_counts. Retorna {ISSN: linhas}, com uma linha por ano base, a
+    partir do primeiro ano com documentos citáveis do periódico, no formato
+    de Analytics.impact_factor: [ano base, imediatez, impacto 1 ano, ...,
+    impacto 5 anos].
+
+    imediatez: citações recebidas no ano base por documentos do ano base,
+    dividido pelos documentos citáveis do ano base.
+
+    impacto n anos: citações recebidas no ano base por documentos dos n anos
+    anteriores, dividido pelos documentos citáveis desses n anos. Os
+    numeradores e denominadores das janelas são acumulados ano a ano, em uma
+    única passagem para as cinco janelas.
+    """
+
+    stride = IMPACT_WINDOW + 1
+    result = {}
+
+    for issn, published in publications.items():
+        cited = citations.get(issn) or array.array('i', [0]) * (len(published) * stride)
+        start = next(i for i, total in enumerate(published) if total)
+
+        rows = []
+        for year in range(start, len(published)):
+            base = year * stride
+            line = [unicode(first_year + year), _ratio(cited[base], published[year])]
+            total_citations = 0
+            total_published = 0
+            for age in range(1, stride):
+                total_citations += cited[base + age]
+                if year - age >= 0:
+                    total_published += published[year - age]
+                line.append(_ratio(total_citations, total_published))
+            rows.append(line)
+
+        result[issn] = rows
+
+    return result
+
+
+class LocalImpactFactor(object):
+    """
+    Alternativa local ao cliente do Analytics. Os indicadores de todos os
+    periódicos são calculados na criação, a partir de um grafo de citações da
+    coleção, e consultados com impact_factor(issn, collection), que retorna
+    as linhas no mesmo formato de Analytics.impact_factor ou None para
+    periódicos sem documentos citáveis no grafo.
+    """
+
+    def __init__(self, graph):
+        self._impact_factors = impact_factors(*citation_counts(graph))
+
+    @classmethod
+    def load(cls, path):
+        return cls(citation_graph.CitationGraph.load(path))
+
+    def impact_factor(self, issn, collection=None):
+        return self._impact_factors.get(issn)
+
+    def close(self):
+        pass
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 citation_graph=None, workers=analytics.WORKERS, cache_file=None,
+                 cache_ttl=analytics.CACHE_TTL):
+        """
+        citation_graph: arquivo do grafo de citações da coleção, utilizado
+        para o cálculo local dos indicadores no lugar do Analytics.
+
+        workers, cache_file e cache_ttl: requisições simultâneas ao Analytics
+        e cache das respostas entre execuções (ver clients.analytics).
+        """
         self._articlemeta = utils.articlemeta_server()
-        self._analytics = Analytics()
+        if citation_graph:
+            self._analytics = LocalImpactFactor.load(citation_graph)
+        else:
+            self._analytics = analytics.Analytics(
+                workers=workers, cache_file=cache_file, cache_ttl=cache_ttl)
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"base year")
-        header.append(u"imediacity")
-        header.append(u"SciELO impact 1 year")
-        header.append(u"SciELO impact 2 years")
-        header.append(u"SciELO impact 3 years")
-        header.append(u"SciELO impact 4 years")
-        header.append(u"SciELO impact 5 years")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.workers = workers
+        self.output_file = sinks.BufferedSink(output_file)
+        schema = tabs.Schema(tabs.prefix_columns(u'journal') + COLUMNS)
+        self.encode = schema.encoder(output_format)
+
+        if output_format == 'csv':
+            self.write(schema.header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
+        self._analytics.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
     def items(self):
@@ -88,42 +233,30 @@ class Dumper(object):
         if not self.issns:
             self.issns = [None]
 
-        for issn in self.issns:
-            for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                for item in self.fmt_csv(data):
-                    yield item
-
-    def fmt_csv(self, data):
-
-        issns = []
-        if data.print_issn:
-            issns.append(data.print_issn)
-        if data.electronic_issn:
-            issns.append(data.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'journal')
-        line.append(data.collection_acronym)
-        line.append(data.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.title)
-        line.append(u';'.join(data.subject_areas))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.subject_areas]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.subject_areas or []) > 1 else '0')
-        line.append(data.current_status)
-
-        impact_factor = self._analytics.impact_factor(data.scielo_issn, self.collection)
+        journals = (
+            data for issn in self.issns
+            for data in self._articlemeta.journals(
+                collection=self.collection, issn=issn)
+        )
+
+        # os indicadores de até self.workers periódicos são obtidos
+        # simultaneamente, mantendo a ordem dos periódicos na saída.
+        results = utils.ordered_imap(
+            lambda data: (data, self._analytics.impact_factor(
+                data.scielo_issn, self.collection)),
+            journals, workers=self.workers)
+
+        for data, impact_factor in results:
+            for item in self.fmt_csv(data, impact_factor):
+                yield item
+
+    def fmt_csv(self, data, impact_factor):
+
+        line = [data.collection_acronym]
+        line += tabs.journal_columns(data)
 
         for item in impact_factor or []:
-            l = None
-            l = line + [str(i) for i in item]
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in l])
-            yield joined_line
+            yield self.encode(line + [str(i) for i in item])
 
 
 def main():
@@ -150,6 +283,41 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--citation_graph',
+        '-g',
+        help='Compute the indicators locally from a citation graph file, built '
+             'by processing_bibliometric_citation_graph, instead of requesting the Analytics'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=analytics.WORKERS,
+        help='Number of concurrent requests to the Analytics'
+    )
+
+    parser.add_argument(
+        '--cache_file',
+        help='File to cache the Analytics responses between runs'
+    )
+
+    parser.add_argument(
+        '--cache_ttl',
+        type=int,
+        default=analytics.CACHE_TTL,
+        help='Days before a cached Analytics response is requested again'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -172,6 +340,9 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(
+        args.collection, issns, args.output_file, output_format=args.output_format,
+        citation_graph=args.citation_graph, workers=args.workers,
+        cache_file=args.cache_file, cache_ttl=args.cache_ttl)
 
     dumper.run()
@@ -0,0 +1,72 @@
+# coding: utf-8
+"""
+Caches persistentes utilizados pelos processamentos para evitar, entre
+execuções, consultas repetidas aos serviços remotos.
+"""
+import time
+import shelve
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DAY = 24 * 60 * 60
+DEFAULT_TTL = 30 * DAY
+
+
+class TTLCache(object):
+    """
+    Cache persistente em disco (shelve) com prazo de validade por registro.
+
+    Cada registro é gravado junto com o instante em que expira, calculado a
+    partir do ttl (em segundos) informado na gravação ou do ttl padrão do
+    cache. Registros expirados são tratados como ausentes e substituídos na
+    próxima gravação.
+
+    O acesso ao arquivo é protegido por lock, permitindo que o cache seja
+    compartilhado pelas threads de um processamento.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._shelf = shelve.open(path, protocol=2)
+
+    def _key(self, key):
+
+        # no Python 2 as chaves do shelve devem ser str (bytes); no Python 3,
+        # str (texto)
+        if str is bytes and not isinstance(key, str):
+            return key.encode('utf-8')
+
+        return key
+
+    def get(self, key, default=None):
+
+        with self._lock:
+            item = self._shelf.get(self._key(key))
+
+            if item is None or item[0] < time.time():
+                self.misses += 1
+                return default
+
+            self.hits += 1
+
+        return item[1]
+
+    def set(self, key, value, ttl=None):
+
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._shelf[self._key(key)] = (expires, value)
+
+    def close(self):
+
+        with self._lock:
+            self._shelf.close()
+
+        logger.info('Cache %s: %d hits, %d misses' % (self.path, self.hits, self.misses))
@@ -3,19 +3,90 @@
 Client for the analytics.scielo.org.
 
 This client connects to ajx interfaces to collect impact-factor indicadors.
+
+The requests share a pooled HTTP session (keep-alive), may be issued
+concurrently for many ISSNs and, optionally, the responses are kept in a
+disk cache between runs.
 """
 import logging
 
 import requests
+from requests.adapters import HTTPAdapter
+
+import utils
+import caches
 
 logger = logging.getLogger(__name__)
 
+# requisições simultâneas ao Analytics nas consultas em lote
+WORKERS = 4
+# prazo de validade, em dias, das respostas mantidas em cache
+CACHE_TTL = 7
+
 
 class Analytics(object):
 
-    def __init__(self):
+    def __init__(self, workers=WORKERS, cache_file=None, cache_ttl=CACHE_TTL):
+        """
+        workers: requisições simultâneas nas consultas em lote, também
+        utilizado como tamanho do pool de conexões da sessão HTTP.
+
+        cache_file: arquivo do cache das respostas do Analytics, mantidas por
+        cache_ttl dias.
+        """
 
         self.source = 'http://analytics.scielo.org'
+        self.workers = workers
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._cache = caches.TTLCache(
+            cache_file, cache_ttl * caches.DAY) if cache_file else None
+
+    def close(self):
+
+        self._session.close()
+
+        if self._cache is not None:
+            self._cache.close()
+
+    def _get(self, endpoint, payload):
+        """
+        Obtém o json de um endpoint do Analytics, consultando antes o cache de
+        respostas. Respostas inválidas não são mantidas em cache.
+        """
+        url = self.source + endpoint
+        key = u'%s?%s' % (endpoint, u'&'.join(
+            [u'%s=%s' % (k, v) for k, v in sorted(payload.items())]))
+
+        if self._cache is not None:
+            data = self._cache.get(key)
+            if data is not None:
+                return data
+
+        try:
+            logger.debug('Requesting data to Analytics %s %s' % (url, str(payload)))
+            response = self._session.get(url, params=payload, timeout=360)
+        except Exception as e:
+            logger.error('Could not retrieve data from Analytics %s %s' % (url, str(payload)))
+            return None
+
+        if not 200 <= response.status_code < 300:
+            logger.error('Analytics returned status %d for %s %s' % (
+                response.status_code, url, str(payload)))
+            return None
+
+        try:
+            data = response.json()
+        except:
+            logger.error('Could not load json for Analytics %s %s' % (url, str(payload)))
+            return None
+
+        if self._cache is not None:
+            self._cache.set(key, data)
+
+        return data
 
     def _compute_impact_factor(self, data):
 
@@ -39,24 +110,38 @@ class Analytics(object):
     def impact_factor(self, issn, collection):
         endpoint = '/ajx/bibliometrics/journal/impact_factor_chart'
 
-        url = self.source + endpoint
-
         payload = {
             "journal":  issn,
             "collection":  collection
         }
 
-        try:
-            logger.debug('Requesting data to Analytics %s %s' % (url, str(payload)))
-            response = requests.get(url, params=payload, timeout=360)
-        except Exception as e:
-            logger.error('Could not retrieve data from Analytics %s %s' % (url, str(payload)))
-            return None
+        data = self._get(endpoint, payload)
 
-        try:
-            data = response.json()
-        except:
-            logger.error('Could not load json for Analytics %s %s' % (url, str(payload)))
+        if data is None:
             return None
 
-        return self._compute_impact_factor(data)
\ No newline at end of file
+        return self._compute_impact_factor(data)
+
+    def impact_factors(self, issns, collection):
+        """
+        Obtém os indicadores de impacto de vários periódicos, com até
+        self.workers requisições simultâneas. Retorna um gerador de tuplas
+        (issn, indicadores) na ordem dos ISSNs informados.
+        """
+
+        return utils.ordered_imap(
+            lambda issn: (issn, self.impact_factor(issn, collection)),
+            issns, workers=self.workers)
+
+    def collection_impact_factors(self, collection):
+        """
+        Obtém os indicadores de impacto de todos os periódicos da coleção
+        registrados no Article Meta. Retorna {issn: indicadores}.
+        """
+
+        issns = (
+            journal.scielo_issn for journal in
+            utils.articlemeta_server().journals(collection=collection)
+        )
+
+        return dict(self.impact_factors(issns, collection))
\ No newline at end of file
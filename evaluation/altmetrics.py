@@ -1,22 +1,61 @@
 # coding: utf-8
 """
 Este processamento gera uma tabulação com scores do altimetrics para documentos SciELO
+
+As páginas de resultados de cada periódico são obtidas do Altmetric em uma
+sessão HTTP compartilhada, com até workers páginas em andamento, respeitando
+os limites de requisições informados pelo Altmetric. Opcionalmente, os
+resultados de cada periódico são mantidos em cache entre execuções.
 """
 
+import time
 import argparse
 import logging
-import codecs
+import itertools
+import threading
 import requests
 import urlparse
-import datetime
+
+from requests.adapters import HTTPAdapter
 
 import utils
+import sinks
+import caches
+import tabs
 import choices
+import identifiers
 
 logger = logging.getLogger(__name__)
 
 ALTMETRICS_API_URL = 'http://api.altmetric.com/v1/citations/at'
 ALTMETRICS_KEY = '8f87ca8cd778d4140b1ef713afa4008d'
+ALTMETRICS_PAGE_SIZE = 100
+
+# campos dos resultados utilizados na tabulação, os demais campos retornados
+# pelo Altmetric não são mantidos em memória nem no cache.
+ALTMETRICS_FIELDS = ['url', 'title', 'doi', 'details_url', 'score', 'last_updated']
+
+# páginas de um periódico consultadas simultaneamente
+WORKERS = 4
+# novas tentativas de uma página após erro de conexão, resposta inválida ou
+# limite de requisições excedido. Entre tentativas após erro são aguardados
+# RETRY_WAIT segundos, dobrando a cada tentativa.
+MAX_RETRIES = 5
+RETRY_WAIT = 2
+# espera, em segundos, após limite de requisições excedido sem Retry-After
+RATE_LIMIT_WAIT = 60
+# prazo de validade, em dias, dos resultados mantidos em cache. Também é o
+# prazo máximo de reutilização de resultados desatualizados (ver _signature).
+CACHE_TTL = 7
+
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True),
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"document type", safe=True),
+    tabs.Column(u"document is citable", safe=True),
+    tabs.Column(u"score", safe=True),
+    tabs.Column(u"altmetrics url")
+]
 
 
 def _config_logging(logging_level='INFO', logging_file=None):
@@ -54,79 +93,214 @@ def get_doi_from_url(url):
     return None
 
 
+class RateLimiter(object):
+    """
+    Escalonador das requisições ao Altmetric compartilhado pelas threads.
+
+    Mantém um intervalo mínimo de min_interval segundos entre o início das
+    requisições e, após uma resposta de limite excedido, suspende todas as
+    requisições pelo tempo solicitado pelo Altmetric (pause).
+    """
+
+    def __init__(self, min_interval=0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0
+        self._paused_until = 0
+
+    def wait(self):
+
+        while True:
+            with self._lock:
+                now = time.time()
+                if self._paused_until > now:
+                    delay = self._paused_until - now
+                else:
+                    delay = self._next - now
+                    if delay <= 0:
+                        self._next = now + self.min_interval
+                        return
+            time.sleep(delay)
+
+    def pause(self, seconds):
+
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+
+
+def _retry_after(response):
+
+    try:
+        return int(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return RATE_LIMIT_WAIT
+
+
+def _signature(data):
+    """
+    Assinatura da primeira página de resultados de um periódico: total de
+    resultados e maior last_updated da página. Resultados mantidos em cache
+    com a mesma assinatura são reutilizados sem consultar as demais páginas.
+
+    A API do Altmetric não ordena os resultados por last_updated, portanto a
+    atualização de um registro das demais páginas, sem alteração do total, não
+    muda a assinatura. Nesse caso o resultado em cache é reutilizado até
+    expirar, após cache_ttl dias.
+    """
+
+    updated = [i.get('last_updated', 0) for i in data.get('results', [])]
+
+    return (data.get('query', {}).get('total'), max(updated or [0]))
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, workers=WORKERS,
+                 cache_file=None, cache_ttl=CACHE_TTL, min_interval=0,
+                 identifiers_index=None):
+        """
+        workers: páginas de um periódico consultadas simultaneamente.
+
+        cache_file: arquivo do cache dos resultados de cada periódico,
+        mantidos por cache_ttl dias.
+
+        min_interval: intervalo mínimo, em segundos, entre requisições.
+
+        identifiers_index: arquivo do índice de identificadores, utilizado
+        para obter os documentos pelo DOI sem consultas ao Article Meta.
+        """
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._rate_limiter = RateLimiter(min_interval)
+        self.cache = caches.TTLCache(
+            cache_file, cache_ttl * caches.DAY) if cache_file else None
+        self.identifiers = identifiers.IdentifierIndex.load(
+            identifiers_index) if identifiers_index else None
+        self.workers = workers
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-        header.append(u"score")
-        header.append(u'altmetrics url')
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(output_file)
+        schema = tabs.Schema(tabs.prefix_columns(u'document') + COLUMNS)
+        self.encode = schema.encoder()
+
+        self.write(schema.header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
+        self._session.close()
+
+        if self.cache is not None:
+            self.cache.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
 
-    def altmetrics_items_by_journals(self, issn):
+    def altmetrics_page(self, issn, page):
+        """
+        Obtém uma página de resultados do periódico. Retorna a tupla
+        (sucesso, dados), onde dados é None ao final da paginação. Após
+        MAX_RETRIES novas tentativas sem sucesso a página é abandonada.
+        """
 
         payload = {
-            'num_results': 100,
-            'key': ALTMETRICS_KEY
+            'num_results': ALTMETRICS_PAGE_SIZE,
+            'key': ALTMETRICS_KEY,
+            'issns': issn,
+            'page': page
         }
-        payload['issns'] = issn
-        page = 0
-        while True:
-            page += 1
-            payload['page'] = page
+
+        for attempt in range(MAX_RETRIES + 1):
+            self._rate_limiter.wait()
+
             try:
                 logger.debug('Requesting data to altmetrics %s' % str(payload))
-                response = requests.get(ALTMETRICS_API_URL, params=payload, timeout=10)
+                response = self._session.get(ALTMETRICS_API_URL, params=payload, timeout=10)
             except Exception as e:
                 logger.error('Could not retrieve data from altmetrics %s' % str(payload))
+                time.sleep(RETRY_WAIT * 2 ** attempt)
                 continue
 
             if response.status_code == 404:  # fim de paginacao
-                raise StopIteration
+                return (True, None)
+
+            if response.status_code in (420, 429):  # limite de requisições
+                wait = _retry_after(response)
+                logger.warning('Altmetric rate limit exceeded, waiting %d seconds' % wait)
+                self._rate_limiter.pause(wait)
+                continue
 
             try:
                 data = response.json()
             except:
                 logger.debug('Invalid JSON data retrieved for %s' % response.url)
+                time.sleep(RETRY_WAIT * 2 ** attempt)
                 continue
 
-            if data == 'Not Found':
-                raise StopIteration
+            if data == 'Not Found' or not isinstance(data, dict):
+                return (True, None)
+
+            return (True, data)
+
+        logger.error('Giving up data from altmetrics %s' % str(payload))
 
-            for item in data.get('results', []):
+        return (False, None)
+
+    def altmetrics_items_by_journals(self, issn):
+
+        success, data = self.altmetrics_page(issn, 1)
+
+        if data is None:
+            return
+
+        signature = _signature(data)
+
+        if self.cache is not None:
+            cached = self.cache.get(issn)
+            if cached is not None and cached[0] == signature:
+                for item in cached[1]:
+                    yield item
+                return
+
+        total = data.get('query', {}).get('total')
+        if total is not None:
+            pages = range(2, (int(total) - 1) // ALTMETRICS_PAGE_SIZE + 2)
+        else:
+            pages = itertools.count(2)
+
+        # as páginas seguintes são consultadas com até self.workers páginas
+        # em andamento; os itens são entregues na ordem das páginas.
+        results = itertools.chain([(success, data)], utils.ordered_imap(
+            lambda page: self.altmetrics_page(issn, page), pages,
+            workers=self.workers, window=self.workers))
+
+        items = []
+        complete = True
+        for success, data in results:
+            if not success:
+                complete = False
+                continue
+
+            if data is None or not data.get('results'):
+                break
+
+            for item in data['results']:
+                item = dict([(key, item[key]) for key in ALTMETRICS_FIELDS if key in item])
+                items.append(item)
                 yield item
 
+        if self.cache is not None and complete:
+            self.cache.set(issn, (signature, items))
+
     def items(self):
 
         if not self.issns:
@@ -137,6 +311,13 @@ class Dumper(object):
                 for altmetrics_item in self.altmetrics_items_by_journals(data.scielo_issn):
                     yield self.fmt_csv(data, altmetrics_item)
 
+    def document(self, doi):
+
+        if self.identifiers is not None:
+            return self.identifiers.document(doi, self.collection)
+
+        return self._articlemeta.document(doi.upper(), self.collection)
+
     def fmt_csv(self, data, altmetrics):
         article = None
         url = altmetrics.get('url', None)
@@ -146,34 +327,15 @@ class Dumper(object):
         pid = urlparse.parse_qs(urlparse.urlparse(url).query).get('pid', None) if url else None
 
         if doi:
-            article = self._articlemeta.document(doi.upper(), self.collection)
+            article = self.document(doi)
 
         publication_date = article.publication_date if article else u'not defined'
         publisher_id = article.publisher_id if article else u'not defined'
         document_type = article.document_type if article else u'not defined'
         score = altmetrics.get('score', None)
 
-        issns = []
-        if data.print_issn:
-            issns.append(data.print_issn)
-        if data.electronic_issn:
-            issns.append(data.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.title)
-        line.append(u';'.join(data.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.subject_areas or []) > 1 else '0')
-        line.append(data.current_status)
+        line = [data.collection_acronym]
+        line += tabs.journal_columns(data)
         line.append(publisher_id)
         if publication_date == u'not define':
             line.append(document_type)
@@ -187,7 +349,7 @@ class Dumper(object):
         line.append(str(score) or u'0')
         line.append(details_url or u'not defined')
 
-        return u','.join([u'"%s"' % i.replace(u'"', u'""') for i in line])
+        return self.encode(line)
 
 
 def main():
@@ -214,6 +376,47 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=WORKERS,
+        help='Number of concurrent pages requested to the Altmetric for each ISSN'
+    )
+
+    parser.add_argument(
+        '--cache_file',
+        help='File to cache the Altmetric results of each ISSN between runs'
+    )
+
+    parser.add_argument(
+        '--cache_ttl',
+        type=int,
+        default=CACHE_TTL,
+        help='Days before the cached results of an ISSN are requested again, also the '
+             'maximum age of results changed beyond the first page'
+    )
+
+    parser.add_argument(
+        '--min_interval',
+        type=float,
+        default=0,
+        help='Minimum interval, in seconds, between requests to the Altmetric'
+    )
+
+    parser.add_argument(
+        '--identifiers_index',
+        '-i',
+        help='Identifiers index file, built by processing_identifiers_index, '
+             'used to find the documents by DOI instead of requesting the ArticleMeta'
+    )
+
+    parser.add_argument(
+        '--issn_index',
+        help='ISSN index file, built by processing_identifiers_index --index journals, '
+             'used to resolve print and electronic ISSNs to SciELO ISSNs'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -235,7 +438,11 @@ def main():
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
+        issns = identifiers.canonical_issns(issns, args.issn_index, args.collection)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    dumper = Dumper(
+        args.collection, issns, args.output_file, workers=args.workers,
+        cache_file=args.cache_file, cache_ttl=args.cache_ttl,
+        min_interval=args.min_interval, identifiers_index=args.identifiers_index)
 
     dumper.run()
@@ -6,7 +6,6 @@ nesta fonte de informação.
 import os
 import argparse
 import logging
-import codecs
 import json
 import time
 from io import BytesIO, StringIO
@@ -18,6 +17,9 @@ from lxml import etree
 from doaj.journals import Journals
 
 import utils
+import sinks
+import tabs
+import identifiers
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +70,18 @@ def request_api(url, timeout=3, attempts=10):
         attempt += 1
 
 
+COLUMNS = [
+    tabs.Column(u"coleção", safe=True),
+    tabs.Column(u"issn scielo", safe=True),
+    tabs.Column(u"issn impresso", safe=True),
+    tabs.Column(u"issn eletrônico", safe=True),
+    tabs.Column(u"título"),
+    tabs.Column(u"ID no DOAJ"),
+    tabs.Column(u"Provider no DOAJ"),
+    tabs.Column(u"Status no DOAJ")
+]
+
+
 class Dumper(object):
 
     def __init__(self, collection, issns=None, output_file=None):
@@ -76,10 +90,11 @@ class Dumper(object):
         self.collection = collection
         self.doaj_journals = Journals()
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = [u"coleção",u"issn scielo",u"issn impresso",u"issn eletrônico",u"título",u"ID no DOAJ",u"Provider no DOAJ",u"Status no DOAJ"]
+        self.output_file = sinks.BufferedSink(output_file)
+        schema = tabs.Schema(COLUMNS)
+        self.encode = schema.encoder()
 
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.write(schema.header())
 
     def get_doaj_journal(self, issns):
         data = {}
@@ -109,14 +124,15 @@ class Dumper(object):
         return data
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
 
     def items(self):
 
@@ -125,13 +141,7 @@ class Dumper(object):
 
         for issn in self.issns:
             for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                jissns = set()
-                if data.print_issn:
-                    jissns.add(data.print_issn)
-                if data.electronic_issn:
-                    jissns.add(data.print_issn)
-                jissns.add(data.scielo_issn)
-                in_doaj = self.get_doaj_journal(list(jissns))
+                in_doaj = self.get_doaj_journal(identifiers.journal_issns(data))
                 yield self.fmt_csv(data, in_doaj)
         
     def fmt_csv(self, data, in_doaj):
@@ -147,9 +157,7 @@ class Dumper(object):
             in_doaj.get('active', "")
         ]
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return self.encode(line)
 
 def main():
 
@@ -175,6 +183,12 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--issn_index',
+        help='ISSN index file, built by processing_identifiers_index --index journals, '
+             'used to resolve print and electronic ISSNs to SciELO ISSNs'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -196,6 +210,7 @@ def main():
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
+        issns = identifiers.canonical_issns(issns, args.issn_index, args.collection)
 
     dumper = Dumper(args.collection, issns, args.output_file)
 
@@ -7,9 +7,10 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 
 import utils
+import sinks
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +42,35 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"Título do Periódico (publication_title)"),
+    tabs.Column(u"ISSN impresso (print_identifier)", safe=True),
+    tabs.Column(u"ISSN online (online_identifier)", safe=True),
+    tabs.Column(u"Data do primeiro fascículo (date_first_issue_online)", safe=True),
+    tabs.Column(u"volume do primeiro fascículo (num_first_vol_online)"),
+    tabs.Column(u"número do primeiro fascículo (num_first_issue_online)"),
+    tabs.Column(u"Data do último fascículo publicado (date_last_issue_online)", safe=True),
+    tabs.Column(u"volume do último fascículo publicado (num_last_vol_online)"),
+    tabs.Column(u"número do último fascículo publicado (num_last_issue_online)"),
+    tabs.Column(u"url de fascículos (title_url)"),
+    tabs.Column(u"primeiro autor (first_author)", value=u''),
+    tabs.Column(u"ID do periódico no SciELO (title_id)", safe=True),
+    tabs.Column(u"informação de embargo (embargo_info)", value=u''),
+    tabs.Column(u"cobertura (coverage_depth)", value=u''),
+    tabs.Column(u"informação sobre cobertura (coverage_notes)", value=u''),
+    tabs.Column(u"nome do publicador (publisher_name)"),
+    tabs.Column(u"tipo de publicação (publication_type)", value=u'Serial'),
+    tabs.Column(u"data de publicação monográfica impressa (date_monograph_published_print)", value=u''),
+    tabs.Column(u"data de publicação monográfica online (date_monograph_published_online)", value=u''),
+    tabs.Column(u"volume de monografia (monograph_volume)", value=u''),
+    tabs.Column(u"edição de monografia (monograph_edition)", value=u''),
+    tabs.Column(u"primeiro editor (first_editor)", value=u''),
+    tabs.Column(u"ID de publicação pai (parent_publication_title_id)", value=u''),
+    tabs.Column(u"ID de publicação prévia (preceding_publication_title_id)", value=u''),
+    tabs.Column(u"tipo de acesso (access_type)", value=u'F')
+]
+
+
 class Dumper(object):
 
     def __init__(self, collection, issns=None, output_file=None):
@@ -50,37 +80,11 @@ class Dumper(object):
         self._publicationstats = utils.publicationstats_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = [
-            u"Título do Periódico (publication_title)",
-            u"ISSN impresso (print_identifier)",
-            u"ISSN online (online_identifier)",
-            u"Data do primeiro fascículo (date_first_issue_online)",
-            u"volume do primeiro fascículo (num_first_vol_online)",
-            u"número do primeiro fascículo (num_first_issue_online)",
-            u"Data do último fascículo publicado (date_last_issue_online)",
-            u"volume do último fascículo publicado (num_last_vol_online)",
-            u"número do último fascículo publicado (num_last_issue_online)",
-            u"url de fascículos (title_url)",
-            u"primeiro autor (first_author)",
-            u"ID do periódico no SciELO (title_id)",
-            u"informação de embargo (embargo_info)",
-            u"cobertura (coverage_depth)",
-            u"informação sobre cobertura (coverage_notes)",
-            u"nome do publicador (publisher_name)",
-            u"tipo de publicação (publication_type)",
-            u"data de publicação monográfica impressa (date_monograph_published_print)",
-            u"data de publicação monográfica online (date_monograph_published_online)",
-            u"volume de monografia (monograph_volume)",
-            u"edição de monografia (monograph_edition)",
-            u"primeiro editor (first_editor)",
-            u"ID de publicação pai (parent_publication_title_id)",
-            u"ID de publicação prévia (preceding_publication_title_id)",
-            u"tipo de acesso (access_type)"
-
-        ]
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(output_file)
+        schema = tabs.Schema(COLUMNS)
+        self.encode = schema.encoder()
+
+        self.write(schema.header())
 
     def _first_included_document_by_journal(self, issn, collection):
 
@@ -107,14 +111,15 @@ class Dumper(object):
         return document
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
 
     def items(self):
 
@@ -150,25 +155,12 @@ class Dumper(object):
         else:
             line += ['', '', '']
         line.append(data.url().replace('sci_serial', 'sci_issues'))
-        line.append('')  # first_author
         line.append(data.scielo_issn or '')
-        line.append('')  # embargo_info
-        line.append('')  # coverage_depth
-        line.append('')  # coverage_notes
-        line.append(' '.join(data.publisher_name) if data.publisher_name else [])  # publisher_name
-        line.append('Serial')  # publication_type
-        line.append('')  # date_monograph_published_print
-        line.append('')  # date_monograph_published_online
-        line.append('')  # monograph_volume
-        line.append('')  # monograph_edition
-        line.append('')  # first_editor
-        line.append('')  # parent_publication_title_id
-        line.append('')  # preceding_publication_title_id
-        line.append('F')  # access_type
-
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        line.append(' '.join(data.publisher_name) if data.publisher_name else '')  # publisher_name
+
+        # first_author, embargo_info, coverage_*, publication_type, colunas de
+        # monografia e access_type são constantes do COLUMNS.
+        return self.encode(line)
 
 
 def main():
@@ -10,7 +10,6 @@ Formato de saída:
 import os
 import argparse
 import logging
-import codecs
 import json
 
 from io import StringIO
@@ -19,6 +18,8 @@ import packtools
 from packtools.catalogs import XML_CATALOG
 
 import utils
+import sinks
+import tabs
 
 os.environ['XML_CATALOG_FILES'] = XML_CATALOG
 logger = logging.getLogger(__name__)
@@ -51,23 +52,42 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"coleção", safe=True),
+    tabs.Column(u"pid", safe=True),
+    tabs.Column(u"título"),
+    tabs.Column(u"volume"),
+    tabs.Column(u"número"),
+    tabs.Column(u"ano de publicação"),
+    tabs.Column(u"primeira página"),
+    tabs.Column(u"primeria página seq"),
+    tabs.Column(u"última página"),
+    tabs.Column(u"e-location"),
+    tabs.Column(u"ahead of print id"),
+    tabs.Column(u"chave")
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, append=False):
 
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns or [None]
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = [u"coleção", u"pid", u"título", u"volume", u"número", u"ano de publicação", u"primeira página", u"primeria página seq" u"última página", u"e-location", u"ahead of print id", u"chave"]
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        schema = tabs.Schema(COLUMNS)
+        self.encode = schema.encoder()
 
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        if not append:
+            self.write(schema.header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def fmt_json(self, data, xml_etree):
 
@@ -120,9 +140,7 @@ class Dumper(object):
 
         line.append(natural_key)
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return self.encode(line)
 
     def parse(self, xml):
         f = StringIO(xml)
@@ -143,30 +161,35 @@ class Dumper(object):
 
         return utils.call_django_slugify(joined_values)
 
+    def process(self, document):
+
+        try:
+            xml = self._articlemeta.document(
+                document.publisher_id, document.collection_acronym,
+                fmt='xmlrsps')
+        except Exception as e:
+            logger.exception(e)
+            logger.error('Fail to read document: %s_%s' % (
+                document.publisher_id, document.collection_acronym))
+            xml = u''
+
+        et = self.parse(xml)
+
+        if not et:
+            logger.error('Fail to parse xml document: %s_%s' % (
+                document.publisher_id, document.collection_acronym))
+            return
+
+        self.write(self.fmt_json(document, et))
+
     def run(self):
         for issn in self.issns:
             for document in self._articlemeta.documents(
                     collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % document.publisher_id)
+                self.process(document)
 
-                try:
-                    xml = self._articlemeta.document(
-                        document.publisher_id, document.collection_acronym,
-                        fmt='xmlrsps')
-                except Exception as e:
-                    logger.exception(e)
-                    logger.error('Fail to read document: %s_%s' % (
-                        document.publisher_id, document.collection_acronym))
-                    xml = u''
-
-                et = self.parse(xml)
-
-                if not et:
-                    logger.error('Fail to parse xml document: %s_%s' % (
-                        document.publisher_id, document.collection_acronym))
-                    continue
-
-                self.write(self.fmt_json(document, et))
+        self.close()
 
 
 def main():
@@ -6,8 +6,9 @@ Formato de saída:
 """
 import argparse
 import logging
-import codecs
 import utils
+import sinks
+import tabs
 from choices import ISO_3166_COUNTRY_AS_KEY
 
 logger = logging.getLogger(__name__)
@@ -39,39 +40,66 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"coleção", safe=True),
+    tabs.Column(u"PID", safe=True),
+    tabs.Column(u"ano de publicação", safe=True),
+    tabs.Column(u"tipo de documento", safe=True),
+    tabs.Column(u"título"),
+    tabs.Column(u"número"),
+    tabs.Column(u"normalizado", safe=True),
+    tabs.Column(u"id de afiliação"),
+    tabs.Column(u"instituição original"),
+    tabs.Column(u"paises original"),
+    tabs.Column(u"instituição normalizada"),
+    tabs.Column(u"país normalizado ISO-3661"),
+    tabs.Column(u"código de país normalizado ISO-3166", safe=True),
+    tabs.Column(u"estado normalizado ISO-3166"),
+    tabs.Column(u"código de estado normalizado ISO-3166")
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None, not_normalized=True):
+    def __init__(self, collection, issns=None, output_file=None, not_normalized=True, append=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = output_file
         self.not_normalized = not_normalized
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        schema = tabs.Schema(COLUMNS)
+        self.encode = schema.encoder()
 
-    def run(self):
+        if not append:
+            self.write(schema.header())
+
+    def write(self, lines):
+
+        if isinstance(lines, unicode):
+            lines = [lines]
+
+        self.output_file.writelines(lines)
 
-        header = [u"coleção", u"PID", u"ano de publicação", u"tipo de documento",u"título", u"número", u"normalizado", u"id de afiliação", u"instituição original", u"paises original", u"instituição normalizada", u"país normalizado ISO-3661", u"código de país normalizado ISO-3166", u"estado normalizado ISO-3166", u"código de estado normalizado ISO-3166"]
+    def close(self):
+        self.output_file.close()
+
+    def process(self, data):
+        self.write(self.fmt_csv(data))
+
+    def run(self):
 
         if not self.issns:
             self.issns = [None]
 
-        if not self.output_file:
-            print('%s\r\n' % ','.join(header))
-            for issn in self.issns:
-                for data in self.get_data(issn=issn):
-                    for item in self.fmt_csv(data):
-                        print(item)
-            exit()
-
-        with codecs.open(self.output_file, 'w', encoding='utf-8') as f:
-            f.write('%s\r\n' % ','.join(header))
-            for issn in self.issns:
-                for data in self.get_data(issn=issn):
-                    for item in self.fmt_csv(data):
-                        f.write('%s\r\n' % item)
-        
+        for issn in self.issns:
+            for data in self.get_data(issn=issn):
+                self.process(data)
+
+        self.close()
+
     def fmt_csv(self, data):
 
         line = [
@@ -84,8 +112,7 @@ class Dumper(object):
         ]
 
         if len(data.mixed_affiliations) == 0:
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line+['0']])
-            yield joined_line
+            yield self.encode(line + ['0'])
 
         original_aff = {aff['index']:aff for aff in data.affiliations or []}
         normalized_aff = {aff['index']:aff for aff in data.normalized_affiliations or []}
@@ -118,8 +145,7 @@ class Dumper(object):
                 normalized_state
             ]
 
-            joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line+aff_line])
-            yield joined_line
+            yield self.encode(line + aff_line)
 
     def get_data(self, issn):
         for document in self._articlemeta.documents(collection=self.collection, issn=issn):
@@ -3,9 +3,12 @@
 Este processamento realiza a exportação/atualização de número de citações e
 acessos no índice da ferramenta de busca search.scielo.org
 """
+import re
 import argparse
 import logging
 import json
+import threading
+import unicodedata
 
 import requests
 
@@ -14,6 +17,8 @@ import utils
 
 logger = logging.getLogger(__name__)
 
+REGEX_NOT_WORD = re.compile(r'\W+', re.UNICODE)
+
 
 def _config_logging(logging_level='INFO', logging_file=None):
 
@@ -42,28 +47,100 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+def meta_key(title, surname, year):
+    """
+    Chave normalizada de uma consulta de citações por metadados: título e
+    sobrenome sem acentos, pontuação e diferenças de caixa ou espaçamento.
+    """
+
+    def normalize(value):
+        value = unicodedata.normalize('NFKD', value)
+        value = u''.join([i for i in value if not unicodedata.combining(i)])
+        return u' '.join(REGEX_NOT_WORD.sub(u' ', value.lower()).split())
+
+    return (normalize(title), normalize(surname), int(year))
+
+
+def _total_received(response):
+
+    try:
+        total = json.loads(response)['article']['total_received']
+    except:
+        total = None
+
+    return total
+
+
+class _Lookup(object):
+
+    def __init__(self):
+        self.result = None
+        self.done = threading.Event()
+
+
+class MetaCitations(object):
+    """
+    Consultas de citações recebidas por metadados (título, sobrenome do
+    primeiro autor e ano) ao Citedby, memoizadas pela chave normalizada.
+
+    Documentos com a mesma chave, como traduções e registros duplicados,
+    resultam em uma única consulta ao Citedby. Threads que solicitam uma chave
+    já em consulta aguardam o resultado da consulta em andamento.
+    """
+
+    def __init__(self, citedby):
+        self._citedby = citedby
+        self._lock = threading.Lock()
+        self._lookups = {}
+        self.hits = 0
+        self.misses = 0
+
+    def total_received(self, title, surname, year):
+
+        key = meta_key(title, surname, year)
+
+        with self._lock:
+            lookup = self._lookups.get(key)
+            owner = lookup is None
+            if owner:
+                lookup = self._lookups[key] = _Lookup()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if owner:
+            try:
+                lookup.result = _total_received(
+                    self._citedby.citedby_meta(title, surname, int(year)))
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                lookup.done.set()
+
+        lookup.done.wait()
+
+        return lookup.result
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, citations_mode='pid'):
+    def __init__(self, collection, issns=None, citations_mode='pid', workers=1):
 
         self._articlemeta = utils.articlemeta_server()
         self._accessstats = utils.accessstats_server()
         self._cited_by = utils.citedby_server()
+        self._meta_citations = MetaCitations(self._cited_by)
         self._search = Search()
         self._load_citations = self._load_citations_by_meta if citations_mode == 'meta' else self._load_citations_by_pid
         self.collection = collection
         self.issns = issns or [None]
+        self.workers = workers
 
     def _load_citations_by_pid(self, item):
 
         response = self._cited_by.citedby_pid(item.publisher_id)
 
-        try:
-            total = json.loads(response)['article']['total_received']
-        except:
-            total = None
-
-        return total
+        return _total_received(response)
 
     def _load_citations_by_meta(self, item):
 
@@ -71,15 +148,10 @@ class Dumper(object):
         year = item.publication_date[0:4] if item.publication_date else None
         surname = item.authors[0].get('surname', None) if item.authors else None
 
-        if title and surname and year:
-            response = self._cited_by.citedby_meta(title, surname, int(year))
+        if not (title and surname and year and year.isdigit()):
+            return None
 
-        try:
-            total = json.loads(response)['article']['total_received']
-        except:
-            total = None
-
-        return total
+        return self._meta_citations.total_received(title, surname, year)
 
     def _load_accesses(self, item):
 
@@ -93,18 +165,39 @@ class Dumper(object):
 
         return total
 
+    def indicators(self, item):
+
+        citations = self._load_citations(item)
+        accesses = self._load_accesses(item)
+
+        item_id = '-'.join([item.publisher_id, item.collection_acronym])
+
+        return (item_id, citations, accesses)
+
+    def process(self, item):
+
+        self._search.update_document_indicators(*self.indicators(item))
+
+    def close(self):
+
+        self._search.deploy()
+
+        if self._meta_citations.misses:
+            logger.info('Citedby meta lookups: %d requests, %d reused' % (
+                self._meta_citations.misses, self._meta_citations.hits))
+
     def run(self):
         logger.info('Export started')
 
-        for item in self.items():
-            citations = self._load_citations(item)
-            accesses = self._load_accesses(item)
+        # as consultas ao Citedby e ao AccessStats são feitas por até workers
+        # threads; as atualizações no índice seguem a ordem dos documentos.
+        results = utils.ordered_imap(
+            self.indicators, self.items(), workers=self.workers)
 
-            item_id = '-'.join([item.publisher_id, item.collection_acronym])
-            self._search.update_document_indicators(
-                item_id, citations, accesses)
+        for indicators in results:
+            self._search.update_document_indicators(*indicators)
 
-        self._search.deploy()
+        self.close()
 
         logger.info('Export finished')
 
@@ -146,6 +239,14 @@ def main():
         help='Mode to retrieve received citations.'
     )
 
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=1,
+        help='Number of concurrent documents being looked up in the Citedby and AccessStats'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -168,6 +269,7 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.citations_mode)
+    dumper = Dumper(
+        args.collection, issns, args.citations_mode, workers=args.workers)
 
     dumper.run()
@@ -17,6 +17,7 @@ import packtools
 from packtools.catalogs import XML_CATALOG
 from lxml.etree import XMLSyntaxError
 import utils
+import sinks
 
 os.environ['XML_CATALOG_FILES'] = XML_CATALOG
 logger = logging.getLogger(__name__)
@@ -128,6 +129,15 @@ class Dumper(object):
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns or [None]
+        self.output_file = sinks.BufferedSink()
+        self._lock = threading.Lock()
+
+    def write(self, line):
+        with self._lock:
+            self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def fmt_json(self, data):
 
@@ -161,12 +171,21 @@ class Dumper(object):
 
         output_format.update(analyze_xml(xml))
 
-        print(json.dumps(output_format))
+        line = json.dumps(output_format)
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+
+        self.write(line)
 
         del xml
         for key in output_format.keys():
             del(output_format[key])
 
+    def process(self, document):
+
+        doc = self.fmt_json(document)
+        self.summaryze_xml_validation(doc['code'], doc['collection'], doc)
+
     def _worker(self, q, t):
 
         while True:
@@ -200,6 +219,8 @@ class Dumper(object):
         for job in jobs:
             job.join()
 
+        self.close()
+
 
 def main():
 
@@ -0,0 +1,563 @@
+# coding: utf-8
+"""
+Índice de identificadores dos documentos SciELO.
+
+Os acessos e os serviços externos identificam um documento por diferentes
+formas: PID SciELO, chave FBPE, DOI e caminho do PDF. O índice, construído a
+partir de uma única coleta no Article Meta, associa cada uma dessas formas ao
+documento (coleção, PID) e, no sentido inverso, o documento a todas as suas
+formas, sem consultas remotas.
+
+O índice é gravado comprimido com gzip: cabeçalho JSON e uma linha JSON por
+documento. As chaves de consulta são reconstruídas na carga; chaves FBPE não
+são armazenadas, pois são convertidas para o PID na consulta.
+
+Da mesma forma, o índice de ISSN's associa os ISSN's impresso, eletrônico e
+SciELO de cada periódico ao registro do periódico, identificado pelo ISSN
+SciELO.
+"""
+import re
+import gzip
+import json
+import argparse
+import logging
+from collections import namedtuple
+
+import utils
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'scielo-identifiers-index'
+ISSN_FORMAT = 'scielo-issn-index'
+VERSION = 1
+
+REGEX_PDF_PATH = re.compile(r'/pdf.*\.pdf$')
+REGEX_FBPE = re.compile(r'^(S\d{4}-\d{3}[\dX])\((\d{2})\)(\d{9})$')
+
+# documento indexado, com os mesmos nomes de atributos de
+# xylose.scielodocument.Article
+Document = namedtuple('Document', [
+    'collection_acronym',
+    'publisher_id',
+    'doi',
+    'publication_date',
+    'document_type',
+    'pdfs'
+])
+
+# periódico indexado, com os mesmos nomes de atributos de
+# xylose.scielodocument.Journal
+Journal = namedtuple('Journal', [
+    'collection_acronym',
+    'scielo_issn',
+    'print_issn',
+    'electronic_issn',
+    'title'
+])
+
+
+def _config_logging(logging_level='INFO', logging_file=None):
+
+    allowed_levels = {
+        'DEBUG': logging.DEBUG,
+        'INFO': logging.INFO,
+        'WARNING': logging.WARNING,
+        'ERROR': logging.ERROR,
+        'CRITICAL': logging.CRITICAL
+    }
+
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    logger.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    if logging_file:
+        hl = logging.FileHandler(logging_file, mode='a')
+    else:
+        hl = logging.StreamHandler()
+
+    hl.setFormatter(formatter)
+    hl.setLevel(allowed_levels.get(logging_level, 'INFO'))
+
+    logger.addHandler(hl)
+
+    return logger
+
+
+def pdf_keys(fulltexts):
+
+    keys = []
+
+    if not 'pdf' in fulltexts:
+        return keys
+
+    for language, url in fulltexts['pdf'].items():
+        path = REGEX_PDF_PATH.search(url)
+        if path:
+            keys.append(path.group().upper())
+
+    return keys
+
+
+def fbpe_key(code):
+    """
+    input:
+        'S0102-67202009000300001'
+    output:
+        'S0102-6720(09)000300001'
+    """
+
+    begin = code[0:10]
+    year = code[12:14]
+    end = code[14:]
+
+    return '%s(%s)%s' % (begin, year, end)
+
+
+def eligible_match_keys(document):
+    keys = []
+
+    keys.append(document.publisher_id)
+    keys.append(fbpe_key(document.publisher_id))
+    if document.doi:
+        keys.append(document.doi)
+    keys += pdf_keys(document.fulltexts())
+
+    return keys
+
+
+def journal_issns(journal):
+    """
+    Retorna os ISSN's impresso, eletrônico e SciELO do periódico, nesta
+    ordem e sem repetições.
+    """
+
+    issns = []
+    for issn in [journal.print_issn, journal.electronic_issn, journal.scielo_issn]:
+        if issn and issn not in issns:
+            issns.append(issn)
+
+    return issns
+
+
+def _key(identifier):
+
+    key = identifier.strip().upper()
+
+    return key.encode('utf-8') if str is bytes and isinstance(key, utils.text_type) else key
+
+
+class IdentifierIndex(object):
+    """
+    Índice bidirecional entre as formas de identificação e os documentos.
+
+    Os documentos são mantidos em listas paralelas, indexadas pela posição
+    do documento, e cada forma de identificação (PID, DOI e caminhos de PDF,
+    sem diferença de caixa) é associada à posição do documento em um único
+    dicionário. Uma mesma forma presente em mais de uma coleção é associada
+    à lista das posições.
+    """
+
+    def __init__(self):
+        self.collections = []
+        self.pids = []
+        self.dois = []
+        self.dates = []
+        self.document_types = []
+        self.pdfs = []
+        self._keys = {}
+        self._interned = {}
+
+    def __len__(self):
+        return len(self.pids)
+
+    def _intern(self, value):
+
+        return self._interned.setdefault(value, value)
+
+    def _index(self, identifier, position):
+
+        key = _key(identifier)
+        current = self._keys.get(key)
+
+        if current is None:
+            self._keys[key] = position
+        elif isinstance(current, list):
+            if position not in current:
+                current.append(position)
+        elif current != position:
+            self._keys[key] = [current, position]
+
+    def add(self, collection, pid, doi=None, publication_date=None,
+            document_type=None, pdfs=()):
+
+        position = len(self.pids)
+        self.collections.append(self._intern(collection))
+        self.pids.append(pid)
+        self.dois.append(doi or None)
+        self.dates.append(publication_date or None)
+        self.document_types.append(self._intern(document_type or None))
+        self.pdfs.append(tuple(pdfs))
+
+        self._index(pid, position)
+        if doi:
+            self._index(doi, position)
+        for pdf in pdfs:
+            self._index(pdf, position)
+
+        return position
+
+    def add_document(self, document):
+
+        return self.add(
+            document.collection_acronym, document.publisher_id, document.doi,
+            document.publication_date, document.document_type,
+            pdf_keys(document.fulltexts())
+        )
+
+    def _positions(self, identifier):
+
+        match = REGEX_FBPE.match(identifier.strip().upper())
+
+        if match:
+            # a chave FBPE mantém apenas dois dígitos do ano
+            begin, year, end = match.groups()
+            candidates = ['%s%s%s%s' % (begin, century, year, end) for century in ['19', '20']]
+        else:
+            candidates = [identifier]
+
+        positions = []
+        for candidate in candidates:
+            found = self._keys.get(_key(candidate))
+            if found is None:
+                continue
+            positions += found if isinstance(found, list) else [found]
+
+        return positions
+
+    def _position(self, identifier, collection=None):
+
+        for position in self._positions(identifier):
+            if collection is None or self.collections[position] == collection:
+                return position
+
+    def lookup(self, identifier, collection=None):
+        """
+        Retorna (coleção, PID) do documento identificado por PID, chave FBPE,
+        DOI ou caminho do PDF, opcionalmente restrito a uma coleção, ou None.
+        """
+
+        position = self._position(identifier, collection)
+
+        if position is None:
+            return None
+
+        return (self.collections[position], self.pids[position])
+
+    def document(self, identifier, collection=None):
+        """
+        Retorna o Document identificado por qualquer uma de suas formas de
+        identificação, opcionalmente restrito a uma coleção, ou None.
+        """
+
+        position = self._position(identifier, collection)
+
+        if position is None:
+            return None
+
+        return Document(
+            self.collections[position],
+            self.pids[position],
+            self.dois[position],
+            self.dates[position] or u'',
+            self.document_types[position] or u'',
+            list(self.pdfs[position])
+        )
+
+    def identifiers(self, collection, pid):
+        """
+        Retorna todas as formas de identificação do documento, na ordem de
+        eligible_match_keys, ou uma lista vazia para documentos não indexados.
+        """
+
+        position = self._position(pid, collection)
+
+        if position is None:
+            return []
+
+        pid = self.pids[position]
+        keys = [pid, fbpe_key(pid)]
+        if self.dois[position]:
+            keys.append(self.dois[position])
+        keys += self.pdfs[position]
+
+        return keys
+
+    def save(self, path):
+
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'documents': len(self.pids)
+        }
+
+        with gzip.open(path, 'wb') as f:
+            f.write(json.dumps(header) + '\n')
+            for position in range(len(self.pids)):
+                f.write(json.dumps([
+                    self.collections[position],
+                    self.pids[position],
+                    self.dois[position],
+                    self.dates[position],
+                    self.document_types[position],
+                    self.pdfs[position]
+                ]) + '\n')
+
+    @classmethod
+    def load(cls, path):
+
+        index = cls()
+
+        with gzip.open(path, 'rb') as f:
+            header = json.loads(f.readline())
+
+            if header.get('format') != FORMAT or header.get('version') != VERSION:
+                raise ValueError('invalid identifiers index file: %s' % path)
+
+            for line in f:
+                index.add(*json.loads(line))
+
+        return index
+
+
+class IssnIndex(object):
+    """
+    Índice de equivalência entre os ISSN's dos periódicos.
+
+    Qualquer ISSN do periódico (impresso, eletrônico ou SciELO) é associado
+    ao registro canônico do periódico, identificado pelo ISSN SciELO. Um
+    periódico presente em mais de uma coleção tem um registro por coleção.
+    """
+
+    def __init__(self):
+        self.journals = []
+        self._issns = {}
+
+    def __len__(self):
+        return len(self.journals)
+
+    def add(self, collection, scielo_issn, print_issn=None, electronic_issn=None,
+            title=None):
+
+        position = len(self.journals)
+        journal = Journal(collection, scielo_issn, print_issn or None,
+                          electronic_issn or None, title or None)
+        self.journals.append(journal)
+
+        for issn in journal_issns(journal):
+            positions = self._issns.setdefault(_key(issn), [])
+            if position not in positions:
+                positions.append(position)
+
+        return position
+
+    def add_journal(self, journal):
+
+        return self.add(
+            journal.collection_acronym, journal.scielo_issn, journal.print_issn,
+            journal.electronic_issn, journal.title
+        )
+
+    def journal(self, issn, collection=None):
+        """
+        Retorna o Journal de qualquer um dos ISSN's do periódico,
+        opcionalmente restrito a uma coleção, ou None.
+        """
+
+        for position in self._issns.get(_key(issn or u''), []):
+            journal = self.journals[position]
+            if collection is None or journal.collection_acronym == collection:
+                return journal
+
+    def canonical(self, issn, collection=None):
+        """
+        Retorna o ISSN SciELO do periódico de qualquer um de seus ISSN's ou
+        None para ISSN's não indexados.
+        """
+
+        journal = self.journal(issn, collection)
+
+        return journal.scielo_issn if journal else None
+
+    def equivalents(self, issn, collection=None):
+        """
+        Retorna todos os ISSN's do periódico, na ordem de journal_issns.
+        """
+
+        journal = self.journal(issn, collection)
+
+        return journal_issns(journal) if journal else []
+
+    def canonical_issns(self, issns, collection=None):
+        """
+        Converte os ISSN's informados para os ISSN's SciELO, sem repetições.
+        ISSN's não indexados são mantidos.
+        """
+
+        result = []
+        for issn in issns:
+            issn = self.canonical(issn, collection) or issn
+            if issn not in result:
+                result.append(issn)
+
+        return result
+
+    def save(self, path):
+
+        header = {
+            'format': ISSN_FORMAT,
+            'version': VERSION,
+            'journals': len(self.journals)
+        }
+
+        with gzip.open(path, 'wb') as f:
+            f.write(json.dumps(header) + '\n')
+            for journal in self.journals:
+                f.write(json.dumps(list(journal)) + '\n')
+
+    @classmethod
+    def load(cls, path):
+
+        index = cls()
+
+        with gzip.open(path, 'rb') as f:
+            header = json.loads(f.readline())
+
+            if header.get('format') != ISSN_FORMAT or header.get('version') != VERSION:
+                raise ValueError('invalid ISSN index file: %s' % path)
+
+            for line in f:
+                index.add(*json.loads(line))
+
+        return index
+
+
+def build(collections, issns=None):
+    """
+    Constrói o índice a partir dos documentos das coleções e ISSN's
+    informados, obtidos do Article Meta.
+    """
+
+    articlemeta = utils.articlemeta_server()
+    index = IdentifierIndex()
+
+    for collection in collections:
+        for issn in issns or [None]:
+            for document in articlemeta.documents(collection=collection, issn=issn):
+                logger.debug('Reading document: %s' % document.publisher_id)
+                index.add_document(document)
+
+    return index
+
+
+def canonical_issns(issns, issn_index=None, collection=None):
+    """
+    Converte os ISSN's informados na linha de comando para os ISSN's SciELO
+    pelo índice de ISSN's gravado em issn_index, quando informado.
+    """
+
+    if not issns or not issn_index:
+        return issns
+
+    return IssnIndex.load(issn_index).canonical_issns(issns, collection)
+
+
+def build_issn_index(collections):
+    """
+    Constrói o índice de ISSN's a partir dos periódicos das coleções
+    informadas, obtidos do Article Meta.
+    """
+
+    articlemeta = utils.articlemeta_server()
+    index = IssnIndex()
+
+    for collection in collections:
+        for journal in articlemeta.journals(collection=collection):
+            logger.debug('Reading journal: %s' % journal.scielo_issn)
+            index.add_journal(journal)
+
+    return index
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Build the index of document identifiers (PID, FBPE key, DOI and PDF path) '
+                    'or the index of journal ISSNs'
+    )
+
+    parser.add_argument(
+        'issns',
+        nargs='*',
+        help='ISSN\'s separated by spaces'
+    )
+
+    parser.add_argument(
+        '--collection',
+        '-c',
+        help='Collection Acronym'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Index the documents of every collection registered in the ArticleMeta'
+    )
+
+    parser.add_argument(
+        '--index',
+        '-x',
+        default='documents',
+        choices=['documents', 'journals'],
+        help='Index of document identifiers or of journal ISSNs'
+    )
+
+    parser.add_argument(
+        '--output_file',
+        '-r',
+        help='File to receive the index, default: identifiers.gz or issns.gz'
+    )
+
+    parser.add_argument(
+        '--logging_file',
+        '-o',
+        help='Full path to the log file'
+    )
+
+    parser.add_argument(
+        '--logging_level',
+        '-l',
+        default='DEBUG',
+        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
+        help='Logggin level'
+    )
+
+    args = parser.parse_args()
+    _config_logging(args.logging_level, args.logging_file)
+
+    issns = None
+    if len(args.issns) > 0:
+        issns = utils.ckeck_given_issns(args.issns)
+
+    collections = utils.collection_acronyms() if args.all_collections else [args.collection]
+    logger.info('Building %s index for: %s' % (args.index, ', '.join(collections)))
+
+    if args.index == 'journals':
+        output_file = args.output_file or 'issns.gz'
+        index = build_issn_index(collections)
+    else:
+        output_file = args.output_file or 'identifiers.gz'
+        index = build(collections, issns)
+
+    index.save(output_file)
+    logger.info('Index with %d %s saved at %s' % (
+        len(index), args.index, output_file))
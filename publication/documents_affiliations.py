@@ -5,11 +5,11 @@ coleção SciELO.
 """
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
+import sinks
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -41,92 +41,75 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True),
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"document type", safe=True),
+    tabs.Column(u"document is citable", safe=True),
+    tabs.Column(u"document affiliation instituition"),
+    tabs.Column(u"document affiliation country"),
+    tabs.Column(u"document affiliation country ISO 3166"),
+    tabs.Column(u"document affiliation state"),
+    tabs.Column(u"document affiliation city")
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 processes=1, append=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-        header.append(u"document affiliation instituition")
-        header.append(u"document affiliation country")
-        header.append(u"document affiliation country ISO 3166")
-        header.append(u"document affiliation state")
-        header.append(u"document affiliation city")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.output_format = output_format
+        self.processes = processes
+        self.encode = tabs.journal_prefix.encoder(COLUMNS, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(tabs.journal_prefix.schema(COLUMNS).header())
 
     def write(self, lines):
 
         if isinstance(lines, unicode):
             lines = [lines]
 
-        for line in lines:
-            if not self.output_file:
-                print(line.encode('utf-8'))
-            else:
-                self.output_file.write('%s\r\n' % line)
+        self.output_file.writelines(lines)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
+    def process(self, data):
+        self.write(self.fmt_csv(data))
+
     def items(self):
-        
+
         if not self.issns:
             self.issns = [None]
 
+        if self.processes > 1:
+            for item in tabs.format_documents(
+                    self, self.processes, output_format=self.output_format):
+                yield item
+            return
+
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 for item in self.fmt_csv(data):
                     yield item
 
-    def join_line(self, line):
-
-        return ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
     def fmt_csv(self, data):
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
-
         line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
         line.append(data.publisher_id)
         line.append(data.publication_date[0:4])
         line.append(data.document_type)
@@ -139,9 +122,9 @@ class Dumper(object):
                 aff_line.append(aff.get('country_iso_3166', '')),
                 aff_line.append(aff.get('state', '')),
                 aff_line.append(aff.get('city', ''))
-                yield self.join_line(line+aff_line)
+                yield self.encode(data, line+aff_line)
         else:
-            yield self.join_line(line)
+            yield self.encode(data, line)
 
 
 def main():
@@ -168,6 +151,35 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=1,
+        help='Number of processes used to format the documents'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -190,6 +202,9 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file, args.output_format,
+            args.processes)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -5,11 +5,11 @@ coleção SciELO.
 """
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
+import sinks
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -41,116 +41,141 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+def _pid(data, author, aff):
+    return data.publisher_id
+
+
+def _publication_year(data, author, aff):
+    return data.publication_date[0:4]
+
+
+def _document_type(data, author, aff):
+    return data.document_type
+
+
+def _citable(data, author, aff):
+    return u'1' if data.document_type.lower() in choices.CITABLE_DOCUMENT_TYPES else '0'
+
+
+def _author(data, author, aff):
+
+    if author is None:
+        return None
+
+    return ' '.join([author.get('given_names', ''), author.get('surname', '')])
+
+
+def _affiliation(key):
+
+    def extractor(data, author, aff):
+        return aff.get(key, '') if aff is not None else None
+
+    return extractor
+
+
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True, key='pid', extractor=_pid),
+    tabs.Column(u"document publishing year", safe=True, key='year', extractor=_publication_year),
+    tabs.Column(u"document type", safe=True, key='type', extractor=_document_type),
+    tabs.Column(u"document is citable", safe=True, key='citable', extractor=_citable),
+    tabs.Column(u"document author", key='author', extractor=_author),
+    tabs.Column(u"document author institution", key='institution', extractor=_affiliation('institution')),
+    tabs.Column(u"document author affiliation country", key='country', extractor=_affiliation('country')),
+    tabs.Column(u"document author affiliation state", key='state', extractor=_affiliation('state')),
+    tabs.Column(u"document author affiliation city", key='city', extractor=_affiliation('city'))
+]
+
+AFFILIATION_COLUMNS = ['institution', 'country', 'state', 'city']
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 columns=None, processes=1, append=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-        header.append(u"document author")
-        header.append(u"document author institution")
-        header.append(u"document author affiliation country")
-        header.append(u"document author affiliation state")
-        header.append(u"document author affiliation city")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.output_format = output_format
+        self.processes = processes
+        self.column_keys = columns
+        self.columns = tabs.Schema(COLUMNS).select(columns).columns if columns else COLUMNS
+        self._affiliations = any([i.key in AFFILIATION_COLUMNS for i in self.columns])
+        self.encode = tabs.journal_prefix.encoder(self.columns, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(tabs.journal_prefix.schema(self.columns).header())
 
     def write(self, lines):
 
         if isinstance(lines, unicode):
             lines = [lines]
 
-        for line in lines:
-            if not self.output_file:
-                print(line.encode('utf-8'))
-            else:
-                self.output_file.write('%s\r\n' % line)
+        self.output_file.writelines(lines)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
+    def process(self, data):
+        self.write(self.fmt_csv(data))
+
     def items(self):
 
         if not self.issns:
             self.issns = [None]
 
+        if self.processes > 1:
+            for item in tabs.format_documents(
+                    self, self.processes, output_format=self.output_format, columns=self.column_keys):
+                yield item
+            return
+
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 for item in self.fmt_csv(data):
                     yield item
 
-    def join_line(self, line):
+    def fmt_line(self, data, author, aff):
+        """
+        Retorna a linha do autor com os valores das colunas selecionadas.
+
+        Valores ausentes (documento sem autores, autor sem afiliação) são
+        descartados do final da linha e substituídos por vazio quando seguidos
+        de outras colunas.
+        """
+        line = [column.extractor(data, author, aff) for column in self.columns]
+
+        while line and line[-1] is None:
+            line.pop()
 
-        return ','.join(['"%s"' % i.replace('"', '""') for i in line])
+        return self.encode(data, [u'' if i is None else i for i in line])
 
     def fmt_csv(self, data):
-        countries = set()
-
-        affs = {item['index'].upper():item for item in data.mixed_affiliations}
-
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
+
+        affs = {}
+        if self._affiliations:
+            affs = {item['index'].upper(): item for item in data.mixed_affiliations}
+
+        if not data.authors:
+            yield self.fmt_line(data, None, None)
+            return
+
+        for author in data.authors:
+            if 'xref' in author:
+                for index in author['xref']:
+                    yield self.fmt_line(data, author, affs.get(index.upper(), {}))
             else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
-        line.append(data.publisher_id)
-        line.append(data.publication_date[0:4])
-        line.append(data.document_type)
-        line.append(u'1' if data.document_type.lower() in choices.CITABLE_DOCUMENT_TYPES else '0')
-        if data.authors:
-            for author in data.authors:
-                author_line = [' '.join([author.get('given_names', ''), author.get('surname', '')])]
-                if 'xref' in author:
-                    for index in author['xref']:
-                        index = index.upper()
-                        aff_line = []
-                        aff_line.append(affs.get(index, {}).get('institution', '')),
-                        aff_line.append(affs.get(index, {}).get('country', '')),
-                        aff_line.append(affs.get(index, {}).get('state', '')),
-                        aff_line.append(affs.get(index, {}).get('city', ''))
-                        yield self.join_line(line+author_line+aff_line)
-                else:
-                    yield self.join_line(line+author_line)
-        else:
-            yield self.join_line(line)
+                yield self.fmt_line(data, author, None)
 
 
 def main():
@@ -177,6 +202,44 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--columns',
+        '-k',
+        default=None,
+        help='Comma separated list of columns to be exported, the journal '
+             'columns are always exported. Available columns: %s' % ', '.join(
+                 tabs.Schema(COLUMNS).keys)
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=1,
+        help='Number of processes used to format the documents'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -199,6 +262,17 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    columns = None
+    if args.columns:
+        columns = [i.strip() for i in args.columns.split(',')]
+        try:
+            tabs.Schema(COLUMNS).select(columns)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file, args.output_format, columns,
+            args.processes)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -2,15 +2,21 @@
 """
 Este processamento gera uma tabulação com contagens, soma, mediana de alguns
 elementos do artigo: total de autores, total de citações, total de páginas
+
+No modo resumo (--summary) é gerada uma linha por periódico e ano de
+publicação, com total de documentos e mínimo, média, mediana, percentil 90 e
+máximo de autores, páginas e referências. As contagens são acumuladas em
+histogramas, sem manter as linhas dos documentos em memória.
 """
 
 import argparse
 import logging
-import codecs
-import datetime
+from collections import OrderedDict
 
 import utils
+import sinks
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -55,94 +61,229 @@ def pages(first, last):
         return 0
 
 
+def document_counts(data):
+    """
+    Retorna (total de autores, total de páginas, total de referências) do
+    documento.
+    """
+
+    return (
+        len(data.authors or []),
+        pages(data.start_page, data.end_page),
+        len(data.citations or [])
+    )
+
+
+class Distribution(object):
+    """
+    Distribuição de contagens inteiras acumulada em um histograma
+    ({valor: frequência}), de forma que a memória utilizada depende apenas da
+    quantidade de valores distintos. Os quantis são exatos, com interpolação
+    linear entre as posições vizinhas.
+    """
+
+    __slots__ = ('counts', 'total', 'sum')
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+
+    def add(self, value):
+        self.counts[value] = self.counts.get(value, 0) + 1
+        self.total += 1
+        self.sum += value
+
+    def mean(self):
+        return self.sum / float(self.total) if self.total else None
+
+    def quantiles(self, qs):
+        """
+        Retorna os quantis qs (entre 0 e 1, em ordem crescente) em uma única
+        passagem pelos valores ordenados do histograma.
+        """
+
+        if not self.total:
+            return [None for q in qs]
+
+        # posições (base 0) dos valores necessários para cada quantil
+        positions = []
+        for q in qs:
+            position = (self.total - 1) * q
+            lower = int(position)
+            positions.append((position, lower, min(lower + 1, self.total - 1)))
+
+        wanted = sorted(set([i[1] for i in positions] + [i[2] for i in positions]))
+        values = {}
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            while wanted and wanted[0] < seen:
+                values[wanted.pop(0)] = value
+            if not wanted:
+                break
+
+        return [
+            values[lower] + (position - lower) * (values[upper] - values[lower])
+            for position, lower, upper in positions
+        ]
+
+
+def _number(value):
+
+    if value is None:
+        return u''
+
+    if float(value).is_integer():
+        return unicode(int(value))
+
+    return unicode(round(value, 4))
+
+
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True),
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"document type", safe=True),
+    tabs.Column(u"document is citable", safe=True),
+    tabs.Column(u"authors", safe=True),
+    tabs.Column(u"0 authors", safe=True),
+    tabs.Column(u"1 author", safe=True),
+    tabs.Column(u"2 authors", safe=True),
+    tabs.Column(u"3 authors", safe=True),
+    tabs.Column(u"4 authors", safe=True),
+    tabs.Column(u"5 authors", safe=True),
+    tabs.Column(u"+6 authors", safe=True),
+    tabs.Column(u"pages", safe=True),
+    tabs.Column(u"references", safe=True)
+]
+
+SUMMARY_METRICS = [u'authors', u'pages', u'references']
+SUMMARY_STATISTICS = [u'min', u'mean', u'median', u'p90', u'max']
+
+SUMMARY_COLUMNS = [
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"documents", safe=True)
+]
+SUMMARY_COLUMNS += [
+    tabs.Column(u"%s %s" % (metric, statistic), safe=True)
+    for metric in SUMMARY_METRICS for statistic in SUMMARY_STATISTICS
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 processes=1, append=False, summary=False):
+        """
+        summary: gera o resumo por periódico e ano de publicação no lugar das
+        linhas por documento.
+        """
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-        header.append(u"authors")
-        header.append(u"0 authors")
-        header.append(u"1 author")
-        header.append(u"2 authors")
-        header.append(u"3 authors")
-        header.append(u"4 authors")
-        header.append(u"5 authors")
-        header.append(u"+6 authors")
-        header.append(u"pages")
-        header.append(u"references")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.output_format = output_format
+        self.processes = processes
+        self.summary = summary
+
+        if summary:
+            self._prefix = tabs.JournalPrefixCache(u'journal')
+            schema = self._prefix.schema(SUMMARY_COLUMNS)
+            self.encode_summary = schema.encoder(output_format)
+        else:
+            schema = tabs.journal_prefix.schema(COLUMNS)
+            self.encode = tabs.journal_prefix.encoder(COLUMNS, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(schema.header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
+    def process(self, data):
+        self.write(self.fmt_csv(data))
+
     def items(self):
 
         if not self.issns:
             self.issns = [None]
 
+        if self.summary:
+            for item in self.summary_items():
+                yield item
+            return
+
+        if self.processes > 1:
+            for item in tabs.format_documents(
+                    self, self.processes, output_format=self.output_format):
+                yield item
+            return
+
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 yield self.fmt_csv(data)
 
+    def summary_items(self):
+        """
+        Acumula as contagens dos documentos por periódico e ano de publicação
+        e retorna as linhas do resumo ao final da leitura, na ordem de leitura
+        dos periódicos e em ordem crescente de ano.
+        """
+
+        journals = OrderedDict()
+
+        for issn in self.issns:
+            for data in self._articlemeta.documents(collection=self.collection, issn=issn):
+                logger.debug('Reading document: %s' % data.publisher_id)
+                key = (data.collection_acronym, data.journal.scielo_issn)
+                if key not in journals:
+                    journals[key] = (self._prefix.values(data), {})
+                years = journals[key][1]
+                year = (data.publication_date or u'')[0:4]
+                if year not in years:
+                    years[year] = [Distribution() for i in SUMMARY_METRICS]
+                for distribution, value in zip(years[year], document_counts(data)):
+                    distribution.add(value)
+
+        for prefix, years in journals.values():
+            for year in sorted(years):
+                yield self.fmt_summary(prefix, year, years[year])
+
+    def fmt_summary(self, prefix, year, distributions):
+
+        line = [year, unicode(distributions[0].total)]
+        for distribution in distributions:
+            median, p90 = distribution.quantiles([0.5, 0.9])
+            line.append(_number(min(distribution.counts)))
+            line.append(_number(distribution.mean()))
+            line.append(_number(median))
+            line.append(_number(p90))
+            line.append(_number(max(distribution.counts)))
+
+        return self.encode_summary(prefix + line)
+
     def fmt_csv(self, data):
         countries = set()
 
         if data.normalized_affiliations:
             countries = set([i['country'].lower() for i in data.normalized_affiliations if 'country' in i and i['country'] != 'undefined'])
 
-        tot_authors = len(data.authors or [])
-
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
+        tot_authors, tot_pages, tot_references = document_counts(data)
 
         line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
         line.append(data.publisher_id)
         line.append(data.publication_date[0:4])
         line.append(data.document_type)
@@ -155,10 +296,10 @@ class Dumper(object):
         line.append(u'1' if tot_authors == 4 else u'0')  # total de autores
         line.append(u'1' if tot_authors == 5 else u'0')  # total de autores
         line.append(u'1' if tot_authors >= 6 else u'0')  # total de autores
-        line.append(unicode(pages(data.start_page, data.end_page))),  # total de páginas
-        line.append(unicode(len(data.citations or []))) # total de citações
+        line.append(unicode(tot_pages))  # total de páginas
+        line.append(unicode(tot_references))  # total de citações
 
-        joined_line = u','.join([u'"%s"' % i.replace(u'"', u'""') for i in line])
+        joined_line = self.encode(data, line)
 
         return joined_line
 
@@ -187,6 +328,43 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=1,
+        help='Number of processes used to format the documents'
+    )
+
+    parser.add_argument(
+        '--summary',
+        '-s',
+        action='store_true',
+        help='Dump one line for each journal and publication year with the min, mean, '
+             'median, p90 and max of authors, pages and references'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -209,6 +387,13 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    if args.summary and args.processes > 1:
+        logger.error('--summary does not support --processes')
+        exit()
+
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file, args.output_format,
+            args.processes, summary=args.summary)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -5,11 +5,11 @@ Este processamento gera uma tabulação de datas do artigo (publicação, submis
 """
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
+import sinks
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -41,138 +41,125 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+def _pid(data, split):
+    return data.publisher_id
+
+
+def _publication_year(data, split):
+    return data.publication_date[0:4]
+
+
+def _document_type(data, split):
+    return data.document_type
+
+
+def _citable(data, split):
+    return u'1' if data.document_type.lower() in choices.CITABLE_DOCUMENT_TYPES else '0'
+
+
+def _date(attr):
+
+    def extractor(data, split):
+        return getattr(data, attr) or ''
+
+    return extractor
+
+
+def _date_part(attr, index):
+
+    def extractor(data, split):
+        return split(getattr(data, attr) or '')[index]
+
+    return extractor
+
+
+def _date_columns(label, key, attr):
+    """
+    Retorna as colunas de uma data do documento: a data completa, ano, mês e
+    dia.
+    """
+
+    columns = [tabs.Column(
+        u"document %s" % label, safe=True, key=key, extractor=_date(attr))]
+
+    for index, part in enumerate(['year', 'month', 'day']):
+        columns.append(tabs.Column(
+            u"document %s %s" % (label, part), safe=True,
+            key='%s_%s' % (key, part), extractor=_date_part(attr, index)))
+
+    return columns
+
+
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True, key='pid', extractor=_pid),
+    tabs.Column(u"document publishing year", safe=True, key='year', extractor=_publication_year),
+    tabs.Column(u"document type", safe=True, key='type', extractor=_document_type),
+    tabs.Column(u"document is citable", safe=True, key='citable', extractor=_citable)
+]
+COLUMNS += _date_columns(u'submited at', 'receive', 'receive_date')
+COLUMNS += _date_columns(u'accepted at', 'acceptance', 'acceptance_date')
+COLUMNS += _date_columns(u'reviewed at', 'review', 'review_date')
+COLUMNS += _date_columns(u'published at', 'publication', 'publication_date')
+COLUMNS += _date_columns(u'published in SciELO at', 'creation', 'creation_date')
+COLUMNS += _date_columns(u'updated in SciELO at', 'update', 'update_date')
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 columns=None, processes=1, append=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u"document type")
-        header.append(u"document is citable")
-        header.append(u"document submited at")
-        header.append(u"document submited at year")
-        header.append(u"document submited at month")
-        header.append(u"document submited at day")
-        header.append(u"document accepted at")
-        header.append(u"document accepted at year")
-        header.append(u"document accepted at month")
-        header.append(u"document accepted at day")
-        header.append(u"document reviewed at")
-        header.append(u"document reviewed at year")
-        header.append(u"document reviewed at month")
-        header.append(u"document reviewed at day")
-        header.append(u"document published at")
-        header.append(u"document published at year")
-        header.append(u"document published at month")
-        header.append(u"document published at day")
-        header.append(u"document published in SciELO at")
-        header.append(u"document published in SciELO at year")
-        header.append(u"document published in SciELO at month")
-        header.append(u"document published in SciELO at day")
-        header.append(u"document updated in SciELO at")
-        header.append(u"document updated in SciELO at year")
-        header.append(u"document updated in SciELO at month")
-        header.append(u"document updated in SciELO at day")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.output_format = output_format
+        self.processes = processes
+        self.column_keys = columns
+        self.columns = tabs.Schema(COLUMNS).select(columns).columns if columns else COLUMNS
+        self.encode = tabs.journal_prefix.encoder(self.columns, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(tabs.journal_prefix.schema(self.columns).header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
+    def process(self, data):
+        self.write(self.fmt_csv(data))
+
     def items(self):
 
         if not self.issns:
             self.issns = [None]
 
+        if self.processes > 1:
+            for item in tabs.format_documents(
+                    self, self.processes, output_format=self.output_format, columns=self.column_keys):
+                yield item
+            return
+
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug('Reading document: %s' % data.publisher_id)
                 yield self.fmt_csv(data)
 
     def fmt_csv(self, data):
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
-        line.append(data.publisher_id)
-        line.append(data.publication_date[0:4])
-        line.append(data.document_type)
-        line.append(u'1' if data.document_type.lower() in choices.CITABLE_DOCUMENT_TYPES else '0')
-        line.append(data.receive_date or '')
-        receive_splited = utils.split_date(data.receive_date or '')
-        line.append(receive_splited[0])  # year
-        line.append(receive_splited[1])  # month
-        line.append(receive_splited[2])  # day
-        line.append(data.acceptance_date or '')
-        acceptance_splited = utils.split_date(data.acceptance_date or '')
-        line.append(acceptance_splited[0])  # year
-        line.append(acceptance_splited[1])  # month
-        line.append(acceptance_splited[2])  # day
-        line.append(data.review_date or '')
-        review_splited = utils.split_date(data.review_date or '')
-        line.append(review_splited[0])  # year
-        line.append(review_splited[1])  # month
-        line.append(review_splited[2])  # day
-        line.append(data.publication_date or '')
-        publication_splited = utils.split_date(data.publication_date or '')
-        line.append(publication_splited[0])  # year
-        line.append(publication_splited[1])  # month
-        line.append(publication_splited[2])  # day
-        line.append(data.creation_date or '')
-        creation_splited = utils.split_date(data.creation_date or '')
-        line.append(creation_splited[0])  # year
-        line.append(creation_splited[1])  # month
-        line.append(creation_splited[2])  # day
-        line.append(data.update_date or '')
-        update_splited = utils.split_date(data.update_date or '')
-        line.append(update_splited[0])  # year
-        line.append(update_splited[1])  # month
-        line.append(update_splited[2])  # day
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+
+        line = [column.extractor(data, utils.split_date) for column in self.columns]
+
+        return self.encode(data, line)
 
 
 def main():
@@ -199,6 +186,44 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--columns',
+        '-k',
+        default=None,
+        help='Comma separated list of columns to be exported, the journal '
+             'columns are always exported. Available columns: %s' % ', '.join(
+                 tabs.Schema(COLUMNS).keys)
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=1,
+        help='Number of processes used to format the documents'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -221,6 +246,17 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    columns = None
+    if args.columns:
+        columns = [i.strip() for i in args.columns.split(',')]
+        try:
+            tabs.Schema(COLUMNS).select(columns)
+        except ValueError as e:
+            parser.error(str(e))
+
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file, args.output_format, columns,
+            args.processes)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -5,11 +5,11 @@ da coleção SciELO.
 """
 import argparse
 import logging
-import codecs
-import datetime
 
 import utils
+import sinks
 import choices
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -41,54 +41,62 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"document publishing ID (PID SciELO)", safe=True),
+    tabs.Column(u"document publishing year", safe=True),
+    tabs.Column(u"docuemnt is citable", safe=True),
+    tabs.Column(u"document type", safe=True),
+    tabs.Column(u"document languages", safe=True),
+    tabs.Column(u"document pt", safe=True),
+    tabs.Column(u"document es", safe=True),
+    tabs.Column(u"document en", safe=True),
+    tabs.Column(u"document other languages", safe=True)
+]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 processes=1, append=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"document publishing ID (PID SciELO)")
-        header.append(u"document publishing year")
-        header.append(u'docuemnt is citable')
-        header.append(u"document type")
-        header.append(u"document languages")
-        header.append(u"document pt")
-        header.append(u"document es")
-        header.append(u"document en")
-        header.append(u"document other languages")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_file = sinks.BufferedSink(
+            output_file, mode='ab' if append else 'wb')
+        self.output_format = output_format
+        self.processes = processes
+        self.encode = tabs.journal_prefix.encoder(COLUMNS, output_format)
+
+        if output_format == 'csv' and not append:
+            self.write(tabs.journal_prefix.schema(COLUMNS).header())
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
+
+    def process(self, data):
+        self.write(self.fmt_csv(data))
 
     def items(self):
 
         if not self.issns:
             self.issns = [None]
 
+        if self.processes > 1:
+            for item in tabs.format_documents(
+                    self, self.processes, output_format=self.output_format):
+                yield item
+            return
+
         for issn in self.issns:
             for data in self._articlemeta.documents(collection=self.collection, issn=issn):
                 logger.debug(u'Reading document: %s' % data.publisher_id)
@@ -98,27 +106,7 @@ class Dumper(object):
         know_languages = set([u'pt', u'es', u'en'])
         languages = set(data.languages())
 
-        issns = []
-        if data.journal.print_issn:
-            issns.append(data.journal.print_issn)
-        if data.journal.electronic_issn:
-            issns.append(data.journal.electronic_issn)
-
         line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'document')
-        line.append(data.collection_acronym)
-        line.append(data.journal.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.journal.title)
-        line.append(u';'.join(data.journal.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.journal.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.journal.subject_areas or []) > 1 else '0')
-        line.append(data.journal.current_status)
         line.append(data.publisher_id)
         line.append(data.publication_date[0:4])
         line.append(u'1' if data.document_type.lower() in choices.CITABLE_DOCUMENT_TYPES else '0')
@@ -129,7 +117,7 @@ class Dumper(object):
         line.append('1' if 'en' in languages else '0')  # EN
         line.append('1' if len(languages.difference(know_languages)) > 0 else '0')  # OTHER
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
+        joined_line = self.encode(data, line)
 
         return joined_line
 
@@ -158,6 +146,35 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--processes',
+        '-p',
+        type=int,
+        default=1,
+        help='Number of processes used to format the documents'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -180,6 +197,9 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file, args.output_format,
+            args.processes)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -1,15 +1,18 @@
-
-
+# coding: utf-8
+"""
+Este processamento gera, a partir de uma única coleta dos documentos, as
+tabulações de documentos selecionadas (ver PROCESSORS).
+"""
 import argparse
 import logging
-import codecs
+import time
+from collections import OrderedDict
 
 import utils
+import sinks
 
 import documents_counts, documents_affiliations, documents_languages, documents_licenses, documents_authors, documents_dates
 
-
-
 logger = logging.getLogger(__name__)
 
 
@@ -40,35 +43,197 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+def _citedby(collection, append=False, output_file=None):
+    from bibliometric import citedby
+
+    return citedby.Dumper(collection, output_file=output_file, append=append)
+
+
+def _normalized_affiliations(collection, append=False, output_file=None):
+    from export import normalize_affiliations
+
+    return normalize_affiliations.Dumper(
+        collection, output_file=output_file, append=append)
+
+
+def _natural_keys(collection, append=False, output_file=None):
+    from export import natural_keys
+
+    return natural_keys.Dumper(
+        collection, output_file=output_file, append=append)
+
+
+def _xml_rsps(collection, append=False, output_file=None):
+    from export import xml_rsps
+
+    return xml_rsps.Dumper(collection)
+
+
+def _search_indicators(collection, append=False, output_file=None):
+    from export import search_update_indicators
+
+    return search_update_indicators.Dumper(collection)
+
+
+# Processadores de documentos disponíveis. Cada processador é criado a partir
+# do acrônimo da coleção, de um indicador de modo de anexação (retomada de um
+# processamento) e do arquivo de saída (ver OUTPUT_FILES) e deve implementar
+# process(document), podendo implementar close() para ser executado ao final
+# do processamento.
+PROCESSORS = OrderedDict([
+    ('counts', lambda collection, append=False, output_file=None: documents_counts.Dumper(collection, output_file=output_file, append=append)),
+    ('affiliations', lambda collection, append=False, output_file=None: documents_affiliations.Dumper(collection, output_file=output_file, append=append)),
+    ('languages', lambda collection, append=False, output_file=None: documents_languages.Dumper(collection, output_file=output_file, append=append)),
+    ('licenses', lambda collection, append=False, output_file=None: documents_licenses.Dumper(collection, output_file=output_file, append=append)),
+    ('authors', lambda collection, append=False, output_file=None: documents_authors.Dumper(collection, output_file=output_file, append=append)),
+    ('dates', lambda collection, append=False, output_file=None: documents_dates.Dumper(collection, output_file=output_file, append=append)),
+    ('citedby', _citedby),
+    ('normalized_affiliations', _normalized_affiliations),
+    ('natural_keys', _natural_keys),
+    ('xml_rsps', _xml_rsps),
+    ('search_indicators', _search_indicators)
+])
+
+OUTPUT_FILES = {
+    'counts': 'documents_counts.csv',
+    'affiliations': 'documents_affiliations.csv',
+    'languages': 'documents_languages.csv',
+    'licenses': 'documents_licenses.csv',
+    'authors': 'documents_authors.csv',
+    'dates': 'documents_dates.csv',
+    'citedby': 'citedby.csv',
+    'normalized_affiliations': 'normalized_affiliations.csv',
+    'natural_keys': 'natural_keys.csv'
+}
+
+DEFAULT_TABS = ['counts', 'affiliations', 'languages', 'licenses', 'authors', 'dates']
+
+# tabulações gravadas em arquivos de OUTPUT_FILES, as únicas registradas no
+# checkpoint. xml_rsps escreve na saída padrão e search_indicators atualiza o
+# índice de busca ao final, portanto não podem ser retomadas.
+CHECKPOINT_TABS = [i for i in PROCESSORS if i in OUTPUT_FILES]
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None):
+    def __init__(self, collection, issns=None, tabs=None, checkpoint_file=None,
+                 resume=False, collection_files=False):
+        """
+        collection_files: quando True, o acrônimo da coleção é incluído no
+        nome dos arquivos de saída, ex: documents_counts-scl.csv, permitindo
+        o processamento simultâneo de várias coleções.
+        """
 
-        self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
-        self.issns = issns
-        self.documents_counts = documents_counts.Dumper(collection, output_file='documents_counts.csv')
-        self.documents_affiliations = documents_affiliations.Dumper(collection, output_file='documents_affiliations.csv')
-        self.documents_languages = documents_languages.Dumper(collection, output_file='documents_languages.csv')
-        self.documents_licenses = documents_licenses.Dumper(collection, output_file='documents_licenses.csv')
-        self.documents_authors = documents_authors.Dumper(collection, output_file='documents_authors.csv')
-        self.documents_dates = documents_dates.Dumper(collection, output_file='documents_dates.csv')
+        self.issns = issns or [None]
+        self.tabs = tabs or DEFAULT_TABS
+        self.checkpoint = sinks.Checkpoint(checkpoint_file) if checkpoint_file else None
+        self.resume_state = None
+
+        if self.checkpoint and not set(self.tabs) <= set(CHECKPOINT_TABS):
+            raise ValueError('checkpoints are only available for the tabs: %s' % ', '.join(CHECKPOINT_TABS))
+
+        if resume:
+            self._load_checkpoint()
+
+        append = self.resume_state is not None
+        self.processors = [
+            (name, PROCESSORS[name](collection, append, self._output_file(name, collection_files)))
+            for name in self.tabs
+        ]
+        self.timings = {name: 0.0 for name in self.tabs}
+        self.errors = {name: 0 for name in self.tabs}
+
+    def _output_file(self, name, collection_files=False):
+
+        output_file = OUTPUT_FILES.get(name, None)
+
+        if output_file and collection_files:
+            return utils.collection_output_file(output_file, self.collection)
+
+        return output_file
+
+    def process(self, data):
+
+        for name, processor in self.processors:
+            started = time.time()
+            try:
+                processor.process(data)
+            except Exception as e:
+                logger.exception(e)
+                logger.error('Fail to process document %s_%s with %s' % (
+                    data.collection_acronym, data.publisher_id, name))
+                self.errors[name] += 1
+            self.timings[name] += time.time() - started
+
+    def _load_checkpoint(self):
+
+        state = self.checkpoint.load()
+
+        if not state:
+            logger.info('No checkpoint available, dumping from the beginning')
+            return
+
+        if state['collection'] != self.collection or state['tabs'] != self.tabs:
+            raise ValueError('checkpoint does not match the given collection and tabs')
+
+        logger.info('Resuming from ISSN %s, offset %d' % (state['issn'], state['offset']))
+        self.checkpoint.restore(state)
+        self.resume_state = state
+
+    def save_checkpoint(self, issn, offset):
+
+        outputs = [
+            processor.output_file for name, processor in self.processors
+            if isinstance(getattr(processor, 'output_file', None), sinks.BufferedSink)
+        ]
+
+        self.checkpoint.save(
+            issn, offset, outputs, collection=self.collection, tabs=self.tabs)
+
+    def close(self):
+
+        for name, processor in self.processors:
+            if not hasattr(processor, 'close'):
+                continue
+            started = time.time()
+            try:
+                processor.close()
+            except Exception as e:
+                logger.exception(e)
+                logger.error('Fail to close %s' % name)
+                self.errors[name] += 1
+            self.timings[name] += time.time() - started
 
     def run(self):
 
-        if not self.issns:
-            self.issns = [None]
+        pending = [(issn, 0) for issn in self.issns]
+        if self.checkpoint:
+            pending = self.checkpoint.pending(self.issns, self.resume_state)
 
-        for issn in self.issns:
-            for data in self._articlemeta.documents(collection=self.collection, issn=issn):
+        documents = 0
+        for index, (issn, offset) in enumerate(pending):
+            for data in self._articlemeta.documents(
+                    collection=self.collection, issn=issn, offset=offset):
                 logger.debug('Reading document: %s' % data.publisher_id)
-                self.documents_counts.write(self.documents_counts.fmt_csv(data))
-                self.documents_affiliations.write(self.documents_affiliations.fmt_csv(data))
-                self.documents_languages.write(self.documents_languages.fmt_csv(data))
-                self.documents_licenses.write(self.documents_licenses.fmt_csv(data))
-                self.documents_authors.write(self.documents_authors.fmt_csv(data))
-                self.documents_dates.write(self.documents_dates.fmt_csv(data))
+                self.process(data)
+                documents += 1
+                offset += 1
+                if self.checkpoint and offset % self.checkpoint.interval == 0:
+                    self.save_checkpoint(issn, offset)
+
+            if self.checkpoint and index + 1 < len(pending):
+                self.save_checkpoint(pending[index + 1][0], 0)
+
+        self.close()
+
+        if self.checkpoint:
+            self.checkpoint.remove()
+
+        for name in self.tabs:
+            logger.info('%s: %d documents, %d errors, %.2fs' % (
+                name, documents, self.errors[name], self.timings[name]))
 
         logger.info('Export finished')
 
@@ -91,6 +256,40 @@ def main():
         help='Collection Acronym'
     )
 
+    parser.add_argument(
+        '--tabs',
+        '-t',
+        default=','.join(DEFAULT_TABS),
+        help='Comma separated list of tabs to be produced. Available: %s' % ', '.join(PROCESSORS.keys())
+    )
+
+    parser.add_argument(
+        '--checkpoint_file',
+        '-k',
+        default=None,
+        help='File to record the last written ISSN and document offset'
+    )
+
+    parser.add_argument(
+        '--resume',
+        '-r',
+        action='store_true',
+        help='Resume from the checkpoint file, appending to the existing tabs'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection and tab'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -113,6 +312,26 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns)
+    tabs = [i.strip() for i in args.tabs.split(',') if i.strip()]
+
+    for name in tabs:
+        if name not in PROCESSORS:
+            logger.error('Invalid tab: %s' % name)
+            exit()
+
+    if args.resume and not args.checkpoint_file:
+        logger.error('--resume requires --checkpoint_file')
+        exit()
+
+    if args.checkpoint_file and not set(tabs) <= set(CHECKPOINT_TABS):
+        logger.error('Checkpoints are only available for the tabs: %s' % ', '.join(CHECKPOINT_TABS))
+        exit()
+
+    def dumper(collection, checkpoint_file):
+        return Dumper(
+            collection, issns, tabs, checkpoint_file=checkpoint_file,
+            resume=args.resume, collection_files=args.all_collections)
 
-    dumper.run()
+    # os arquivos das tabulações são nomeados pelo Dumper, apenas o arquivo de
+    # checkpoint é informado por coleção.
+    utils.run_dumper(dumper, args, args.checkpoint_file, required=False, log=logger)
@@ -6,13 +6,13 @@ elementos do artigo: total de autores, total de citações, total de páginas
 
 import argparse
 import logging
-import codecs
 import datetime
+import itertools
 
 import utils
+import sinks
 import choices
-
-from clients.analytics import Analytics
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -62,64 +62,53 @@ def interruption_status(history):
 
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None, years=6):
+    def __init__(self, collection, issns=None, output_file=None, years=6,
+                 output_format='csv', workers=1):
         self._articlemeta = utils.articlemeta_server()
         self._publicationstats = utils.publicationstats_server()
-        self._analytics = Analytics()
         self.collection = collection
         self.issns = issns
         self._years = years
+        self.workers = workers
         self._lines = []
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
+        self.output_file = sinks.BufferedSink(output_file)
         now = datetime.date.today().year
         years_range = [i for i in range(now, now-self._years, -1)]
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"title + subtitle SciELO")
-        header.append(u"short title SciELO")
-        header.append(u"short title ISO")
-        header.append(u"title PubMed")
-        header.append(u"publisher name")
-        header.append(u"use license")
-        header.append(u"alpha frequency")
-        header.append(u"numeric frequency (in months)")
-        header.append(u"inclusion year at SciELO")
-        header.append(u"stopping year at SciELO")
-        header.append(u"stopping reason")
-        header.append(u"date of the first document")
-        header.append(u"volume of the first document")
-        header.append(u"issue of the first document")
-        header.append(u"date of the last document")
-        header.append(u"volume of the last document")
-        header.append(u"issue of the last document")
-        header.append(u"total of issues")
-        header += [u"issues at %s" % str(i) for i in years_range]
-        header.append(u"total of regular issues")
-        header += [u"regular issues at %s" % str(i) for i in years_range]
-        header.append(u"total of documents")
-        header += [u"documents at %s" % str(i) for i in years_range]
-        header.append(u"citable documents")
-        header += [u"citable documents at %s" % str(i) for i in years_range]
-        for year in years_range:
-            header.append(u'portuguese documents at %s ' % year)
-        for year in years_range:
-            header.append(u'spanish documents at %s ' % year)
-        for year in years_range:
-            header.append(u'english documents at %s ' % year)
-        for year in years_range:
-            header.append(u'other language documents at %s ' % year)
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        columns = tabs.prefix_columns(u'journal')
+        columns.append(tabs.Column(u"title + subtitle SciELO"))
+        columns.append(tabs.Column(u"short title SciELO"))
+        columns.append(tabs.Column(u"short title ISO"))
+        columns.append(tabs.Column(u"title PubMed"))
+        columns.append(tabs.Column(u"publisher name"))
+        columns.append(tabs.Column(u"use license", safe=True))
+        columns.append(tabs.Column(u"alpha frequency", safe=True))
+        columns.append(tabs.Column(u"numeric frequency (in months)", safe=True))
+        columns.append(tabs.Column(u"inclusion year at SciELO", safe=True))
+        columns.append(tabs.Column(u"stopping year at SciELO", safe=True))
+        columns.append(tabs.Column(u"stopping reason", safe=True))
+        columns.append(tabs.Column(u"date of the first document", safe=True))
+        columns.append(tabs.Column(u"volume of the first document"))
+        columns.append(tabs.Column(u"issue of the first document"))
+        columns.append(tabs.Column(u"date of the last document", safe=True))
+        columns.append(tabs.Column(u"volume of the last document"))
+        columns.append(tabs.Column(u"issue of the last document"))
+        columns.append(tabs.Column(u"total of issues", safe=True))
+        columns += [tabs.Column(u"issues at %s" % str(i), safe=True) for i in years_range]
+        columns.append(tabs.Column(u"total of regular issues", safe=True))
+        columns += [tabs.Column(u"regular issues at %s" % str(i), safe=True) for i in years_range]
+        columns.append(tabs.Column(u"total of documents", safe=True))
+        columns += [tabs.Column(u"documents at %s" % str(i), safe=True) for i in years_range]
+        columns.append(tabs.Column(u"citable documents", safe=True))
+        columns += [tabs.Column(u"citable documents at %s" % str(i), safe=True) for i in years_range]
+        for language in [u'portuguese', u'spanish', u'english', u'other language']:
+            for year in years_range:
+                columns.append(tabs.Column(u'%s documents at %s ' % (language, year), safe=True))
+
+        schema = tabs.Schema(columns)
+        self.encode = schema.encoder(output_format)
+
+        if output_format == 'csv':
+            self.write(schema.header())
 
     def _documents_languages_by_year(self, issn, collection, years=None):
 
@@ -172,31 +161,16 @@ class Dumper(object):
 
         return document
 
-    def _impact_factor(self, issn, collection):
-
-        current_year = datetime.date.today().year
-
-        itens = {str(i): (0.0, 0.0, 0.0, 0.0, 0.0, 0.0) for i in range(
-            current_year, current_year-self._years, -1)}
-
-        impact_factor = self._analytics.impact_factor(issn, collection)
-
-        if impact_factor:
-            for item in impact_factor:
-                if item[0] in itens:
-                    itens[item[0]] = tuple(item[1:])
-
-        return itens
-
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
     def items(self):
@@ -204,40 +178,79 @@ class Dumper(object):
         if not self.issns:
             self.issns = [None]
 
-        for issn in self.issns:
+        journals = (
+            data for issn in self.issns
             for data in self._articlemeta.journals(
-                    collection=self.collection, issn=issn):
-                yield self.fmt_csv(data)
+                collection=self.collection, issn=issn)
+        )
 
-    def fmt_csv(self, data):
-        first_document = self._first_included_document_by_journal(
-            data.scielo_issn, data.collection_acronym)
-        last_document = self._last_included_document_by_journal(
-            data.scielo_issn, data.collection_acronym)
+        # as requisições de todos os periódicos são realizadas por um único
+        # conjunto de self.workers threads, na ordem dos periódicos, e os
+        # resultados são reagrupados por periódico para a formação das linhas.
+        calls = (
+            (index, data, name, call)
+            for index, data in enumerate(journals)
+            for name, call in self._remote_calls(data)
+        )
+
+        results = utils.ordered_imap(
+            lambda item: (item[0], item[1], item[2], item[3]()), calls,
+            workers=self.workers)
+
+        for index, group in itertools.groupby(results, key=lambda item: item[0]):
+            group = list(group)
+            remote = dict([(item[2], item[3]) for item in group])
+            yield self.fmt_csv(group[0][1], remote)
+
+    def _remote_calls(self, data):
+        """
+        Retorna as requisições, como pares (nome, função), dos dados do
+        periódico mantidos no PublicationStats e no ArticleMeta.
+        """
+        issn = data.scielo_issn
+        collection = data.collection_acronym
+        citable = choices.CITABLE_DOCUMENT_TYPES
+
+        calls = [
+            ('first_document', lambda: self._first_included_document_by_journal(
+                issn, collection)),
+            ('last_document', lambda: self._last_included_document_by_journal(
+                issn, collection)),
+            ('total_issues', lambda: self._number_of_issues_by_year(
+                issn, collection, years=0)),
+            ('issues', lambda: self._number_of_issues_by_year(
+                issn, collection, years=self._years)),
+            ('total_regular_issues', lambda: self._number_of_issues_by_year(
+                issn, collection, years=0, type='regular')),
+            ('regular_issues', lambda: self._number_of_issues_by_year(
+                issn, collection, years=self._years, type='regular')),
+            ('total_documents', lambda: self._number_of_articles_by_year(
+                issn, collection, years=0)),
+            ('documents', lambda: self._number_of_articles_by_year(
+                issn, collection, years=self._years)),
+            ('total_citable_documents', lambda: self._number_of_articles_by_year(
+                issn, collection, document_types=citable, years=0)),
+            ('citable_documents', lambda: self._number_of_articles_by_year(
+                issn, collection, document_types=citable, years=self._years)),
+            ('languages', lambda: self._documents_languages_by_year(
+                issn, collection, years=self._years))
+        ]
+
+        return calls
+
+    def _remote_inputs(self, data):
+
+        return dict([(name, call()) for name, call in self._remote_calls(data)])
+
+    def fmt_csv(self, data, remote=None):
+        remote = remote or self._remote_inputs(data)
+        first_document = remote['first_document']
+        last_document = remote['last_document']
 
         interruption = interruption_status(data.status_history)
 
-        issns = []
-        if data.print_issn:
-            issns.append(data.print_issn)
-        if data.electronic_issn:
-            issns.append(data.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'journal')
-        line.append(data.collection_acronym)
-        line.append(data.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.title)
-        line.append(u';'.join(data.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.subject_areas or []) > 1 else '0')
-        line.append(data.current_status)
+        line = [data.collection_acronym]
+        line += tabs.journal_columns(data)
         line.append(u' '.join([data.title or u'', data.subtitle or u'']))
         line.append(data.abbreviated_title or u'')
         line.append(data.abbreviated_iso_title or u'')
@@ -256,77 +269,27 @@ class Dumper(object):
         line.append(last_document.issue.volume or u'' if last_document else u'')
         line.append(last_document.issue.number or u'' if last_document else u'')
 
-        line.append(unicode(self._number_of_issues_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=0
-            ))
-        )
-
-        issues = self._number_of_issues_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=self._years
-        )
+        line.append(unicode(remote['total_issues']))
 
-        for issue in issues:
+        for issue in remote['issues']:
             line.append(unicode(issue[1]))
 
-        line.append(unicode(self._number_of_issues_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=0,
-            type='regular'
-            ))
-        )
-
-        regular_issues = self._number_of_issues_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=self._years,
-            type='regular'
-        )
+        line.append(unicode(remote['total_regular_issues']))
 
-        for issue in regular_issues:
+        for issue in remote['regular_issues']:
             line.append(unicode(issue[1]))
 
-        line.append(str(self._number_of_articles_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=0))
-        )
-
-        documents = self._number_of_articles_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=self._years
-        )
+        line.append(str(remote['total_documents']))
 
-        for document in documents:
+        for document in remote['documents']:
             line.append(unicode(document[1]))
 
-        line.append(str(self._number_of_articles_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            document_types=choices.CITABLE_DOCUMENT_TYPES,
-            years=0))
-        )
+        line.append(str(remote['total_citable_documents']))
 
-        documents = [str(i[1]) for i in self._number_of_articles_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            document_types=choices.CITABLE_DOCUMENT_TYPES,
-            years=self._years
-        )]
+        for document in remote['citable_documents']:
+            line.append(unicode(str(document[1])))
 
-        for document in documents:
-            line.append(unicode(document))
-
-        languages = self._documents_languages_by_year(
-            data.scielo_issn,
-            data.collection_acronym,
-            years=self._years
-        )
+        languages = remote['languages']
 
         for years, values in sorted(languages.items(), reverse=True):
             line.append(unicode(values['pt']))
@@ -337,9 +300,7 @@ class Dumper(object):
         for years, values in sorted(languages.items(), reverse=True):
             line.append(unicode(values['other']))
 
-        joined_line = u','.join([u'"%s"' % i.replace(u'"', u'""') for i in line])
-
-        return joined_line
+        return self.encode(line)
 
 
 def main():
@@ -366,6 +327,36 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--workers',
+        '-w',
+        type=int,
+        default=1,
+        help='Number of journals processed concurrently, each one with up to '
+             'the same number of concurrent requests'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -388,6 +379,9 @@ def main():
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file,
+            output_format=args.output_format, workers=args.workers)
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
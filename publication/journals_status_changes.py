@@ -4,13 +4,15 @@ Este processamento gera uma tabulação de histórico de mudanças do status do
 periódico na coleção SciELO
 """
 
+import os
+import json
 import argparse
 import logging
-import codecs
 import datetime
 
 import utils
-import choices
+import sinks
+import tabs
 
 logger = logging.getLogger(__name__)
 
@@ -42,82 +44,222 @@ def _config_logging(logging_level='INFO', logging_file=None):
     return logger
 
 
+COLUMNS = [
+    tabs.Column(u"status change date", safe=True),
+    tabs.Column(u"status change year", safe=True),
+    tabs.Column(u"status change month", safe=True),
+    tabs.Column(u"status change day", safe=True),
+    tabs.Column(u"status changed to", safe=True),
+    tabs.Column(u"status change reason")
+]
+
+
+def _journal_key(collection, issn):
+
+    return u'%s_%s' % (collection, issn)
+
+
+def read_records(output_file, output_format='csv'):
+    """
+    Lê os registros de uma tabulação já gravada, retornando tuplas (chave,
+    registro), onde chave é a coleção e o ISSN SciELO do periódico
+    (None para o cabeçalho) e registro é o texto original do registro.
+
+    No formato CSV um registro pode ocupar mais de uma linha do arquivo
+    quando algum valor contém quebras de linha. Como todos os valores são
+    delimitados por aspas, o registro termina na linha em que a quantidade de
+    aspas acumulada é par.
+    """
+
+    with open(output_file, 'rb') as f:
+        text = f.read().decode('utf-8')
+
+    if output_format == 'jsonl':
+        for line in text.splitlines():
+            if not line:
+                continue
+            row = json.loads(line)
+            yield (_journal_key(row[u'collection'], row[u'ISSN SciELO']), line)
+        return
+
+    record = []
+    quotes = 0
+    for line in text.split(u'\r\n'):
+        record.append(line)
+        quotes += line.count(u'"')
+        if quotes % 2:
+            continue
+        record = u'\r\n'.join(record)
+        if record:
+            values = record.split(u',', 4)
+            key = _journal_key(values[2][1:-1], values[3][1:-1]) if len(values) > 4 else None
+            if values[0] == u'"extraction date"':
+                key = None
+            yield (key, record)
+        record = []
+        quotes = 0
+
+
 class Dumper(object):
 
-    def __init__(self, collection, issns=None, output_file=None):
+    def __init__(self, collection, issns=None, output_file=None, output_format='csv',
+                 state_file=None, incremental=False):
 
         self._ratchet = utils.ratchet_server()
         self._articlemeta = utils.articlemeta_server()
         self.collection = collection
         self.issns = issns
-        self.output_file = codecs.open(output_file, 'w', encoding='utf-8') if output_file else output_file
-        header = []
-        header.append(u"extraction date")
-        header.append(u"study unit")
-        header.append(u"collection")
-        header.append(u"ISSN SciELO")
-        header.append(u"ISSN\'s")
-        header.append(u"title at SciELO")
-        header.append(u"title thematic areas")
-        for area in choices.THEMATIC_AREAS:
-            header.append(u"title is %s" % area.lower())
-        header.append(u"title is multidisciplinary")
-        header.append(u"title current status")
-        header.append(u"status change date")
-        header.append(u"status change year")
-        header.append(u"status change month")
-        header.append(u"status change day")
-        header.append(u"status changed to")
-        header.append(u"status change reason")
-
-        self.write(u','.join([u'"%s"' % i.replace(u'"', u'""') for i in header]))
+        self.output_format = output_format
+        self.path = output_file
+        self.state_file = state_file
+        # execuções restritas a alguns ISSN's não atualizam o estado da coleção
+        self.partial = bool(issns)
+        self.run_date = datetime.date.today().isoformat()
+        self.from_date = None
+
+        if incremental:
+            self._load_incremental_period()
+
+        # no modo incremental a tabulação é gravada em um arquivo temporário
+        # que substitui a tabulação anterior ao final do processamento.
+        if self.from_date:
+            self.output_file = sinks.BufferedSink(output_file + '.tmp')
+        else:
+            self.output_file = sinks.BufferedSink(output_file)
+
+        schema = tabs.Schema(tabs.prefix_columns(u'journal') + COLUMNS)
+        self.encode = schema.encoder(output_format)
+
+        if output_format == 'csv' and not self.from_date:
+            self.write(schema.header())
+
+    def _load_incremental_period(self):
+        """
+        No modo incremental, apenas os periódicos alterados desde a última
+        execução registrada no arquivo de estado são atualizados na
+        tabulação existente.
+        """
+
+        state = utils.load_state(self.state_file).get(self.collection, None)
+
+        if not state or not os.path.exists(self.path):
+            logger.info('No previous dump available for %s, dumping all journals' % self.collection)
+            return
+
+        self.from_date = state['run_date']
+        logger.info('Updating journals changed since %s' % self.from_date)
+
+    def save_state(self):
+
+        utils.update_state(self.state_file, self.collection, {'run_date': self.run_date})
 
     def write(self, line):
-        if not self.output_file:
-            print(line.encode('utf-8'))
-        else:
-            self.output_file.write('%s\r\n' % line)
+        self.output_file.write(line)
+
+    def close(self):
+        self.output_file.close()
+
+        if self.from_date:
+            os.rename(self.path + '.tmp', self.path)
+
+        if self.state_file and self.partial:
+            logger.info('State file not updated, only the given ISSN\'s were dumped')
+        elif self.state_file:
+            self.save_state()
 
     def run(self):
         for item in self.items():
             self.write(item)
+        self.close()
         logger.info('Export finished')
 
+    def changed_journals(self):
+        """
+        Retorna um dicionário com o último evento registrado desde a última
+        execução para cada periódico, indexado pela chave do periódico.
+        """
+
+        events = self._articlemeta.journal_history_changes(
+            collection=self.collection, from_date=self.from_date,
+            until_date=self.run_date)
+
+        changes = {}
+        for event in events:
+            issn = event.code[0]
+            if self.issns and issn not in self.issns:
+                continue
+            changes[_journal_key(event.collection, issn)] = event
+
+        return changes
+
+    def journal_items(self, data):
+
+        for history in data.status_history:
+            yield self.fmt_csv(data, history)
+
+    def changed_items(self, event):
+
+        if event.event == 'delete':
+            logger.debug('Journal removed: %s_%s' % (event.collection, event.code[0]))
+            return
+
+        data = self._articlemeta.journal(event.code[0], event.collection)
+
+        if data is None:
+            return
+
+        for item in self.journal_items(data):
+            yield item
+
+    def merged_items(self):
+        """
+        Mescla a tabulação existente com os registros dos periódicos
+        alterados. Os registros de periódicos alterados são substituídos na
+        posição original, periódicos removidos são descartados e periódicos
+        novos são adicionados ao final.
+        """
+
+        changes = self.changed_journals()
+        logger.info('%d journals changed since %s' % (len(changes), self.from_date))
+
+        replaced = set()
+        for key, record in read_records(self.path, self.output_format):
+            if key in replaced:
+                continue
+
+            if key in changes:
+                replaced.add(key)
+                for item in self.changed_items(changes.pop(key)):
+                    yield item
+                continue
+
+            yield record
+
+        for key in sorted(changes):
+            for item in self.changed_items(changes[key]):
+                yield item
+
     def items(self):
 
+        if self.from_date:
+            for item in self.merged_items():
+                yield item
+            return
+
         if not self.issns:
             self.issns = [None]
 
         for issn in self.issns:
             for data in self._articlemeta.journals(collection=self.collection, issn=issn):
-                for history in data.status_history:
-                    yield self.fmt_csv(data, history)
+                for item in self.journal_items(data):
+                    yield item
 
     def fmt_csv(self, data, history):
 
         hist, status, reason = history
 
-        issns = []
-        if data.print_issn:
-            issns.append(data.print_issn)
-        if data.electronic_issn:
-            issns.append(data.electronic_issn)
-
-        line = []
-        line.append(datetime.datetime.now().isoformat()[0:10])
-        line.append(u'journal')
-        line.append(data.collection_acronym)
-        line.append(data.scielo_issn)
-        line.append(u';'.join(issns))
-        line.append(data.title)
-        line.append(u';'.join(data.subject_areas or []))
-        for area in choices.THEMATIC_AREAS:
-            if area.lower() in [i.lower() for i in data.subject_areas or []]:
-                line.append(u'1')
-            else:
-                line.append(u'0')
-        line.append('1' if len(data.subject_areas or []) > 1 else '0')
-        line.append(data.current_status)
+        line = [data.collection_acronym]
+        line += tabs.journal_columns(data)
         line.append(hist)
         hist_splited = utils.split_date(hist or '')
         line.append(hist_splited[0])  # year
@@ -126,9 +268,7 @@ class Dumper(object):
         line.append(status)
         line.append(reason)
 
-        joined_line = ','.join(['"%s"' % i.replace('"', '""') for i in line])
-
-        return joined_line
+        return self.encode(line)
 
 
 def main():
@@ -155,6 +295,40 @@ def main():
         help='File to receive the dumped data'
     )
 
+    parser.add_argument(
+        '--output_format',
+        '-f',
+        default='csv',
+        choices=tabs.FORMATS,
+        help='Output format'
+    )
+
+    parser.add_argument(
+        '--incremental',
+        '-i',
+        action='store_true',
+        help='Update only the journals changed since the last run registered in the state file'
+    )
+
+    parser.add_argument(
+        '--state_file',
+        '-t',
+        help='JSON file registering the last run date for each collection, required by --incremental'
+    )
+
+    parser.add_argument(
+        '--all_collections',
+        action='store_true',
+        help='Dump all the collections registered in the Article Meta, one output file per collection'
+    )
+
+    parser.add_argument(
+        '--collection_workers',
+        type=int,
+        default=utils.COLLECTION_WORKERS,
+        help='Number of collections dumped simultaneously with --all_collections'
+    )
+
     parser.add_argument(
         '--logging_file',
         '-o',
@@ -173,10 +347,19 @@ def main():
     _config_logging(args.logging_level, args.logging_file)
     logger.info('Dumping data for: %s' % args.collection)
 
+    if args.incremental and not (args.state_file and args.output_file):
+        logger.error('The incremental mode requires a state file and an output file')
+        exit()
+
     issns = None
     if len(args.issns) > 0:
         issns = utils.ckeck_given_issns(args.issns)
 
-    dumper = Dumper(args.collection, issns, args.output_file)
+    def dumper(collection, output_file):
+        return Dumper(
+            collection, issns, output_file,
+            output_format=args.output_format, state_file=args.state_file,
+            incremental=args.incremental
+        )
 
-    dumper.run()
+    utils.run_dumper(dumper, args, args.output_file, log=logger)
@@ -13,6 +13,11 @@ install_requires = [
 
 tests_require = []
 
+extras_require = {
+    'parquet': ['pyarrow'],
+    'zstd': ['zstandard'],
+}
+
 setup(
     name="processing",
     version="0.3.1",
@@ -37,6 +42,7 @@ setup(
     tests_require=tests_require,
     test_suite='tests',
     install_requires=install_requires,
+    extras_require=extras_require,
     entry_points="""
     [console_scripts]
     processing_accesses_dumpdata=accesses.dumpdata:main
@@ -61,5 +67,7 @@ setup(
     processing_export_search_update_indicators=export.search_update_indicators:main
     processing_bibliometric_citedby=bibliometric.citedby:main
     processing_bibliometric_impact_factor=bibliometric.impact_factor:main
+    processing_bibliometric_citation_graph=bibliometric.citation_graph:main
+    processing_identifiers_index=identifiers:main
     """
 )
@@ -0,0 +1,452 @@
+# coding: utf-8
+"""
+Destinos de gravação (sinks) para os dados produzidos pelos processamentos.
+
+Cada sink recebe registros já formatados através do método write e deve ser
+encerrado com close para garantir que todos os dados foram persistidos.
+"""
+import os
+import sys
+import gzip
+import json
+import logging
+from collections import OrderedDict
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024
+ROW_GROUP_SIZE = 100000
+MAX_OPEN_SHARDS = 64
+CHECKPOINT_INTERVAL = 1000
+COMPRESSION_EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst'
+}
+
+
+class BufferedSink(object):
+    """
+    Grava linhas de texto em um arquivo, ou na saída padrão quando path não é
+    informado.
+
+    As linhas são acumuladas em memória e, a cada buffer_size caracteres,
+    codificadas em utf-8 e gravadas de uma só vez, evitando uma codificação e
+    uma chamada de escrita por linha. As linhas são terminadas por CRLF nos
+    arquivos e por LF na saída padrão.
+    """
+
+    def __init__(self, path=None, buffer_size=BUFFER_SIZE, mode='wb'):
+
+        if path:
+            self._file = open(path, mode)
+            self.newline = u'\r\n'
+        else:
+            self._file = getattr(sys.stdout, 'buffer', sys.stdout)
+            self.newline = u'\n'
+
+        self.path = path
+        self.buffer_size = buffer_size
+        self._lines = []
+        self._size = 0
+
+    def write(self, line):
+
+        self._lines.append(line)
+        self._size += len(line)
+
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def writelines(self, lines):
+
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+
+        if not self._lines:
+            return
+
+        self._lines.append(u'')
+        self._file.write(self.newline.join(self._lines).encode('utf-8'))
+        self._file.flush()
+        self._lines = []
+        self._size = 0
+
+    def sync(self):
+        """
+        Grava o buffer e força a persistência do arquivo em disco.
+        """
+
+        self.flush()
+
+        if self.path:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+
+        self.flush()
+
+        if self.path:
+            self._file.close()
+
+
+class Checkpoint(object):
+    """
+    Ponto de retomada de processamentos que percorrem os documentos de uma
+    lista de ISSN's.
+
+    O checkpoint registra o último (issn, offset) cujas linhas foram
+    completamente gravadas e o tamanho, neste momento, de cada arquivo de
+    saída. Na retomada os arquivos são truncados para esses tamanhos,
+    descartando linhas gravadas após o checkpoint, e o processamento continua
+    em modo de anexação a partir do offset registrado.
+
+    O arquivo de checkpoint é gravado atomicamente e removido ao final do
+    processamento.
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+
+    def load(self):
+
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, issn, offset, outputs, **extra):
+        """
+        outputs: lista de BufferedSink's gravados pelo processamento.
+        """
+
+        state = dict(extra)
+        state['issn'] = issn
+        state['offset'] = offset
+        state['outputs'] = {}
+
+        for output in outputs:
+            if not output.path:
+                continue
+            output.sync()
+            state['outputs'][output.path] = os.path.getsize(output.path)
+
+        tmp_file = self.path + '.tmp'
+
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_file, self.path)
+
+    def restore(self, state):
+        """
+        Trunca os arquivos de saída para os tamanhos registrados no
+        checkpoint.
+        """
+
+        for path, size in state['outputs'].items():
+            logger.info('Resuming %s at byte %d' % (path, size))
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+
+    def pending(self, issns, state=None):
+        """
+        Retorna a lista de (issn, offset) ainda não processados.
+        """
+
+        if not state:
+            return [(issn, 0) for issn in issns]
+
+        if state['issn'] not in issns:
+            raise ValueError('checkpoint ISSN not in the given ISSNs: %s' % state['issn'])
+
+        index = issns.index(state['issn'])
+
+        return [(state['issn'], state['offset'])] + [(issn, 0) for issn in issns[index+1:]]
+
+    def remove(self):
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ParquetSink(object):
+    """
+    Grava registros em arquivos Parquet.
+
+    columns: lista de tuplas (nome, tipo) onde tipo é 'string' ou 'int'. As
+    colunas do tipo 'string' são gravadas com dictionary encoding, as colunas
+    do tipo 'int' como inteiros de 64 bits.
+
+    Os registros são acumulados em memória e gravados em row groups de
+    row_group_size linhas conforme o fluxo de dados avança.
+
+    Quando partition_by é informado, path é tratado como um diretório e os
+    dados são particionados no formato hive, ex:
+    path/collection=scl/access_year=2012/part-00000.parquet
+    """
+
+    def __init__(self, path, columns, row_group_size=ROW_GROUP_SIZE,
+                 partition_by=None):
+
+        if pyarrow is None:
+            raise ImportError('pyarrow is required to write parquet files')
+
+        self.path = path
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.partition_by = partition_by or []
+        self._buffers = {}
+        self._writers = {}
+        self._schema = pyarrow.schema(
+            [pyarrow.field(name, self._arrow_type(ctype)) for name, ctype in columns]
+        )
+
+    def _arrow_type(self, ctype):
+
+        if ctype == 'int':
+            return pyarrow.int64()
+
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+
+    def _partition_path(self, key):
+
+        if not self.partition_by:
+            return self.path
+
+        directory = os.path.join(
+            self.path,
+            *['%s=%s' % (name, value) for name, value in zip(self.partition_by, key)]
+        )
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        return os.path.join(directory, 'part-00000.parquet')
+
+    def _table(self, buf):
+
+        arrays = []
+        for name, ctype in self.columns:
+            if ctype == 'int':
+                arrays.append(pyarrow.array(buf[name], type=pyarrow.int64()))
+            else:
+                arrays.append(
+                    pyarrow.array(buf[name], type=pyarrow.string()).dictionary_encode()
+                )
+
+        return pyarrow.Table.from_arrays(arrays, schema=self._schema)
+
+    def _flush(self, key):
+
+        buf = self._buffers.get(key)
+
+        if not buf or len(buf[self.columns[0][0]]) == 0:
+            return
+
+        if key not in self._writers:
+            path = self._partition_path(key)
+            logger.debug('Opening parquet file: %s' % path)
+            self._writers[key] = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+        self._writers[key].write_table(self._table(buf))
+        self._buffers[key] = {name: [] for name, ctype in self.columns}
+
+    def write(self, data):
+        """
+        data: dicionário com um valor para cada coluna.
+        """
+        key = tuple([data[name] for name in self.partition_by])
+
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = {name: [] for name, ctype in self.columns}
+            self._buffers[key] = buf
+
+        for name, ctype in self.columns:
+            buf[name].append(data[name])
+
+        if len(buf[self.columns[0][0]]) >= self.row_group_size:
+            self._flush(key)
+
+    def close(self):
+
+        for key in list(self._buffers.keys()):
+            self._flush(key)
+
+        for writer in self._writers.values():
+            writer.close()
+
+        self._writers = {}
+
+
+class ZstdFile(object):
+    """
+    Arquivo com compressão zstd, gravado como um único frame.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'wb')
+        self._writer = zstandard.ZstdCompressor().stream_writer(self._file)
+
+    def write(self, data):
+        self._writer.write(data)
+
+    def close(self):
+        self._writer.flush(zstandard.FLUSH_FRAME)
+        self._file.close()
+
+
+class ShardedSink(object):
+    """
+    Grava linhas em arquivos fragmentados (shards), opcionalmente comprimidos.
+
+    Um novo shard é iniciado sempre que o shard corrente atinge max_rows linhas
+    ou max_bytes bytes (não comprimidos). Quando uma chave é informada na
+    gravação (ex: ISSN ou ano), cada chave possui a sua própria sequência de
+    shards.
+
+    Os shards são nomeados a partir de path, ex: para accesses.csv:
+    accesses-0102-6720-00000.csv.gz
+
+    Ao encerrar, um manifesto (path.manifest.json) é gravado com o total de
+    linhas de cada shard, permitindo que os shards sejam carregados em
+    paralelo.
+    """
+
+    def __init__(self, path, compression=None, max_rows=None, max_bytes=None,
+                 header=None, max_open=MAX_OPEN_SHARDS):
+
+        if compression not in [None, 'gzip', 'zstd']:
+            raise ValueError('invalid compression: %s' % compression)
+
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError('zstandard is required to write zstd files')
+
+        self.path = path
+        self.compression = compression
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.header = header
+        self.max_open = max_open
+        self.manifest = []
+        self._sequences = {}
+        self._open = OrderedDict()
+
+    def _shard_name(self, key, sequence):
+
+        base, extension = os.path.splitext(self.path)
+        parts = [base]
+        if key is not None:
+            parts.append(key)
+        parts.append('%05d' % sequence)
+
+        name = '-'.join(parts) + extension
+        name += COMPRESSION_EXTENSIONS.get(self.compression, '')
+
+        return name
+
+    def _open_file(self, path):
+
+        if self.compression == 'gzip':
+            return gzip.open(path, 'wb')
+
+        if self.compression == 'zstd':
+            return ZstdFile(path)
+
+        return open(path, 'wb')
+
+    def _open_shard(self, key):
+
+        if len(self._open) >= self.max_open:
+            self._close_shard(next(iter(self._open)))
+
+        sequence = self._sequences.get(key, 0)
+        self._sequences[key] = sequence + 1
+
+        name = self._shard_name(key, sequence)
+        logger.debug('Opening shard: %s' % name)
+        shard = {
+            'file': os.path.basename(name),
+            'key': key,
+            'rows': 0,
+            'bytes': 0,
+            'handler': self._open_file(name)
+        }
+        self._open[key] = shard
+
+        if self.header:
+            self._write(shard, self.header)
+            shard['rows'] = 0
+
+        return shard
+
+    def _close_shard(self, key):
+
+        shard = self._open.pop(key)
+        shard.pop('handler').close()
+        self.manifest.append(shard)
+
+    def _write(self, shard, line):
+
+        data = (u'%s\r\n' % line).encode('utf-8')
+        shard['handler'].write(data)
+        shard['rows'] += 1
+        shard['bytes'] += len(data)
+
+    def _is_full(self, shard):
+
+        if self.max_rows and shard['rows'] >= self.max_rows:
+            return True
+
+        if self.max_bytes and shard['bytes'] >= self.max_bytes:
+            return True
+
+        return False
+
+    def write(self, line, key=None):
+
+        shard = self._open.get(key)
+
+        if shard is not None and self._is_full(shard):
+            self._close_shard(key)
+            shard = None
+
+        if shard is None:
+            shard = self._open_shard(key)
+        else:
+            # mantém os shards mais recentes no final para o descarte LRU
+            del self._open[key]
+            self._open[key] = shard
+
+        self._write(shard, line)
+
+    def close(self):
+
+        for key in list(self._open.keys()):
+            self._close_shard(key)
+
+        manifest = {
+            'compression': self.compression,
+            'rows': sum([i['rows'] for i in self.manifest]),
+            'shards': sorted(self.manifest, key=lambda i: i['file'])
+        }
+
+        with open(self.path + '.manifest.json', 'w') as f:
+            json.dump(manifest, f, indent=2)
@@ -0,0 +1,361 @@
+# coding: utf-8
+"""
+Recursos compartilhados pelas tabulações (tabs) produzidas pelos
+processamentos.
+
+As colunas de cada tabulação são declaradas através de um Schema, composto
+por objetos Column. O Schema produz o cabeçalho da tabulação e um codificador
+(encoder) que converte a lista de valores de cada registro em uma linha CSV
+ou JSON Lines.
+"""
+import os
+import json
+import datetime
+import importlib
+from collections import OrderedDict
+
+from xylose.scielodocument import Article
+
+import utils
+import choices
+
+FORMATS = ['csv', 'jsonl']
+CHUNK_SIZE = 50
+
+
+def escape(value):
+
+    return u'"%s"' % value.replace(u'"', u'""')
+
+
+def join_line(line):
+
+    return u','.join([escape(i) for i in line])
+
+
+class Column(object):
+    """
+    Coluna de uma tabulação.
+
+    safe: indica que os valores da coluna nunca contém aspas (datas,
+    indicadores, contagens, códigos), dispensando o escape no CSV.
+
+    value: valor constante da coluna (ex: data de extração). Colunas
+    constantes são escapadas uma única vez, na compilação do encoder, e não
+    devem ser informadas nos valores dos registros.
+
+    key: identificador curto da coluna, utilizado na seleção de colunas
+    (projeção) das tabulações.
+
+    extractor: função que produz o valor da coluna a partir do registro. A
+    assinatura é definida pela tabulação que utiliza a coluna.
+    """
+
+    def __init__(self, name, safe=False, value=None, key=None, extractor=None):
+        self.name = name
+        self.safe = safe
+        self.value = value
+        self.key = key
+        self.extractor = extractor
+
+    @property
+    def constant(self):
+        return self.value is not None
+
+
+class Schema(object):
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    @property
+    def names(self):
+        return [i.name for i in self.columns]
+
+    @property
+    def keys(self):
+        return [i.key for i in self.columns if i.key]
+
+    def select(self, keys):
+        """
+        Retorna um novo Schema apenas com as colunas indicadas em keys, na
+        ordem informada.
+        """
+
+        columns = dict([(i.key, i) for i in self.columns if i.key])
+
+        unknown = [i for i in keys if i not in columns]
+        if unknown:
+            raise ValueError('unknown columns: %s' % u', '.join(unknown))
+
+        return Schema([columns[i] for i in keys])
+
+    def header(self):
+
+        return join_line(self.names)
+
+    def encoder(self, fmt='csv'):
+        """
+        Retorna uma função que recebe a lista de valores das colunas não
+        constantes, na ordem do Schema, e retorna a linha codificada no
+        formato fmt ('csv' ou 'jsonl').
+
+        Linhas com menos valores que colunas são codificadas apenas com as
+        colunas iniciais correspondentes.
+        """
+
+        if fmt == 'csv':
+            return self._csv_encoder()
+
+        if fmt == 'jsonl':
+            return self._jsonl_encoder()
+
+        raise ValueError('invalid format: %s' % fmt)
+
+    def _csv_encoder(self):
+
+        # um template para cada quantidade de valores informados, permitindo
+        # a codificação de linhas incompletas.
+        templates = {}
+        unsafe = []
+        parts = []
+        total = 0
+        for column in self.columns:
+            if column.constant:
+                parts.append(escape(column.value).replace(u'%', u'%%'))
+                continue
+            templates[total] = u','.join(parts)
+            if not column.safe:
+                unsafe.append(total)
+            parts.append(u'"%s"')
+            total += 1
+        templates[total] = u','.join(parts)
+
+        def encode(values):
+            values = [u'' if i is None else i for i in values]
+            for i in unsafe:
+                if i >= len(values):
+                    break
+                values[i] = utils.text_type(values[i]).replace(u'"', u'""')
+
+            return templates[len(values)] % tuple(values)
+
+        return encode
+
+    def _jsonl_encoder(self):
+
+        columns = self.columns
+
+        def encode(values):
+            values = iter(values)
+            row = OrderedDict()
+            for column in columns:
+                if column.constant:
+                    row[column.name] = column.value
+                    continue
+                try:
+                    row[column.name] = next(values)
+                except StopIteration:
+                    break
+
+            return utils.text_type(json.dumps(row))
+
+        return encode
+
+
+JOURNAL_COLUMNS = [
+    Column(u"ISSN SciELO", safe=True),
+    Column(u"ISSN\'s", safe=True),
+    Column(u"title at SciELO"),
+    Column(u"title thematic areas")
+]
+JOURNAL_COLUMNS += [
+    Column(u"title is %s" % area.lower(), safe=True) for area in choices.THEMATIC_AREAS
+]
+JOURNAL_COLUMNS += [
+    Column(u"title is multidisciplinary", safe=True),
+    Column(u"title current status", safe=True)
+]
+
+
+def prefix_columns(study_unit, extraction_date=None):
+    """
+    Retorna as colunas iniciais comuns às tabulações: data de extração e
+    unidade de estudo (constantes), coleção e colunas de periódico.
+    """
+
+    extraction_date = extraction_date or datetime.datetime.now().isoformat()[0:10]
+
+    columns = [
+        Column(u"extraction date", value=extraction_date),
+        Column(u"study unit", value=study_unit),
+        Column(u"collection", safe=True)
+    ]
+
+    return columns + JOURNAL_COLUMNS
+
+
+def journal_columns(journal):
+    """
+    Retorna as colunas de periódico comuns às tabulações: ISSN SciELO, ISSN's,
+    título, áreas temáticas, indicadores de cada área temática, indicador de
+    multidisciplinaridade e situação atual do periódico.
+    """
+
+    issns = []
+    if journal.print_issn:
+        issns.append(journal.print_issn)
+    if journal.electronic_issn:
+        issns.append(journal.electronic_issn)
+
+    subject_areas = journal.subject_areas or []
+    lower_subject_areas = set([i.lower() for i in subject_areas])
+
+    line = []
+    line.append(journal.scielo_issn)
+    line.append(u';'.join(issns))
+    line.append(journal.title)
+    line.append(u';'.join(subject_areas))
+    for area in choices.THEMATIC_AREAS:
+        line.append(u'1' if area.lower() in lower_subject_areas else u'0')
+    line.append(u'1' if len(subject_areas) > 1 else u'0')
+    line.append(journal.current_status)
+
+    return line
+
+
+class JournalPrefixCache(object):
+    """
+    Cache das colunas iniciais das tabulações de documentos (data de extração,
+    unidade de estudo, coleção e colunas de periódico).
+
+    O cache é indexado por (coleção, ISSN SciELO), de forma que as colunas de
+    cada periódico são produzidas e escapadas apenas uma vez por
+    processamento.
+    """
+
+    def __init__(self, study_unit=u'document'):
+        self.study_unit = study_unit
+        self.extraction_date = datetime.datetime.now().isoformat()[0:10]
+        self.columns = prefix_columns(study_unit, self.extraction_date)
+        self._encode = Schema(self.columns).encoder()
+        self._values = {}
+        self._prefixes = {}
+
+    def values(self, document):
+
+        key = (document.collection_acronym, document.journal.scielo_issn)
+
+        values = self._values.get(key, None)
+
+        if values is None:
+            values = [document.collection_acronym]
+            values += journal_columns(document.journal)
+            self._values[key] = values
+
+        return values
+
+    def get(self, document):
+
+        key = (document.collection_acronym, document.journal.scielo_issn)
+
+        prefix = self._prefixes.get(key, None)
+
+        if prefix is None:
+            prefix = self._encode(self.values(document))
+            self._prefixes[key] = prefix
+
+        return prefix
+
+    def schema(self, columns):
+        """
+        Retorna o Schema completo de uma tabulação de documentos: colunas
+        iniciais seguidas das colunas informadas.
+        """
+
+        return Schema(self.columns + list(columns))
+
+    def encoder(self, columns, fmt='csv'):
+        """
+        Retorna uma função que recebe o documento e a lista de valores das
+        colunas informadas e retorna a linha completa no formato fmt.
+        """
+
+        if fmt == 'jsonl':
+            encode = self.schema(columns).encoder(fmt)
+
+            def encode_document(document, values):
+                return encode(self.values(document) + list(values))
+
+            return encode_document
+
+        encode = Schema(columns).encoder(fmt)
+
+        def encode_document(document, values):
+            if not values:
+                return self.get(document)
+
+            return u','.join([self.get(document), encode(values)])
+
+        return encode_document
+
+
+journal_prefix = JournalPrefixCache()
+
+
+# Dumper utilizado para a formatação das linhas em cada processo do pool de
+# format_documents.
+_formatter = None
+
+
+def _init_formatter(module, collection, options):
+
+    global _formatter
+
+    # a saída do Dumper do processo não é utilizada, as linhas formatadas são
+    # devolvidas ao processo principal.
+    options = dict(options, output_file=os.devnull)
+    _formatter = importlib.import_module(module).Dumper(collection, **options)
+
+
+def _format_document(raw):
+
+    data = json.loads(raw) if raw else None
+
+    if not data:
+        return []
+
+    lines = _formatter.fmt_csv(Article(data))
+
+    if isinstance(lines, utils.text_type):
+        return [lines]
+
+    return list(lines)
+
+
+def format_documents(dumper, processes, chunksize=CHUNK_SIZE, **options):
+    """
+    Formata as linhas dos documentos das coleções e ISSN's do dumper utilizando
+    um pool de processos.
+
+    Os documentos são obtidos do ArticleMeta sem a carga do objeto xylose. Em
+    cada processo é criado um Dumper do mesmo módulo de dumper, com as opções
+    informadas em options, responsável pela carga do documento e formatação
+    das linhas com fmt_csv. As linhas são retornadas na ordem dos documentos.
+    """
+
+    raw_documents = (
+        raw for issn in dumper.issns
+        for raw in dumper._articlemeta.documents(
+            collection=dumper.collection, issn=issn, raw=True)
+    )
+
+    results = utils.ordered_process_imap(
+        _format_document, raw_documents, processes=processes,
+        chunksize=chunksize, initializer=_init_formatter,
+        initargs=(dumper.__class__.__module__, dumper.collection, options)
+    )
+
+    for lines in results:
+        for line in lines:
+            yield line
@@ -1,5 +1,6 @@
 # coding: utf-8
 import unittest
+import datetime
 
 from accesses import dumpdata
 from xylose.scielodocument import Article
@@ -42,6 +43,61 @@ class DumpDataTest(unittest.TestCase):
 
         self.assertEqual(result, 'S0102-6720(09)000300001')
 
+    def test_last_complete_month(self):
+
+        result = dumpdata.last_complete_month(datetime.date(2016, 3, 18))
+
+        self.assertEqual(result, '2016-02-29')
+
+    def test_last_complete_month_january(self):
+
+        result = dumpdata.last_complete_month(datetime.date(2016, 1, 1))
+
+        self.assertEqual(result, '2015-12-31')
+
+    def test_next_month(self):
+
+        result = dumpdata.next_month('2016-09')
+
+        self.assertEqual(result, '2016-10-01')
+
+    def test_next_month_december(self):
+
+        result = dumpdata.next_month('2016-12')
+
+        self.assertEqual(result, '2017-01-01')
+
+    def test_top_accesses(self):
+
+        top = dumpdata.TopAccesses(2)
+
+        rows = [
+            ('0102-6720', '2012-01-01T00:00:00', 'S1', 10),
+            ('0102-6720', '2012-01-01T00:00:00', 'S2', 30),
+            ('0102-6720', '2012-01-01T00:00:00', 'S3', 20),
+            ('0102-6720', '2012-02-01T00:00:00', 'S1', 5),
+            ('0034-8910', '2012-01-01T00:00:00', 'S4', 1),
+        ]
+
+        for issn, access_date, pid, total in rows:
+            top.add({
+                'issn': issn,
+                'access_date': access_date,
+                'pid': pid,
+                'access_total': total
+            })
+
+        result = [(i['issn'], i['access_date'][:7], i['pid']) for i in top.items()]
+
+        expected = [
+            ('0034-8910', '2012-01', 'S4'),
+            ('0102-6720', '2012-01', 'S2'),
+            ('0102-6720', '2012-01', 'S3'),
+            ('0102-6720', '2012-02', 'S1')
+        ]
+
+        self.assertEqual(result, expected)
+
     def test_join_accesses(self):
         record_1 = {
             "abstract": {
@@ -364,3 +420,50 @@ class DumpDataTest(unittest.TestCase):
             }
 
         self.assertEqual(sorted([k+str(v) for k, v in expected.items()]), sorted([k+str(v) for k, v in result.items()]))
+
+    def test_fmt_csv_escapes_quotes(self):
+
+        from tests.fixtures import articlemeta
+
+        article = Article(articlemeta.document)
+
+        data = dumpdata.join_metadata_with_accesses(
+            article, '2012-01-08', {'abstract': 3, 'html': 1, 'pdf': 10})
+        data['document_title'] = u'The "title"'
+
+        line = dumpdata.Dumper('scl').fmt_csv(data)
+
+        self.assertTrue(line.startswith(u'"scl","S0102-67202009000300001","0102-6720",'))
+        self.assertIn(u',"The ""title""",', line)
+        self.assertTrue(line.endswith(u',"3","1","10","0","14"'))
+
+    def test_document_from_date_in_append_mode(self):
+
+        class DocumentStub(object):
+            publisher_id = 'S0102-67202009000300001'
+
+            def __init__(self, creation_date, processing_date):
+                self.creation_date = creation_date
+                self.processing_date = processing_date
+
+        dumper = dumpdata.Dumper.__new__(dumpdata.Dumper)
+        dumper.from_date = dumpdata.FROM
+        dumper.append_from_date = '2016-05-01'
+        dumper.new_documents_since = '2016-05-10'
+
+        self.assertEqual(
+            dumper._document_from_date(DocumentStub('2016-05-11', None)),
+            dumpdata.FROM
+        )
+        self.assertEqual(
+            dumper._document_from_date(DocumentStub('2016-05-10', None)),
+            dumpdata.FROM
+        )
+        self.assertEqual(
+            dumper._document_from_date(DocumentStub('2016-05-09', None)),
+            '2016-05-01'
+        )
+        self.assertEqual(
+            dumper._document_from_date(DocumentStub(None, '2016-05-20')),
+            '2016-05-01'
+        )
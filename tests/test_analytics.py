@@ -1,4 +1,7 @@
 # coding: utf-8
+import os
+import shutil
+import tempfile
 import unittest
 
 from clients.analytics import Analytics
@@ -115,3 +118,72 @@ class AnalyticsClientTest(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+class ResponseStub(object):
+
+    def __init__(self, data, status_code=200):
+        self.data = data
+        self.status_code = status_code
+
+    def json(self):
+        return self.data
+
+
+class SessionStub(object):
+
+    def __init__(self, status_code=200):
+        self.requests = []
+        self.status_code = status_code
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append(params['journal'])
+        return ResponseStub({
+            'options': {
+                'xAxis': {'categories': ['2015']},
+                'series': [{'data': [float(len(self.requests))]}] * 6
+            }
+        }, self.status_code)
+
+    def close(self):
+        pass
+
+
+class AnalyticsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'analytics.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batch_and_cache(self):
+
+        analytics = Analytics(workers=2, cache_file=self.path)
+        analytics._session = SessionStub()
+        result = list(analytics.impact_factors(['0102-6720', '0034-8910'], 'scl'))
+        analytics.close()
+
+        self.assertEqual([i[0] for i in result], ['0102-6720', '0034-8910'])
+        self.assertEqual(len(analytics._session.requests), 2)
+
+        analytics = Analytics(cache_file=self.path)
+        analytics._session = SessionStub()
+        cached = list(analytics.impact_factors(['0102-6720', '0034-8910'], 'scl'))
+        analytics.close()
+
+        self.assertEqual(cached, result)
+        self.assertEqual(analytics._session.requests, [])
+
+    def test_error_responses_are_not_cached(self):
+
+        analytics = Analytics(cache_file=self.path)
+        analytics._session = SessionStub(status_code=503)
+        self.assertIsNone(analytics.impact_factor('0102-6720', 'scl'))
+        analytics.close()
+
+        analytics = Analytics(cache_file=self.path)
+        analytics._session = SessionStub()
+        self.assertIsNotNone(analytics.impact_factor('0102-6720', 'scl'))
+        analytics.close()
+
+        self.assertEqual(analytics._session.requests, ['0102-6720'])
@@ -0,0 +1,134 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from bibliometric import citation_graph
+from bibliometric import impact_factor
+
+
+class CitationGraphTest(unittest.TestCase):
+
+    def setUp(self):
+
+        builder = citation_graph.GraphBuilder()
+        builder.add(u'S0102-67202013000100001', [
+            {'code': u'S0102-67202015000100001', 'issn': u'0102-6720'},
+            {'code': u'S0034-89102014000100001', 'issn': u'0034-8910'},
+            {'code': u'S0034-89102015000100002', 'issn': u'0034-8910'},
+            {'code': u'S0034-89102015000100002', 'issn': u'0034-8910'}
+        ], issn=u'0102-6720', year=2013)
+        builder.add(u'S0034-89102014000100001', [
+            {'code': u'S0102-67202015000100001', 'issn': u'0102-6720'}
+        ], issn=u'0034-8910', year=2014)
+        builder.add(u'S0034-89102015000100002', [], issn=u'0034-8910', year=2015)
+
+        self.graph = builder.build()
+
+    def test_csr(self):
+
+        self.assertEqual(len(self.graph), 4)
+        self.assertEqual(self.graph.edges, 4)
+        self.assertEqual(
+            sorted(self.graph.cited_by(u'S0102-67202013000100001')),
+            [u'S0034-89102014000100001', u'S0034-89102015000100002', u'S0102-67202015000100001']
+        )
+        self.assertEqual(self.graph.cited_by(u'S0034-89102015000100002'), [])
+        self.assertEqual(list(self.graph.in_degrees()), [3, 0, 1, 0])
+        self.assertEqual(list(self.graph.out_degrees()), [0, 2, 1, 1])
+
+    def test_journal_metrics(self):
+
+        self.assertEqual(
+            self.graph.journal_degrees(),
+            {u'0102-6720': (3, 2), u'0034-8910': (1, 2)}
+        )
+        self.assertEqual(
+            self.graph.journal_matrix(),
+            {
+                u'0102-6720': {u'0102-6720': 1, u'0034-8910': 1},
+                u'0034-8910': {u'0102-6720': 2}
+            }
+        )
+        self.assertEqual(
+            self.graph.journal_matrix(citing_years=[2015]),
+            {
+                u'0102-6720': {u'0102-6720': 1, u'0034-8910': 1},
+                u'0034-8910': {u'0102-6720': 1}
+            }
+        )
+        self.assertEqual(
+            self.graph.self_citations(),
+            {u'0102-6720': (1, 3), u'0034-8910': (0, 1)}
+        )
+
+    def test_cited_half_life(self):
+
+        # citações feitas em 2015 ao 0102-6720: 2 a documentos de 2013
+        self.assertEqual(self.graph.cited_half_life(u'0102-6720', 2015), 2.5)
+        self.assertIsNone(self.graph.cited_half_life(u'0102-6720', 2010))
+
+    def test_save_and_load(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'graph.gz')
+
+        try:
+            self.graph.save(path)
+            graph = citation_graph.CitationGraph.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(graph.pids, self.graph.pids)
+        self.assertEqual(graph.journals, self.graph.journals)
+        self.assertEqual(graph.citing, self.graph.citing)
+        self.assertEqual(graph.offsets, self.graph.offsets)
+        self.assertEqual(graph.node_years, self.graph.node_years)
+        self.assertEqual(graph.node_citable, self.graph.node_citable)
+        self.assertEqual(graph.journal_matrix(), self.graph.journal_matrix())
+
+    def test_journal_from_pid(self):
+
+        builder = citation_graph.GraphBuilder()
+        builder.add(u'S0102-67202013000100001', [
+            {'code': u'S0034-89102014000100001', 'issn': u'1518-8787'},
+            {'code': u'ref-without-pid', 'issn': u'1518-8787'}
+        ], issn=u'0102-6720', year=2013)
+        builder.add(u'S0034-89102014000100001', [], issn=u'1518-8787', year=2014)
+
+        self.assertEqual(
+            builder.build().journal_degrees(),
+            {u'0102-6720': (2, 0), u'0034-8910': (0, 1), u'1518-8787': (0, 1)}
+        )
+
+
+class LocalImpactFactorTest(unittest.TestCase):
+
+    def test_impact_factor(self):
+
+        builder = citation_graph.GraphBuilder()
+        # documentos citáveis do 0102-6720: 2 em 2013, 1 em 2014, 1 em 2015
+        builder.add(u'S0102-67202013000100001', [
+            {'code': u'S0034-89102014000100001'},
+            {'code': u'S0034-89102015000100001'},
+            {'code': u'S0034-89102015000100002'}
+        ], year=2013, citable=True)
+        builder.add(u'S0102-67202013000100002', [], year=2013, citable=True)
+        builder.add(u'S0102-67202014000100001', [
+            {'code': u'S0034-89102014000100002'},
+            {'code': u'S0034-89102015000100001'}
+        ], year=2014, citable=True)
+        builder.add(u'S0102-67202014000100002', [], year=2014, citable=False)
+        builder.add(u'S0102-67202015000100001', [
+            {'code': u'S0034-89102015000100001'}
+        ], year=2015, citable=True)
+
+        local = impact_factor.LocalImpactFactor(builder.build())
+
+        self.assertEqual(local.impact_factor(u'0102-6720', u'scl'), [
+            [u'2013', 0.0, 0.0, 0.0, 0.0, 0.0, 0.0],
+            [u'2014', 1.0, 0.5, 0.5, 0.5, 0.5, 0.5],
+            [u'2015', 1.0, 1.0, 1.0, 1.0, 1.0, 1.0]
+        ])
+        self.assertIsNone(local.impact_factor(u'0034-8910', u'scl'))
@@ -0,0 +1,39 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+import caches
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_persist_between_runs(self):
+
+        cache = caches.TTLCache(self.path)
+        cache.set(u'S0102-67202009000300001', [{'code': 'S0034-89102010000100001'}])
+        cache.close()
+
+        cache = caches.TTLCache(self.path)
+        result = cache.get(u'S0102-67202009000300001')
+        cache.close()
+
+        self.assertEqual(result, [{'code': 'S0034-89102010000100001'}])
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_expired(self):
+
+        cache = caches.TTLCache(self.path)
+        cache.set('S0102-67202009000300001', [], ttl=-1)
+
+        self.assertIsNone(cache.get('S0102-67202009000300001'))
+        self.assertEqual(cache.get('S0102-67202009000300002', []), [])
+        cache.close()
@@ -0,0 +1,102 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from evaluation import altmetrics
+
+
+class ResponseStub(object):
+
+    def __init__(self, status_code, data=None, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+        self.url = altmetrics.ALTMETRICS_API_URL
+
+    def json(self):
+        if self.data is None:
+            raise ValueError('No JSON object could be decoded')
+        return self.data
+
+
+class SessionStub(object):
+    """
+    Três páginas de resultados, a segunda respondida após um erro de conexão
+    e um limite de requisições excedido.
+    """
+
+    def __init__(self, total=250):
+        self.total = total
+        self.requests = []
+        self.failures = [IOError('connection reset'), ResponseStub(429, headers={'Retry-After': '0'})]
+
+    def get(self, url, params=None, timeout=None):
+        page = params['page']
+        self.requests.append(page)
+
+        if page == 2 and self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure
+
+        first = (page - 1) * altmetrics.ALTMETRICS_PAGE_SIZE
+        if first >= self.total:
+            return ResponseStub(404)
+
+        results = [
+            {'doi': u'10.1590/%d' % i, 'score': i, 'last_updated': 1000, 'cited_by_tweeters_count': 1}
+            for i in range(first, min(first + altmetrics.ALTMETRICS_PAGE_SIZE, self.total))
+        ]
+
+        return ResponseStub(200, {'query': {'total': self.total}, 'results': results})
+
+    def close(self):
+        pass
+
+
+class AltmetricsPaginationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.retry_wait = altmetrics.RETRY_WAIT
+        altmetrics.RETRY_WAIT = 0
+
+    def tearDown(self):
+        altmetrics.RETRY_WAIT = self.retry_wait
+        shutil.rmtree(self.directory)
+
+    def dumper(self, session, **kwargs):
+        dumper = altmetrics.Dumper(
+            'scl', output_file=os.path.join(self.directory, 'output.csv'), **kwargs)
+        dumper._session = session
+        return dumper
+
+    def test_pages_in_order(self):
+
+        session = SessionStub()
+        dumper = self.dumper(session, workers=3)
+        items = list(dumper.altmetrics_items_by_journals('0102-6720'))
+        dumper.close()
+
+        self.assertEqual([i['score'] for i in items], list(range(250)))
+        self.assertNotIn('cited_by_tweeters_count', items[0])
+        self.assertEqual(sorted(session.requests), [1, 2, 2, 2, 3])
+
+    def test_cache_by_last_updated(self):
+
+        cache_file = os.path.join(self.directory, 'altmetrics.cache')
+
+        dumper = self.dumper(SessionStub(), cache_file=cache_file)
+        items = list(dumper.altmetrics_items_by_journals('0102-6720'))
+        dumper.close()
+
+        session = SessionStub()
+        dumper = self.dumper(session, cache_file=cache_file)
+        cached = list(dumper.altmetrics_items_by_journals('0102-6720'))
+        dumper.close()
+
+        self.assertEqual(cached, items)
+        self.assertEqual(session.requests, [1])
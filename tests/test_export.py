@@ -0,0 +1,40 @@
+# coding: utf-8
+import json
+import threading
+import unittest
+
+from export import search_update_indicators
+
+
+class CitedbyStub(object):
+
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def citedby_meta(self, title, surname, year, metaonly=False):
+        with self._lock:
+            self.calls.append((title, surname, year))
+
+        return json.dumps({'article': {'total_received': len(self.calls)}})
+
+
+class MetaCitationsTest(unittest.TestCase):
+
+    def test_meta_key(self):
+
+        self.assertEqual(
+            search_update_indicators.meta_key(u'Análise  da Saúde.', u'Conceição', u'2015'),
+            search_update_indicators.meta_key(u'analise da saude', u'CONCEICAO', 2015)
+        )
+
+    def test_duplicated_lookups(self):
+
+        citedby = CitedbyStub()
+        citations = search_update_indicators.MetaCitations(citedby)
+
+        self.assertEqual(citations.total_received(u'Saúde pública', u'Silva', u'2015'), 1)
+        self.assertEqual(citations.total_received(u'SAUDE PUBLICA', u'silva', u'2015'), 1)
+        self.assertEqual(citations.total_received(u'Saúde pública', u'Silva', u'2016'), 2)
+        self.assertEqual(len(citedby.calls), 2)
+        self.assertEqual((citations.misses, citations.hits), (2, 1))
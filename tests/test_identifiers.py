@@ -0,0 +1,123 @@
+# coding: utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from xylose.scielodocument import Article
+
+import identifiers
+from tests.fixtures import articlemeta
+
+
+class IdentifierIndexTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.document = Article(articlemeta.document)
+        self.index = identifiers.IdentifierIndex()
+        self.index.add_document(self.document)
+        self.index.add(
+            u'spa', u'S0034-89101998000100001', doi=u'10.1590/S0034-89101998000100001',
+            publication_date=u'1998-02', document_type=u'research-article',
+            pdfs=[u'/PDF/RSP/V32N1/V32N1A01.PDF']
+        )
+
+    def test_lookup(self):
+
+        pid = self.document.publisher_id
+
+        self.assertEqual(self.index.lookup(pid), (u'scl', pid))
+        self.assertEqual(self.index.lookup(identifiers.fbpe_key(pid)), (u'scl', pid))
+        self.assertEqual(
+            self.index.lookup(u'/pdf/rsp/v32n1/v32n1a01.pdf'),
+            (u'spa', u'S0034-89101998000100001')
+        )
+        self.assertEqual(
+            self.index.lookup(u'S0034-8910(98)000100001'),
+            (u'spa', u'S0034-89101998000100001')
+        )
+        self.assertIsNone(self.index.lookup(u'10.1590/S0034-89101998000100001', u'scl'))
+        self.assertIsNone(self.index.lookup(u'S0000-00002000000100001'))
+
+    def test_document(self):
+
+        document = self.index.document(u'10.1590/s0034-89101998000100001')
+
+        self.assertEqual(document.publisher_id, u'S0034-89101998000100001')
+        self.assertEqual(document.publication_date, u'1998-02')
+        self.assertEqual(document.document_type, u'research-article')
+
+    def test_identifiers(self):
+
+        self.assertEqual(
+            self.index.identifiers(u'scl', self.document.publisher_id),
+            identifiers.eligible_match_keys(self.document)
+        )
+        self.assertEqual(self.index.identifiers(u'spa', self.document.publisher_id), [])
+
+    def test_save_and_load(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'identifiers.gz')
+
+        try:
+            self.index.save(path)
+            index = identifiers.IdentifierIndex.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(
+            index.identifiers(u'scl', self.document.publisher_id),
+            self.index.identifiers(u'scl', self.document.publisher_id)
+        )
+        self.assertEqual(
+            index.document(u'S0034-8910(98)000100001'),
+            self.index.document(u'S0034-8910(98)000100001')
+        )
+
+
+class IssnIndexTest(unittest.TestCase):
+
+    def setUp(self):
+
+        self.index = identifiers.IssnIndex()
+        self.index.add(u'scl', u'0034-8910', u'0034-8910', u'1518-8787', u'Revista de Saúde Pública')
+        self.index.add(u'spa', u'0034-8910', u'0034-8910', u'1518-8787', u'Revista de Saúde Pública')
+        self.index.add(u'scl', u'1678-4464', u'0102-311X', u'1678-4464', u'Cadernos de Saúde Pública')
+
+    def test_journal_issns(self):
+
+        journal = self.index.journal(u'1518-8787')
+
+        self.assertEqual(identifiers.journal_issns(journal), [u'0034-8910', u'1518-8787'])
+        self.assertEqual(
+            self.index.equivalents(u'0102-311x'),
+            [u'0102-311X', u'1678-4464']
+        )
+
+    def test_canonical(self):
+
+        self.assertEqual(self.index.canonical(u'1518-8787'), u'0034-8910')
+        self.assertEqual(self.index.canonical(u'0102-311X'), u'1678-4464')
+        self.assertEqual(self.index.journal(u'1518-8787', u'spa').collection_acronym, u'spa')
+        self.assertIsNone(self.index.canonical(u'0000-0000'))
+        self.assertEqual(
+            self.index.canonical_issns([u'1518-8787', u'0034-8910', u'0000-0000']),
+            [u'0034-8910', u'0000-0000']
+        )
+
+    def test_save_and_load(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'issns.gz')
+
+        try:
+            self.index.save(path)
+            index = identifiers.IssnIndex.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(index.journals, self.index.journals)
+        self.assertEqual(index.canonical(u'0102-311X'), u'1678-4464')
@@ -1,7 +1,20 @@
 # coding: utf-8
+import os
+import json
+import time
+import shutil
+import tempfile
 import unittest
 
+from xylose.scielodocument import Article
+
+import tabs
+from publication import dumper
 from publication import journals
+from publication import documents_dates
+from publication import documents_counts
+from publication import journals_status_changes
+from tests.fixtures import articlemeta
 
 
 class PublicationTest(unittest.TestCase):
@@ -52,3 +65,175 @@ class PublicationTest(unittest.TestCase):
         result = journals.interruption_status(data)
 
         self.assertEqual(expected, result)
+
+    def test_documents_dates_columns(self):
+
+        article = Article(articlemeta.document)
+        columns = tabs.Schema(documents_dates.COLUMNS).select(
+            ['pid', 'publication_year', 'publication'])
+
+        result = [i.extractor(article, documents_dates.utils.split_date) for i in columns.columns]
+
+        self.assertEqual(result, [u'S0102-67202009000300001', u'2009', u'2009-09'])
+
+    def test_journals_status_changes_read_records(self):
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'status.csv')
+        with open(path, 'wb') as f:
+            f.write(
+                b'"extraction date","study unit","collection","ISSN SciELO","title"\r\n'
+                b'"2016-10-18","journal","scl","0102-6720","ABCD ""q""\r\nline"\r\n'
+                b'"2016-10-18","journal","scl","0034-8910","RSP"\r\n'
+            )
+
+        try:
+            result = list(journals_status_changes.read_records(path))
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual([i[0] for i in result], [None, u'scl_0102-6720', u'scl_0034-8910'])
+        self.assertEqual(result[1][1], u'"2016-10-18","journal","scl","0102-6720","ABCD ""q""\r\nline"')
+
+    def test_journals_status_changes_partial_run_keeps_state(self):
+
+        directory = tempfile.mkdtemp()
+        state_file = os.path.join(directory, 'state.json')
+
+        try:
+            for issns in (['0102-6720'], None):
+                dumper = journals_status_changes.Dumper(
+                    'scl', issns, os.path.join(directory, 'status.csv'),
+                    state_file=state_file)
+                dumper.close()
+                saved = journals_status_changes.utils.load_state(state_file)
+                self.assertEqual('scl' in saved, issns is None)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_documents_counts_distribution(self):
+
+        distribution = documents_counts.Distribution()
+        for value in [3, 1, 4, 1, 5, 9, 2, 6]:
+            distribution.add(value)
+
+        # valores ordenados: 1, 1, 2, 3, 4, 5, 6, 9
+        self.assertEqual(
+            [documents_counts._number(i) for i in distribution.quantiles([0, 0.5, 0.9, 1])],
+            [u'1', u'3.5', u'6.9', u'9']
+        )
+        self.assertEqual(distribution.mean(), 3.875)
+        self.assertEqual(documents_counts.Distribution().quantiles([0.5]), [None])
+
+    def test_documents_counts_summary(self):
+
+        class ArticleMetaStub(object):
+
+            def documents(self, collection=None, issn=None):
+                for pid, year in [('S0102-67202009000300001', '2009'),
+                                  ('S0102-67202009000300002', '2009'),
+                                  ('S0102-67202010000300001', '2010')]:
+                    data = dict(articlemeta.document)
+                    data['article'] = dict(data['article'], v880=[{'_': pid}])
+                    data['article']['v65'] = [{'_': year + '0900'}]
+                    yield Article(data)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'counts.csv')
+
+        try:
+            dumper = documents_counts.Dumper('scl', output_file=path, summary=True)
+            dumper._articlemeta = ArticleMetaStub()
+            dumper.run()
+            with open(path, 'rb') as f:
+                lines = f.read().decode('utf-8').splitlines()
+        finally:
+            shutil.rmtree(directory)
+
+        counts = documents_counts.document_counts(Article(articlemeta.document))
+        expected = []
+        for value in counts:
+            expected += [unicode(value)] * 5
+
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].endswith(u'"references p90","references max"'))
+        self.assertEqual(
+            [i.strip(u'"') for i in lines[1].split(u',')[-17:]],
+            [u'2009', u'2'] + expected
+        )
+        self.assertTrue(lines[2].split(u',')[-17].endswith(u'"2010"'))
+
+    def test_journals_rows_keep_input_order(self):
+
+        issns = [u'0000-000%d' % i for i in range(6)]
+
+        class JournalStub(object):
+
+            def __init__(self, issn):
+                self.scielo_issn = issn
+                self._journal = Article(articlemeta.document).journal
+
+            def __getattr__(self, name):
+                return getattr(self._journal, name)
+
+        class ArticleMetaStub(object):
+
+            def journals(self, collection=None, issn=None):
+                return [JournalStub(i) for i in issns]
+
+            def document(self, pid, collection):
+                return None
+
+        class PublicationStatsStub(object):
+
+            def _delay(self, issn):
+                # os primeiros periódicos respondem por último
+                time.sleep(0.002 * (len(issns) - issns.index(issn)))
+
+            def number_of_issues_by_year(self, issn, collection, years=None, type=None):
+                self._delay(issn)
+                if not years:
+                    return issns.index(issn)
+                return [(2016, issns.index(issn))]
+
+            def number_of_articles_by_year(self, issn, collection, document_types=None, years=None):
+                return self.number_of_issues_by_year(issn, collection, years)
+
+            def documents_languages_by_year(self, issn, collection, years=None):
+                self._delay(issn)
+                return {2016: {'pt': 1, 'es': 0, 'en': 0, 'other': 0}}
+
+            def first_included_document_by_journal(self, issn, collection):
+                self._delay(issn)
+                return None
+
+            last_included_document_by_journal = first_included_document_by_journal
+
+        directory = tempfile.mkdtemp()
+
+        try:
+            dumper = journals.Dumper(
+                'scl', output_file=os.path.join(directory, 'journals.csv'),
+                output_format='jsonl', workers=4)
+            dumper._articlemeta = ArticleMetaStub()
+            dumper._publicationstats = PublicationStatsStub()
+            rows = [json.loads(i) for i in dumper.items()]
+            dumper.close()
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual([i[u'ISSN SciELO'] for i in rows], issns)
+        self.assertEqual(
+            [i[u'total of issues'] for i in rows],
+            [unicode(i) for i in range(len(issns))]
+        )
+
+    def test_dumper_checkpoint_tabs(self):
+
+        self.assertNotIn('xml_rsps', dumper.CHECKPOINT_TABS)
+        self.assertNotIn('search_indicators', dumper.CHECKPOINT_TABS)
+
+        with self.assertRaises(ValueError):
+            dumper.Dumper(
+                'scl', tabs=['counts', 'xml_rsps'],
+                checkpoint_file=os.path.join(tempfile.gettempdir(), 'checkpoint.json'))
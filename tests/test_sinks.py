@@ -0,0 +1,227 @@
+# coding: utf-8
+import os
+import gzip
+import json
+import shutil
+import tempfile
+import unittest
+
+import sinks
+
+
+class BufferedSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tab.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_write_utf8_lines(self):
+
+        sink = sinks.BufferedSink(self.path)
+        sink.write(u'"S\u00e3o Paulo"')
+        sink.writelines([u'"a"', u'"b"'])
+        sink.close()
+
+        self.assertEqual(self.read(), b'"S\xc3\xa3o Paulo"\r\n"a"\r\n"b"\r\n')
+
+    def test_flush_by_buffer_size(self):
+
+        sink = sinks.BufferedSink(self.path, buffer_size=4)
+        sink.write(u'"a"')
+        self.assertEqual(self.read(), b'')
+        sink.write(u'"b"')
+        self.assertEqual(self.read(), b'"a"\r\n"b"\r\n')
+        sink.close()
+
+    def test_append_mode(self):
+
+        sink = sinks.BufferedSink(self.path)
+        sink.write(u'"a"')
+        sink.close()
+
+        sink = sinks.BufferedSink(self.path, mode='ab')
+        sink.write(u'"b"')
+        sink.close()
+
+        self.assertEqual(self.read(), b'"a"\r\n"b"\r\n')
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint.json')
+        self.output = os.path.join(self.directory, 'tab.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_restore(self):
+
+        checkpoint = sinks.Checkpoint(self.path)
+        sink = sinks.BufferedSink(self.output)
+        sink.write(u'"a"')
+        checkpoint.save('0102-6720', 1000, [sink], collection='scl')
+        sink.write(u'"b"')
+        sink.close()
+
+        state = checkpoint.load()
+        checkpoint.restore(state)
+
+        self.assertEqual(state['issn'], '0102-6720')
+        self.assertEqual(state['offset'], 1000)
+        self.assertEqual(state['collection'], 'scl')
+        with open(self.output, 'rb') as f:
+            self.assertEqual(f.read(), b'"a"\r\n')
+
+    def test_pending(self):
+
+        checkpoint = sinks.Checkpoint(self.path)
+        issns = ['0102-6720', '0034-8910', '1413-8123']
+
+        self.assertEqual(
+            checkpoint.pending(issns),
+            [('0102-6720', 0), ('0034-8910', 0), ('1413-8123', 0)]
+        )
+        self.assertEqual(
+            checkpoint.pending(issns, {'issn': '0034-8910', 'offset': 2000}),
+            [('0034-8910', 2000), ('1413-8123', 0)]
+        )
+        self.assertRaises(
+            ValueError, checkpoint.pending, issns, {'issn': '0000-0000', 'offset': 0})
+
+    def test_remove(self):
+
+        checkpoint = sinks.Checkpoint(self.path)
+        checkpoint.save(None, 0, [])
+        checkpoint.remove()
+
+        self.assertIsNone(checkpoint.load())
+
+
+@unittest.skipIf(sinks.pyarrow is None, 'pyarrow is not installed')
+class ParquetSinkTest(unittest.TestCase):
+
+    columns = [
+        ('collection', 'string'),
+        ('access_year', 'string'),
+        ('access_total', 'int')
+    ]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_row_groups(self):
+        path = os.path.join(self.directory, 'accesses.parquet')
+
+        sink = sinks.ParquetSink(path, self.columns, row_group_size=2)
+        sink.write({'collection': u'scl', 'access_year': u'2012', 'access_total': 10})
+        sink.write({'collection': u'scl', 'access_year': u'2013', 'access_total': 5})
+        sink.write({'collection': u'arg', 'access_year': u'2013', 'access_total': 1})
+        sink.close()
+
+        parquet_file = sinks.pyarrow.parquet.ParquetFile(path)
+        result = parquet_file.read().to_pydict()
+
+        self.assertEqual(parquet_file.num_row_groups, 2)
+        self.assertEqual(result['collection'], [u'scl', u'scl', u'arg'])
+        self.assertEqual(result['access_total'], [10, 5, 1])
+
+    def test_write_partitioned(self):
+
+        sink = sinks.ParquetSink(
+            self.directory, self.columns,
+            partition_by=['collection', 'access_year']
+        )
+        sink.write({'collection': u'scl', 'access_year': u'2012', 'access_total': 10})
+        sink.write({'collection': u'scl', 'access_year': u'2013', 'access_total': 5})
+        sink.write({'collection': u'scl', 'access_year': u'2013', 'access_total': 1})
+        sink.close()
+
+        path = os.path.join(
+            self.directory, 'collection=scl', 'access_year=2013', 'part-00000.parquet')
+        result = sinks.pyarrow.parquet.read_table(path).to_pydict()
+
+        self.assertEqual(result['access_total'], [5, 1])
+        self.assertTrue(os.path.exists(os.path.join(
+            self.directory, 'collection=scl', 'access_year=2012', 'part-00000.parquet')))
+
+
+class ShardedSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'accesses.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def manifest(self):
+        with open(self.path + '.manifest.json') as f:
+            return json.load(f)
+
+    def test_rotate_by_rows(self):
+
+        sink = sinks.ShardedSink(self.path, max_rows=2)
+        for i in range(5):
+            sink.write(u'"%d"' % i)
+        sink.close()
+
+        manifest = self.manifest()
+
+        self.assertEqual(manifest['rows'], 5)
+        self.assertEqual(
+            [(i['file'], i['rows']) for i in manifest['shards']],
+            [
+                (u'accesses-00000.csv', 2),
+                (u'accesses-00001.csv', 2),
+                (u'accesses-00002.csv', 1)
+            ]
+        )
+
+        with open(os.path.join(self.directory, 'accesses-00002.csv'), 'rb') as f:
+            self.assertEqual(f.read(), b'"4"\r\n')
+
+    def test_shard_by_key_with_gzip(self):
+
+        sink = sinks.ShardedSink(self.path, compression='gzip', header=u'"year"')
+        sink.write(u'"2012"', key='2012')
+        sink.write(u'"2013"', key='2013')
+        sink.write(u'"2012"', key='2012')
+        sink.close()
+
+        manifest = self.manifest()
+
+        self.assertEqual(
+            [(i['file'], i['key'], i['rows']) for i in manifest['shards']],
+            [
+                (u'accesses-2012-00000.csv.gz', u'2012', 2),
+                (u'accesses-2013-00000.csv.gz', u'2013', 1)
+            ]
+        )
+
+        with gzip.open(os.path.join(self.directory, 'accesses-2012-00000.csv.gz')) as f:
+            self.assertEqual(f.read(), b'"year"\r\n"2012"\r\n"2012"\r\n')
+
+    def test_max_open_shards(self):
+
+        sink = sinks.ShardedSink(self.path, max_open=1)
+        sink.write(u'"a"', key='a')
+        sink.write(u'"b"', key='b')
+        sink.write(u'"a"', key='a')
+        sink.close()
+
+        self.assertEqual(
+            [i['file'] for i in self.manifest()['shards']],
+            [u'accesses-a-00000.csv', u'accesses-a-00001.csv', u'accesses-b-00000.csv']
+        )
@@ -0,0 +1,155 @@
+# coding: utf-8
+import json
+import unittest
+
+from xylose.scielodocument import Article
+
+import tabs
+from tests.fixtures import articlemeta
+
+
+class TabsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.article = Article(articlemeta.document)
+
+    def test_join_line(self):
+
+        result = tabs.join_line([u'a', u'b "c"'])
+
+        self.assertEqual(result, u'"a","b ""c"""')
+
+    def test_journal_columns(self):
+
+        result = tabs.journal_columns(self.article.journal)
+
+        expected = [
+            u'0102-6720',
+            u'0102-6720',
+            'ABCD. Arquivos Brasileiros de Cirurgia Digestiva (S\u00e3o Paulo)',
+            u'Health Sciences',
+            u'0', u'0', u'0', u'0', u'0', u'1', u'0', u'0',
+            u'0',
+            u'current'
+        ]
+
+        self.assertEqual(result, expected)
+
+    def test_journal_prefix_cache(self):
+
+        cache = tabs.JournalPrefixCache()
+        encode = cache.encoder([tabs.Column(u'PID', safe=True)])
+
+        result = encode(self.article, [u'S0102-67202009000300001'])
+
+        expected = tabs.join_line(
+            [cache.extraction_date, u'document', u'scl'] +
+            tabs.journal_columns(self.article.journal) +
+            [u'S0102-67202009000300001']
+        )
+
+        self.assertEqual(result, expected)
+        self.assertEqual(list(cache._prefixes.keys()), [(u'scl', u'0102-6720')])
+
+    def test_journal_prefix_cache_jsonl(self):
+
+        cache = tabs.JournalPrefixCache()
+        encode = cache.encoder([tabs.Column(u'PID', safe=True)], fmt='jsonl')
+
+        result = json.loads(encode(self.article, [u'S0102-67202009000300001']))
+
+        self.assertEqual(result[u'study unit'], u'document')
+        self.assertEqual(result[u'ISSN SciELO'], u'0102-6720')
+        self.assertEqual(result[u'PID'], u'S0102-67202009000300001')
+
+
+class SchemaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = tabs.Schema([
+            tabs.Column(u'extraction date', value=u'2016-01-01'),
+            tabs.Column(u'study unit', value=u'100% "journal"'),
+            tabs.Column(u'year', safe=True),
+            tabs.Column(u'title'),
+            tabs.Column(u'publisher')
+        ])
+
+    def test_header(self):
+
+        self.assertEqual(
+            self.schema.header(),
+            u'"extraction date","study unit","year","title","publisher"'
+        )
+
+    def test_csv_encoder(self):
+
+        encode = self.schema.encoder()
+
+        self.assertEqual(
+            encode([u'2012', u'The "title"', u'SciELO']),
+            u'"2016-01-01","100% ""journal""","2012","The ""title""","SciELO"'
+        )
+
+    def test_csv_encoder_incomplete_line(self):
+
+        encode = self.schema.encoder()
+
+        self.assertEqual(
+            encode([u'2012', u'The "title"']),
+            u'"2016-01-01","100% ""journal""","2012","The ""title"""'
+        )
+
+    def test_csv_encoder_none_values(self):
+
+        encode = self.schema.encoder()
+
+        self.assertEqual(
+            encode([None, None, u'SciELO']),
+            u'"2016-01-01","100% ""journal""","","","SciELO"'
+        )
+
+    def test_csv_encoder_not_string_values(self):
+
+        encode = self.schema.encoder()
+
+        self.assertEqual(
+            encode([2012, 10, 1.5]),
+            u'"2016-01-01","100% ""journal""","2012","10","1.5"'
+        )
+
+    def test_jsonl_encoder(self):
+
+        encode = self.schema.encoder('jsonl')
+
+        self.assertEqual(
+            json.loads(encode([u'2012', u'The "title"', u'SciELO'])),
+            {
+                u'extraction date': u'2016-01-01',
+                u'study unit': u'100% "journal"',
+                u'year': u'2012',
+                u'title': u'The "title"',
+                u'publisher': u'SciELO'
+            }
+        )
+
+    def test_select(self):
+
+        schema = tabs.Schema([
+            tabs.Column(u'document year', key='year'),
+            tabs.Column(u'document title', key='title'),
+            tabs.Column(u'document type', key='type')
+        ])
+
+        result = schema.select(['type', 'year'])
+
+        self.assertEqual(result.names, [u'document type', u'document year'])
+
+    def test_select_unknown_column(self):
+
+        with self.assertRaises(ValueError):
+            self.schema.select(['year'])
+
+    def test_invalid_format(self):
+
+        with self.assertRaises(ValueError):
+            self.schema.encoder('xml')
@@ -1,9 +1,16 @@
 # coding: utf-8
+import time
+import argparse
+import random
 import unittest
 
 import utils
 
 
+def _square(value):
+    return value * value
+
+
 class UtilsTest(unittest.TestCase):
 
     def test_ckeck_given_issns(self):
@@ -53,3 +60,151 @@ class UtilsTest(unittest.TestCase):
         result = utils.split_date('')
 
         self.assertEqual(result, ('', '', ''))
+
+    def test_split_date_invalid_day(self):
+
+        result = utils.split_date('2015-02-29')
+
+        self.assertEqual(result, ('', '', ''))
+
+    def test_split_date_single_digit_month(self):
+
+        result = utils.split_date('2016-1-5')
+
+        self.assertEqual(result, ('2016', '1', '5'))
+
+    def test_is_valid_date_none(self):
+
+        self.assertFalse(utils.is_valid_date(None))
+
+    def test_split_date_not_string(self):
+
+        self.assertEqual(utils.split_date(None), ('', '', ''))
+        self.assertEqual(utils.split_date(2016), ('', '', ''))
+        self.assertEqual(utils.split_date(['2016']), ('', '', ''))
+
+    def test_lru_cache(self):
+
+        calls = []
+
+        @utils.lru_cache(maxsize=2)
+        def func(value):
+            calls.append(value)
+            return value * 2
+
+        self.assertEqual([func(1), func(2), func(1), func(3), func(2)], [2, 4, 2, 6, 4])
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual(sorted(func.cache.keys()), [2, 3])
+
+    def test_collection_output_file(self):
+
+        result = utils.collection_output_file('/tmp/documents_counts.csv', 'scl')
+
+        self.assertEqual(result, '/tmp/documents_counts-scl.csv')
+
+    def test_run_collections(self):
+
+        done = []
+
+        def func(collection):
+            if collection == 'arg':
+                raise ValueError('fail')
+            done.append(collection)
+
+        result = utils.run_collections(func, ['scl', 'arg', 'spa'], workers=2)
+
+        self.assertEqual(result, ['arg'])
+        self.assertEqual(sorted(done), ['scl', 'spa'])
+
+    def test_run_dumper(self):
+
+        done = []
+
+        class Dumper(object):
+
+            def __init__(self, collection, output_file):
+                self.collection = collection
+                self.output_file = output_file
+
+            def run(self):
+                if self.collection == 'arg':
+                    raise ValueError('fail')
+                done.append((self.collection, self.output_file))
+
+        args = argparse.Namespace(
+            collection='scl', all_collections=False, collection_workers=2)
+
+        utils.run_dumper(Dumper, args, '/tmp/tab.csv')
+        self.assertEqual(done, [('scl', '/tmp/tab.csv')])
+
+        collection_acronyms = utils.collection_acronyms
+        utils.collection_acronyms = lambda: ['scl', 'arg', 'spa']
+        args.all_collections = True
+        del done[:]
+
+        try:
+            with self.assertRaises(SystemExit) as exit:
+                utils.run_dumper(Dumper, args, '/tmp/tab.csv')
+        finally:
+            utils.collection_acronyms = collection_acronyms
+
+        self.assertEqual(exit.exception.code, 1)
+        self.assertEqual(
+            sorted(done),
+            [('scl', '/tmp/tab-scl.csv'), ('spa', '/tmp/tab-spa.csv')]
+        )
+
+    def test_ordered_imap(self):
+
+        def func(value):
+            time.sleep(random.random() / 100)
+            return value * 2
+
+        result = list(utils.ordered_imap(func, range(20), workers=4))
+
+        self.assertEqual(result, [i * 2 for i in range(20)])
+
+    def test_ordered_imap_single_worker(self):
+
+        result = list(utils.ordered_imap(lambda x: x + 1, [1, 2, 3]))
+
+        self.assertEqual(result, [2, 3, 4])
+
+    def test_ordered_imap_consumes_input_on_demand(self):
+
+        consumed = []
+
+        def items():
+            for i in range(100):
+                consumed.append(i)
+                yield i
+
+        result = utils.ordered_imap(lambda x: x, items(), workers=2, window=3)
+
+        self.assertEqual(next(result), 0)
+        self.assertEqual(len(consumed), 3)
+
+    def test_ordered_imap_error(self):
+
+        def func(value):
+            if value == 3:
+                raise ValueError('invalid value')
+            return value
+
+        result = utils.ordered_imap(func, range(10), workers=4)
+
+        self.assertEqual([next(result) for i in range(3)], [0, 1, 2])
+        self.assertRaises(ValueError, next, result)
+
+    def test_ordered_process_imap(self):
+
+        result = list(utils.ordered_process_imap(
+            _square, range(20), processes=2, chunksize=3))
+
+        self.assertEqual(result, [i * i for i in range(20)])
+
+    def test_ordered_process_imap_single_process(self):
+
+        result = list(utils.ordered_process_imap(_square, [1, 2, 3]))
+
+        self.assertEqual(result, [1, 4, 9])
@@ -645,6 +645,45 @@ class ArticleMeta(object):
 
             offset += 1000
 
+    def journal(self, code, collection):
+        try:
+            journal = self.client.get_journal(code=code, collection=collection)
+        except:
+            msg = 'Error retrieving journal: %s_%s' % (collection, code)
+            raise ServerError(msg)
+
+        jjournal = json.loads(journal) if journal else None
+
+        if not jjournal:
+            logger.warning('Journal not found for : %s_%s' % (collection, code))
+            return None
+
+        logger.info('Journal loaded: %s_%s' % (collection, code))
+
+        return Journal(jjournal)
+
+    def journal_history_changes(self, collection=None, event=None, code=None, from_date=None, until_date=None):
+        """
+        Retorna os eventos (add, update, delete) registrados para os
+        periódicos no período informado, em ordem cronológica. O atributo code
+        de cada evento é a lista de ISSN's do periódico, iniciada pelo ISSN
+        SciELO.
+        """
+        offset = 0
+        while True:
+            events = self.client.journal_history_changes(
+                collection=collection, event=event, code=code,
+                from_date=from_date, until_date=until_date, limit=LIMIT,
+                offset=offset)
+
+            if len(events) == 0:
+                raise StopIteration
+
+            for item in events:
+                yield item
+
+            offset += 1000
+
     def exists_article(self, code, collection):
         try:
             return self.client.exists_article(
@@ -666,7 +705,11 @@ class ArticleMeta(object):
             msg = 'Error senting doaj id for document: %s_%s' % (collection, code)
             raise ServerError(msg)
 
-    def document(self, code, collection, replace_journal_metadata=True, fmt='xylose'):
+    def document(self, code, collection, replace_journal_metadata=True, fmt='xylose', raw=False):
+        """
+        raw: quando True, o documento é retornado no formato fornecido pelo
+        servidor (JSON para fmt='xylose'), sem a carga do objeto xylose.
+        """
         try:
             article = self.client.get_article(
                 code=code,
@@ -678,7 +721,7 @@ class ArticleMeta(object):
             msg = 'Error retrieving document: %s_%s' % (collection, code)
             raise ServerError(msg)
 
-        if fmt == 'xylose':
+        if fmt == 'xylose' and not raw:
             jarticle = None
             try:
                 jarticle = json.loads(article)
@@ -698,8 +741,11 @@ class ArticleMeta(object):
         logger.info('Document loaded: %s_%s' % (collection, code))
         return article
 
-    def documents(self, collection=None, issn=None, from_date=None, until_date=None, fmt='xylose', extra_filter=None):
-        offset = 0
+    def documents(self, collection=None, issn=None, from_date=None, until_date=None, fmt='xylose', extra_filter=None, raw=False, offset=0):
+        """
+        offset: quantidade de documentos iniciais a serem ignorados, permitindo
+        a retomada de um processamento.
+        """
         while True:
             identifiers = self.client.get_article_identifiers(
                 collection=collection, issn=issn, from_date=from_date,
@@ -715,7 +761,8 @@ class ArticleMeta(object):
                     code=identifier.code,
                     collection=identifier.collection,
                     replace_journal_metadata=True,
-                    fmt=fmt
+                    fmt=fmt,
+                    raw=raw
                 )
 
                 yield document
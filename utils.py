@@ -1,10 +1,16 @@
 #coding: utf-8
 import os
+import sys
+import json
+import time
 import weakref
 import datetime
 import re
 import unicodedata
 import logging
+import threading
+import multiprocessing
+from collections import deque
 
 from django.utils.text import slugify
 
@@ -15,9 +21,26 @@ try:
 except:
     from ConfigParser import ConfigParser
 
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+try:
+    string_types = basestring
+    text_type = unicode
+except NameError:
+    string_types = str
+    text_type = str
+
 logger = logging.getLogger(__name__)
 
 REGEX_ISSN = re.compile(r"^[0-9]{4}-[0-9]{3}[0-9xX]$")
+# mesmos valores aceitos por datetime.strptime para %Y, %m e %d
+REGEX_DATE = re.compile(
+    r"(\d{4})(?:-(1[0-2]|0[1-9]|[1-9])(?:-(3[01]|[12]\d|0[1-9]|[1-9]))?)?\Z")
+DATE_CACHE_SIZE = 4096
+COLLECTION_WORKERS = 4
 
 
 def call_django_slugify(value):
@@ -162,20 +185,100 @@ def accessstats_server():
     return clients.AccessStats(host, port)
 
 
-def is_valid_date(value):
+def lru_cache(maxsize=DATE_CACHE_SIZE):
+    """
+    Memoiza funções de um único argumento (hashable) mantendo apenas os
+    maxsize resultados utilizados mais recentemente.
+
+    Os resultados são mantidos em uma lista circular duplamente encadeada,
+    ordenada pelo uso, onde cada elemento é [anterior, próximo, chave,
+    resultado].
+    """
+
+    def decorator(func):
+
+        cache = {}
+        lock = threading.Lock()
+        root = []
+        root[:] = [root, root, None, None]
+
+        def wrapper(value):
+
+            with lock:
+                link = cache.get(value)
+                if link is not None:
+                    # move o elemento para o final da lista (mais recente)
+                    link_prev, link_next, key, result = link
+                    link_prev[1] = link_next
+                    link_next[0] = link_prev
+                    last = root[0]
+                    last[1] = root[0] = link
+                    link[0] = last
+                    link[1] = root
+                    return result
+
+            result = func(value)
+
+            with lock:
+                if value in cache:
+                    return result
+                if len(cache) >= maxsize:
+                    # descarta o elemento utilizado há mais tempo
+                    oldest = root[1]
+                    root[1] = oldest[1]
+                    oldest[1][0] = root
+                    del cache[oldest[2]]
+                last = root[0]
+                link = [last, root, value, result]
+                last[1] = root[0] = cache[value] = link
+
+            return result
+
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        wrapper.cache = cache
+
+        return wrapper
+
+    return decorator
+
+
+def parse_date(value):
+    """
+    Valida e divide uma data ISO (YYYY-MM-DD, YYYY-MM ou YYYY) em uma única
+    passagem. Aceita as mesmas datas que datetime.strptime aceita para esses
+    formatos e retorna uma tupla (ano, mês, dia), com '' para as partes
+    ausentes, ou None para datas inválidas.
+    """
+
+    if not isinstance(value, string_types):
+        return None
+
+    return _parse_date(value)
+
+
+@lru_cache()
+def _parse_date(value):
+
+    match = REGEX_DATE.match(value)
+
+    if not match:
+        return None
+
+    year, month, day = match.groups()
 
     try:
-        datetime.datetime.strptime(value, '%Y-%m-%d')
-    except:
-        try:
-            datetime.datetime.strptime(value, '%Y-%m')
-        except:
-            try:
-                datetime.datetime.strptime(value, '%Y')
-            except:
-                return False
+        datetime.date(int(year), int(month or 1), int(day or 1))
+    except ValueError:
+        return None
+
+    return (year, month or value[0:0], day or value[0:0])
+
+
+def is_valid_date(value):
 
-    return True
+    return parse_date(value) is not None
 
 
 def split_date(value):
@@ -188,27 +291,140 @@ def split_date(value):
         2016-01: ('2016','01','')
         2016: ('2016','','')
     """
-    if not is_valid_date(value):
-        return ('', '', '')
 
-    splited = value.split('-')
+    return parse_date(value) or ('', '', '')
 
-    try:
-        year = splited[0]
-    except IndexError:
-        year = ''
 
-    try:
-        month = splited[1]
-    except IndexError:
-        month = ''
+def collection_acronyms():
+    """
+    Retorna os acrônimos das coleções registradas no Article Meta.
+    """
 
-    try:
-        day = splited[2]
-    except IndexError:
-        day = ''
+    return [i.acronym for i in articlemeta_server().collections()]
+
+
+def collection_output_file(output_file, collection):
+    """
+    Retorna o nome do arquivo de saída de uma coleção nos processamentos de
+    todas as coleções, ex: documents_counts.csv: documents_counts-scl.csv
+    """
+
+    base, extension = os.path.splitext(output_file)
+
+    return '%s-%s%s' % (base, collection, extension)
+
+
+def run_collections(func, collections=None, workers=COLLECTION_WORKERS, log=None):
+    """
+    Executa func(collection) para cada uma das coleções informadas, ou para
+    todas as coleções registradas no Article Meta, processando até workers
+    coleções simultaneamente.
+
+    As coleções compartilham o processo e, portanto, os clientes e caches
+    mantidos em memória (ex: colunas de periódicos e datas). A falha de uma
+    coleção é registrada no log sem interromper as demais. Retorna a lista das
+    coleções com falha.
+
+    log: logger utilizado para os registros do processamento, normalmente o
+    logger do processamento que executa as coleções.
+    """
+
+    log = log or logger
+    collections = collections or collection_acronyms()
+    log.info('Dumping %d collections with %d workers' % (len(collections), workers))
+
+    def run(collection):
+        started = time.time()
+        try:
+            func(collection)
+        except Exception as e:
+            log.exception(e)
+            log.error('Fail to dump collection %s' % collection)
+            return collection
+        log.info('Collection %s finished in %.2fs' % (collection, time.time() - started))
+
+    failures = [i for i in ordered_imap(run, collections, workers=workers) if i]
+
+    if failures:
+        log.error('Collections with failures: %s' % ', '.join(failures))
+
+    return failures
+
+
+def run_dumper(dumper, args, output_file=None, required=True, log=None):
+    """
+    Executa dumper(collection, output_file).run() para args.collection ou,
+    com args.all_collections, para todas as coleções registradas no Article
+    Meta (run_collections), com até args.collection_workers coleções
+    simultâneas e o arquivo de cada coleção produzido por
+    collection_output_file.
 
-    return (year, month, day)
+    output_file: arquivo utilizado pelo Dumper, normalmente args.output_file.
+    Com all_collections é obrigatório, exceto quando required é False.
+
+    O processo é encerrado com status 1 quando alguma coleção falha.
+    """
+
+    log = log or logger
+
+    if not args.all_collections:
+        dumper(args.collection, output_file).run()
+        return
+
+    if required and not output_file:
+        log.error('--all_collections requires --output_file')
+        sys.exit()
+
+    def run(collection):
+        collection_file = None
+        if output_file:
+            collection_file = collection_output_file(output_file, collection)
+
+        dumper(collection, collection_file).run()
+
+    failures = run_collections(run, workers=args.collection_workers, log=log)
+
+    if failures:
+        sys.exit(1)
+
+
+def load_state(state_file):
+    """
+    Carrega o arquivo de estado dos modos incrementais, indexado pelo
+    acrônimo da coleção, ex:
+    {"scl": {"last_month": "2016-09", "run_date": "2016-10-18"}}
+    """
+    if not os.path.exists(state_file):
+        return {}
+
+    with open(state_file, 'r') as f:
+        return json.load(f)
+
+
+def save_state(state_file, state):
+
+    tmp_file = state_file + '.tmp'
+
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=2)
+
+    os.rename(tmp_file, state_file)
+
+
+_state_lock = threading.Lock()
+
+
+def update_state(state_file, collection, value):
+    """
+    Atualiza o estado de uma coleção no arquivo de estado, preservando o
+    estado das demais coleções. Seguro para coleções processadas
+    simultaneamente no mesmo processo.
+    """
+
+    with _state_lock:
+        state = load_state(state_file)
+        state[collection] = value
+        save_state(state_file, state)
 
 
 def ckeck_given_issns(issns):
@@ -220,3 +436,137 @@ def ckeck_given_issns(issns):
         valid_issns.append(issn)
 
     return valid_issns
+
+
+class _Task(object):
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def get(self):
+
+        while not self.done.wait(1):
+            pass
+
+        if self.error:
+            raise self.error
+
+        return self.result
+
+
+def ordered_imap(func, iterable, workers=1, window=None):
+    """
+    Aplica func a cada item de iterable utilizando até workers threads,
+    retornando os resultados na mesma ordem dos itens de entrada.
+
+    No máximo window itens (padrão: 2 * workers) ficam em processamento ou
+    aguardando consumo, de forma que iterable é consumido sob demanda.
+
+    Exceções levantadas por func são repassadas ao consumidor do resultado.
+    """
+
+    if workers <= 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    window = window or workers * 2
+    jobs = Queue()
+
+    def worker():
+        while True:
+            task = jobs.get()
+            if task is None:
+                return
+            try:
+                task.result = func(task.item)
+            except Exception as e:
+                logger.exception(e)
+                task.error = e
+            task.done.set()
+
+    for i in range(workers):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+
+    pending = deque()
+    try:
+        for item in iterable:
+            task = _Task(item)
+            pending.append(task)
+            jobs.put(task)
+            if len(pending) >= window:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        for i in range(workers):
+            jobs.put(None)
+
+
+def _map_chunk(func, chunk):
+
+    return [func(item) for item in chunk]
+
+
+def _chunks(iterable, size):
+
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def ordered_process_imap(func, iterable, processes=1, window=None,
+                         chunksize=1, initializer=None, initargs=()):
+    """
+    Aplica func a cada item de iterable utilizando um pool de processes
+    processos, retornando os resultados na mesma ordem dos itens de entrada.
+
+    Os itens são enviados aos processos em lotes de chunksize itens. No
+    máximo window lotes (padrão: 2 * processes) ficam em processamento ou
+    aguardando consumo, de forma que iterable é consumido sob demanda.
+
+    func e initializer devem ser funções definidas no nível de um módulo, para
+    que possam ser enviadas aos processos. initializer é executado uma vez em
+    cada processo, recebendo initargs.
+    """
+
+    if processes <= 1:
+        if initializer:
+            initializer(*initargs)
+        for item in iterable:
+            yield func(item)
+        return
+
+    window = window or processes * 2
+    pool = multiprocessing.Pool(processes, initializer, initargs)
+
+    pending = deque()
+    try:
+        for chunk in _chunks(iterable, chunksize):
+            pending.append(pool.apply_async(_map_chunk, (func, chunk)))
+            if len(pending) >= window:
+                for result in pending.popleft().get():
+                    yield result
+
+        while pending:
+            for result in pending.popleft().get():
+                yield result
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()